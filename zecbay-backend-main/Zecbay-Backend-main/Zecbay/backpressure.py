@@ -0,0 +1,153 @@
+# Zecbay/backpressure.py
+import asyncio
+import time
+import weakref
+from collections    import deque
+from django.conf    import settings
+
+# Overflow policies for a connection's outbound queue
+DROP_OLDEST = 'drop_oldest'  # Discard the oldest queued frame to make room
+LATEST      = 'latest'       # Collapse the queue down to the newest frame (snapshot semantics)
+DISCONNECT  = 'disconnect'   # Close the slow connection
+
+POLICIES = (DROP_OLDEST, LATEST, DISCONNECT)
+
+DEFAULTS = {
+    'MAX_QUEUE': 64,        # Frames buffered per connection before the policy applies
+    'POLICY': DROP_OLDEST,
+    'RECEIVE_RATE': 5.0,    # Sustained inbound messages per second per connection
+    'RECEIVE_BURST': 10,    # Inbound messages allowed in a burst
+}
+
+# Process-wide counters (read by metrics and tests)
+_counters = {
+    'frames_sent': 0,
+    'frames_dropped': 0,
+    'slow_disconnects': 0,
+    'receive_throttled': 0,
+}
+
+# Live queues, used to report the current queue depth
+_live_queues = weakref.WeakSet()
+
+
+def get_config():
+    """ Returns the WebSocket backpressure settings merged over the defaults """
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'WEBSOCKET_BACKPRESSURE', {}))
+    if config['POLICY'] not in POLICIES:
+        raise ValueError(f"Unknown WebSocket backpressure policy: {config['POLICY']}")
+    return config
+
+
+def get_metrics():
+    """ Returns a snapshot of the backpressure counters and queue depths """
+    depths = [len(q) for q in list(_live_queues)]
+    return dict(
+        _counters,
+        connections=len(depths),
+        queue_depth_total=sum(depths),
+        queue_depth_max=max(depths, default=0),
+    )
+
+
+def reset_metrics():
+    for key in _counters:
+        _counters[key] = 0
+
+
+class TokenBucket:
+    """ Simple token bucket used to rate limit inbound WebSocket messages """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.clock = clock
+        self.updated = clock()
+
+    def allow(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        _counters['receive_throttled'] += 1
+        return False
+
+
+class OutboundQueue:
+    """
+    Bounded per-connection queue of outgoing frames.
+
+    A writer task drains the queue into the socket, so a slow reader only
+    fills its own queue instead of stalling the channel layer for the group.
+    """
+
+    def __init__(self, send, max_size, policy=DROP_OLDEST):
+        self.send = send
+        self.max_size = max_size
+        self.policy = policy
+        self.frames = deque()
+        self.dropped = 0
+        self.overflowed = False
+        self._ready = asyncio.Event()
+        self._task = None
+        _live_queues.add(self)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._drain())
+
+    def put(self, frame):
+        """
+        Queues a frame (a dict of ``send`` keyword arguments).
+        Returns False when the connection should be disconnected.
+        """
+        if self.overflowed:
+            return False
+
+        if len(self.frames) >= self.max_size:
+            if self.policy == DISCONNECT:
+                self.overflowed = True
+                self._drop(len(self.frames))
+                self.frames.clear()
+                _counters['slow_disconnects'] += 1
+                return False
+            if self.policy == LATEST:
+                self._drop(len(self.frames))
+                self.frames.clear()
+            else:
+                self._drop(1)
+                self.frames.popleft()
+
+        self.frames.append(frame)
+        self._ready.set()
+        return True
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.frames.clear()
+        _live_queues.discard(self)
+
+    def _drop(self, count):
+        self.dropped += count
+        _counters['frames_dropped'] += count
+
+    async def _drain(self):
+        while True:
+            await self._ready.wait()
+            while self.frames:
+                frame = self.frames.popleft()
+                await self.send(**frame)
+                _counters['frames_sent'] += 1
+            self._ready.clear()
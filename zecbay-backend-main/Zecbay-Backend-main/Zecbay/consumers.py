@@ -1,13 +1,86 @@
-import json
+import asyncio
+import time
+from asgiref.sync                   import sync_to_async
+from bson                           import ObjectId
+from bson.errors                    import InvalidId
+from channels.db                    import database_sync_to_async
 from channels.generic.websocket     import AsyncWebsocketConsumer
+from web                            import chat, realtime
 from web.models                     import Auction, Bids, Message, User
 from django.utils                   import timezone
 from datetime                       import datetime
-
-class BidConsumer(AsyncWebsocketConsumer):
+from Zecbay                         import backpressure, protocol
+
+# Close code sent to clients that cannot keep up with the group
+SLOW_CONSUMER_CLOSE_CODE = 4008
+
+def place_bid(auction_id, exporter_id, price):
+    """ Saves a bid received over the WebSocket as the REST create_bid does; returns an error code or None """
+    try:
+        auction = Auction.objects(id=ObjectId(auction_id)).first()
+    except (InvalidId, TypeError):
+        auction = None
+    if auction is None:
+        return 'Auction not found'
+    if auction.is_ended():
+        return 'auction_ended'
+    exporter = User.objects(pk=exporter_id).first()
+    if exporter is None:
+        return 'Exporter not found'
+    auction.place_bid(exporter, price)
+    return None
+
+class BoundedWebsocketConsumer(AsyncWebsocketConsumer):
+    """
+    Base consumer that sends through a bounded per-connection queue and
+    rate limits inbound messages, so one slow client cannot hold up the group.
+    """
+
+    async def accept_connection(self):
+        # Negotiate the wire format (JSON unless the client asks for MessagePack)
+        self.codec = protocol.negotiate(self.scope.get('subprotocols', []))
+        await self.accept(subprotocol=self.codec.subprotocol)
+        await self.start_outbound()
+
+    async def start_outbound(self):
+        config = backpressure.get_config()
+        self.outbound = backpressure.OutboundQueue(
+            self.send,
+            max_size=config['MAX_QUEUE'],
+            policy=config['POLICY'],
+        )
+        self.outbound.start()
+        self.receive_limiter = backpressure.TokenBucket(config['RECEIVE_RATE'], config['RECEIVE_BURST'])
+
+    async def stop_outbound(self):
+        outbound = getattr(self, 'outbound', None)
+        if outbound is not None:
+            await outbound.close()
+
+    async def queue_send(self, text_data=None, bytes_data=None):
+        # Queue a frame for this connection; disconnect if the policy says so
+        if not self.outbound.put({'text_data': text_data, 'bytes_data': bytes_data}):
+            await self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+
+    async def send_error(self, error):
+        # Errors go out in the negotiated format like every other frame
+        await self.queue_send(**self.codec.encode(protocol.ERROR_EVENT, 'error', error))
+
+    async def websocket_receive(self, message):
+        # Drop inbound messages over the per-connection rate limit
+        if not self.receive_limiter.allow():
+            await self.send_error('rate_limited')
+            return
+        await super().websocket_receive(message)
+
+    async def websocket_disconnect(self, message):
+        await self.stop_outbound()
+        await super().websocket_disconnect(message)
+
+class BidConsumer(BoundedWebsocketConsumer):
     async def connect(self):
         self.auction_id = self.scope['url_route']['kwargs']['auction_id']
-        self.room_group_name = f"auction_{self.auction_id}"
+        self.room_group_name = realtime.auction_group(self.auction_id)
 
         # Join the auction group
         await self.channel_layer.group_add(
@@ -16,7 +89,7 @@ class BidConsumer(AsyncWebsocketConsumer):
         )
 
         # Accept the WebSocket connection
-        await self.accept()
+        await self.accept_connection()
 
     async def disconnect(self, close_code):
         # Leave the auction group
@@ -25,42 +98,30 @@ class BidConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         # Receive a new bid from the WebSocket
-        text_data_json = json.loads(text_data)
-        bid_data = text_data_json['bid']
-        auction_id = self.auction_id
-
-        # Fetch Auction object to associate the bid
-        auction = await Auction.objects.get(id=auction_id)
-
-        # Create a new Bid object and save it
-        bid = Bids(
-            exporterId=bid_data['exporterId'],
-            auctionID=auction,
-            product_name=bid_data['product_name'],
-            category=bid_data['category'],
-            initial_price=bid_data['initial_price'],
-            current_price=bid_data['current_price'],
-            mmq=bid_data['mmq'],
-            moq=bid_data['moq'],
-            round=bid_data['round'],
-            total_rounds=bid_data['total_rounds'],
-            time_left=bid_data['time_left'],
-            bidMMQ=bid_data['bidMMQ'],
-            pricePerQuantity=bid_data['pricePerQuantity'],
-            bidsMade=[],
-            isEnded=False
-        )
-        # Save the bid to MongoDB
-        await bid.save()
+        text_data_json = self.codec.decode(text_data, bytes_data)
+        bid_data = text_data_json.get('bid')
+        try:
+            price = float(bid_data['pricePerQuantity'])
+            exporter_id = bid_data['exporterId']
+        except (TypeError, KeyError, ValueError):
+            await self.send_error('invalid_bid')
+            return
+
+        # mongoengine is synchronous; save the bid in a worker thread
+        error = await database_sync_to_async(place_bid)(self.auction_id, exporter_id, price)
+        if error:
+            await self.send_error(error)
+            return
 
         # Send the new bid to all clients in the auction group
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'bid_message',
-                'bid': bid_data
+                'bid': bid_data,
+                'timestamp': int(time.time() * 1000)
             }
         )
 
@@ -68,11 +129,21 @@ class BidConsumer(AsyncWebsocketConsumer):
         # Send the bid message to WebSocket
         bid = event['bid']
 
-        await self.send(text_data=json.dumps({
-            'bid': bid
-        }))
-
-class MessageConsumer(AsyncWebsocketConsumer):
+        await self.queue_send(**self.codec.encode(
+            protocol.BID_EVENT, 'bid', bid,
+            auction_id=self.auction_id,
+            timestamp=event.get('timestamp'),
+        ))
+
+    async def price_message(self, event):
+        # Send a current price / winner update to WebSocket (published by Auction.refresh_standing)
+        await self.queue_send(**self.codec.encode(
+            protocol.PRICE_EVENT, 'price', event['price'],
+            auction_id=self.auction_id,
+            timestamp=event.get('timestamp'),
+        ))
+
+class MessageConsumer(BoundedWebsocketConsumer):
     async def connect(self):
         self.auction_id = self.scope['url_route']['kwargs']['auction_id']
         self.room_group_name = f"messages_{self.auction_id}"
@@ -84,7 +155,7 @@ class MessageConsumer(AsyncWebsocketConsumer):
         )
 
         # Accept the WebSocket connection
-        await self.accept()
+        await self.accept_connection()
 
     async def disconnect(self, close_code):
         # Leave the message group
@@ -93,35 +164,45 @@ class MessageConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        text_data_json = self.codec.decode(text_data, bytes_data)
         message_data = text_data_json['message']
 
-        # Fetch Auction object to associate the message
-        auction = await Auction.objects.get(id=self.auction_id)
-
-        # Create a new Message object and save it
-        message = Message(
-            auction=auction,
-            sender_username=message_data['sender_username'],
-            receiver_username=message_data['receiver_username'],
-            message=message_data['message']
-        )
-        # Save the message to MongoDB
-        await message.save()
+        # Resolve the auction (cached per process) to associate the message
+        auction = await sync_to_async(chat.resolve_auction)(self.auction_id)
+        if auction is None:
+            await self.send_error('Auction not found')
+            return
+
+        # Buffer the message; it is written to MongoDB with the next batch
+        message = await asyncio.wrap_future(chat.writer.submit(
+            auction,
+            message_data['sender_username'],
+            message_data['receiver_username'],
+            message_data['message'],
+        ))
+
+        # Acknowledge to the sender once the batch has been committed
+        if 'client_id' in message_data:
+            await self.queue_send(**self.codec.encode(
+                protocol.ACK_EVENT, 'ack', {'client_id': message_data['client_id'], 'message_id': str(message.id)},
+            ))
 
         # Send the message to the WebSocket group (to notify all connected users)
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'message_event',
-                'message': message_data
+                'message': message_data,
+                'timestamp': int(time.time() * 1000)
             }
         )
 
     async def message_event(self, event):
         # Send the message to WebSocket
         message = event['message']
-        await self.send(text_data=json.dumps({
-            'message': message
-        }))
\ No newline at end of file
+        await self.queue_send(**self.codec.encode(
+            protocol.CHAT_EVENT, 'message', message,
+            auction_id=self.auction_id,
+            timestamp=event.get('timestamp'),
+        ))
\ No newline at end of file
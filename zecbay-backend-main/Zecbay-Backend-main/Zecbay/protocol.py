@@ -0,0 +1,82 @@
+# Zecbay/protocol.py
+import json
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; clients fall back to JSON
+    msgpack = None
+
+# WebSocket subprotocols a client may request in Sec-WebSocket-Protocol
+JSON_SUBPROTOCOL    = 'zecbay.json.v1'
+MSGPACK_SUBPROTOCOL = 'zecbay.msgpack.v1'
+
+# Event type tags used by the compact binary schema
+BID_EVENT   = 1
+PRICE_EVENT = 2
+CHAT_EVENT  = 3
+ERROR_EVENT = 4
+ACK_EVENT   = 5
+
+# Field order of each compact event (after the type tag)
+BID_FIELDS   = ('auction_id', 'exporterId', 'pricePerQuantity', 'bidMMQ', 'round', 'timestamp')
+PRICE_FIELDS = ('auction_id', 'current_price', 'winner_bid_id', 'timestamp')
+CHAT_FIELDS  = ('auction_id', 'sender_username', 'receiver_username', 'message', 'timestamp')
+ERROR_FIELDS = ('error',)
+ACK_FIELDS   = ('client_id', 'message_id')
+
+SCHEMAS = {
+    BID_EVENT: BID_FIELDS,
+    PRICE_EVENT: PRICE_FIELDS,
+    CHAT_EVENT: CHAT_FIELDS,
+    ERROR_EVENT: ERROR_FIELDS,
+    ACK_EVENT: ACK_FIELDS,
+}
+
+
+class JsonCodec:
+    """ Default text protocol: the payload wrapped in a keyed JSON object """
+    subprotocol = None
+
+    def encode(self, event_type, key, payload, **context):
+        return {'text_data': json.dumps({key: payload})}
+
+    def decode(self, text_data=None, bytes_data=None):
+        return json.loads(text_data)
+
+
+class MsgpackCodec:
+    """
+    Binary protocol: each event is a MessagePack array
+    ``[type, field1, field2, ...]`` in the order given by SCHEMAS.
+    """
+    subprotocol = MSGPACK_SUBPROTOCOL
+
+    def encode(self, event_type, key, payload, **context):
+        # Server-side context (auction id, timestamp) fills fields the client payload lacks;
+        # a scalar payload (an error code) is the value of its own key
+        values = dict(context, **(payload if isinstance(payload, dict) else {key: payload}))
+        fields = SCHEMAS[event_type]
+        return {'bytes_data': msgpack.packb([event_type] + [values.get(f) for f in fields])}
+
+    def decode(self, text_data=None, bytes_data=None):
+        # Clients may still send text frames; binary frames are MessagePack maps
+        if bytes_data is None:
+            return json.loads(text_data)
+        return msgpack.unpackb(bytes_data, raw=False)
+
+
+def unpack_event(data):
+    """ Expands a compact binary event back into ``(event_type, payload)`` """
+    values = msgpack.unpackb(data, raw=False)
+    event_type = values[0]
+    return event_type, dict(zip(SCHEMAS[event_type], values[1:]))
+
+
+def negotiate(subprotocols):
+    """ Picks the codec for the subprotocols offered by the client (JSON by default) """
+    if msgpack is not None and MSGPACK_SUBPROTOCOL in subprotocols:
+        return MsgpackCodec()
+    codec = JsonCodec()
+    if JSON_SUBPROTOCOL in subprotocols:
+        codec.subprotocol = JSON_SUBPROTOCOL
+    return codec
@@ -4,3 +4,27 @@ from django.apps import AppConfig
 class WebConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'web'
+
+    def ready(self):
+        from . import chat, inbox, metrics, mongo, registrations, rollups, signals, stats
+
+        # Attribute MongoDB commands to requests; listeners must exist before the client does
+        metrics.install()
+
+        # Define the MongoDB connection on first use and warm it up in the background
+        mongo.install()
+
+        # Keep conversation summaries in step with every committed chat batch
+        chat.writer.flush_listeners.append(inbox.record_messages)
+
+        # Invalidate cached responses when auctions, bids, messages or users change
+        signals.connect()
+
+        # Decrement register_count for registrations removed with a deleted user
+        registrations.connect()
+
+        # Maintain the admin dashboard counters incrementally
+        stats.connect()
+
+        # Roll new bids and auctions into the hourly and daily analytics buckets
+        rollups.connect()
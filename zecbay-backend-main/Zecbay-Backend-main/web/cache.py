@@ -0,0 +1,379 @@
+# web/cache.py
+import threading
+import time
+import uuid
+from collections        import OrderedDict
+from functools          import wraps
+from django.conf        import settings
+from django.core.cache  import caches
+from django.http        import HttpResponse
+from mongoengine        import Document, FloatField, IntField, StringField
+from pymongo            import ReturnDocument, UpdateOne
+
+DEFAULTS = {
+    'LOCAL_MAX_ENTRIES': 512,           # In-process LRU tier size
+    'LOCAL_MAX_BYTES': 16 * 1024 * 1024,
+    'TTL': 30,                          # Default seconds an entry may be served
+    'SHARED_ALIAS': None,               # Django cache alias for the shared tier (e.g. Redis), optional
+    'TAG_STORE': 'local',               # Where tag versions live: 'shared', 'mongo' or 'local' (one process only)
+}
+
+# Invalidation tags
+LISTING_TAG = 'listing'     # Auction listings (any auction, bid or close changes them)
+USERS_TAG   = 'users'       # Responses that embed usernames or user details
+
+def auction_tag(auction_id):
+    return f"auction:{auction_id}"
+
+def messages_tag(auction_id):
+    return f"messages:{auction_id}"
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'RESPONSE_CACHE', {}))
+    return config
+
+
+class LRUCache:
+    """ Thread-safe, size-bounded LRU of encoded response bodies """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, size, expires_at)
+        self.bytes = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, size, ttl):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, size, time.monotonic() + ttl)
+            self.bytes += size
+            while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+
+class LocalTagStore:
+    """ Tag versions in this process's memory; correct only when a single process serves requests """
+
+    def __init__(self):
+        self.versions_by_tag = {}
+        self.due = {}  # tag -> wall clock time it must be invalidated at
+        self.epoch_id = uuid.uuid4().hex[:8]
+        self.lock = threading.Lock()
+
+    def versions(self, tags, now):
+        with self.lock:
+            for tag in tags:
+                if self.due.get(tag, now + 1) <= now:
+                    del self.due[tag]
+                    self.versions_by_tag[tag] = self.versions_by_tag.get(tag, 0) + 1
+            return {tag: self.versions_by_tag.get(tag, 0) for tag in tags}
+
+    def bump(self, tags):
+        with self.lock:
+            for tag in tags:
+                self.versions_by_tag[tag] = self.versions_by_tag.get(tag, 0) + 1
+
+    def schedule(self, tag, at):
+        with self.lock:
+            if at < self.due.get(tag, float('inf')):
+                self.due[tag] = at
+
+    def epoch(self):
+        return self.epoch_id
+
+    def clear(self):
+        with self.lock:
+            self.versions_by_tag.clear()
+            self.due.clear()
+
+
+class SharedTagStore:
+    """ Tag versions in the shared Django cache tier (e.g. Redis), seen by every process """
+
+    def __init__(self, cache, epoch_id):
+        self.cache = cache
+        self.epoch_id = epoch_id
+
+    def versions(self, tags, now):
+        keys = [f"tag:{tag}" for tag in tags]
+        due_keys = [f"due:{tag}" for tag in tags]
+        found = self.cache.get_many(keys + due_keys)
+        expired = [tag for tag, key in zip(tags, due_keys) if key in found and found[key] <= now]
+        if expired:
+            self.cache.delete_many([f"due:{tag}" for tag in expired])
+            self.bump(expired)
+            found.update(self.cache.get_many([f"tag:{tag}" for tag in expired]))
+        return {tag: found.get(key, 0) for tag, key in zip(tags, keys)}
+
+    def bump(self, tags):
+        for tag in tags:
+            key = f"tag:{tag}"
+            # incr is atomic on shared backends; add seeds the counter
+            if not self.cache.add(key, 1, timeout=None):
+                try:
+                    self.cache.incr(key)
+                except ValueError:
+                    self.cache.set(key, 1, timeout=None)
+
+    def schedule(self, tag, at):
+        key = f"due:{tag}"
+        current = self.cache.get(key)
+        if current is None or at < current:
+            self.cache.set(key, at, timeout=None)
+
+    def epoch(self):
+        self.cache.add('tag-epoch', self.epoch_id, timeout=None)
+        return self.cache.get('tag-epoch') or self.epoch_id
+
+    def clear(self):
+        pass
+
+
+class CacheTag(Document):
+    """ Version of one invalidation tag, and when it is next due to be bumped (MongoTagStore) """
+    tag     =   StringField     (primary_key=True)
+    v       =   IntField        (default=0)
+    due     =   FloatField      ()
+
+    meta = {'collection': 'cache_tags'}
+
+EPOCH_TAG = '__epoch__'
+
+class MongoTagStore:
+    """
+    Tag versions in the cache_tags collection, for deploys without a shared
+    cache tier: every process reads the same counters, at the cost of one
+    _id lookup per cached read and one bulk upsert per write.
+    """
+
+    def __init__(self):
+        self.epoch_id = None
+
+    def versions(self, tags, now):
+        collection = CacheTag._get_collection()
+        rows = {row['_id']: row for row in collection.find({'_id': {'$in': list(tags)}})}
+        for tag, row in list(rows.items()):
+            if row.get('due') is not None and row['due'] <= now:
+                # Only one process applies a due invalidation; the others read its result
+                rows[tag] = collection.find_one_and_update(
+                    {'_id': tag, 'due': {'$lte': now}}, {'$inc': {'v': 1}, '$unset': {'due': ''}},
+                    return_document=ReturnDocument.AFTER,
+                ) or collection.find_one({'_id': tag}) or row
+        return {tag: rows[tag].get('v', 0) if tag in rows else 0 for tag in tags}
+
+    def bump(self, tags):
+        if tags:
+            CacheTag._get_collection().bulk_write(
+                [UpdateOne({'_id': tag}, {'$inc': {'v': 1}}, upsert=True) for tag in tags], ordered=False,
+            )
+
+    def schedule(self, tag, at):
+        # $min keeps an earlier pending schedule
+        CacheTag._get_collection().update_one({'_id': tag}, {'$min': {'due': at}}, upsert=True)
+
+    def epoch(self):
+        # Counters outlive restarts; the epoch only changes if the collection is dropped
+        if self.epoch_id is None:
+            row = CacheTag._get_collection().find_one_and_update(
+                {'_id': EPOCH_TAG}, {'$setOnInsert': {'epoch': uuid.uuid4().hex[:8]}},
+                upsert=True, return_document=ReturnDocument.AFTER,
+            )
+            self.epoch_id = row['epoch']
+        return self.epoch_id
+
+    def clear(self):
+        pass
+
+
+class TieredCache:
+    """
+    In-process LRU tier in front of an optional shared Django cache tier.
+
+    Invalidation is tag based: every entry remembers the version of each of its
+    tags when it was stored, and bumping a tag's version makes those entries
+    stale everywhere. Where the versions live is the TAG_STORE setting:
+    'shared' (the shared tier), 'mongo' (the cache_tags collection) or 'local'
+    (this process only). Only the first two reach every worker process.
+    """
+
+    def __init__(self):
+        self._local = None
+        self._local_tags = LocalTagStore()
+        self._mongo_tags = MongoTagStore()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @property
+    def local(self):
+        if self._local is None:
+            config = get_config()
+            self._local = LRUCache(config['LOCAL_MAX_ENTRIES'], config['LOCAL_MAX_BYTES'])
+        return self._local
+
+    @property
+    def shared(self):
+        alias = get_config()['SHARED_ALIAS']
+        return caches[alias] if alias else None
+
+    @property
+    def tags(self):
+        store = get_config()['TAG_STORE']
+        if store == 'shared':
+            return SharedTagStore(self.shared, self._local_tags.epoch_id)
+        if store == 'mongo':
+            return self._mongo_tags
+        if store == 'local':
+            return self._local_tags
+        raise ValueError(f"Unknown response cache TAG_STORE: {store}")
+
+    @property
+    def tags_are_shared(self):
+        """ Whether every process sees the same tag versions (required for validators) """
+        return get_config()['TAG_STORE'] in ('shared', 'mongo')
+
+    def tag_versions(self, tags):
+        """ Current version of each tag, applying any scheduled invalidation that has come due """
+        return self.tags.versions(list(tags), time.time())
+
+    def schedule_invalidation(self, tag, at):
+        """
+        Invalidates `tag` once the wall clock (epoch seconds) passes `at`, for
+        changes that happen without a write, such as an auction closing.
+        An earlier pending schedule wins.
+        """
+        self.tags.schedule(tag, at)
+
+    def epoch(self):
+        """
+        Identifies the lifetime of the version counters, so validators handed
+        out before they were reset never match again.
+        """
+        return self.tags.epoch()
+
+    def invalidate(self, *tags):
+        """ Marks every entry carrying any of `tags` as stale """
+        self.tags.bump(tags)
+
+    def get(self, key):
+        entry = self.local.get(key)
+        shared = self.shared
+        if entry is None and shared is not None:
+            entry = shared.get(f"resp:{key}")
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        body, versions = entry
+        if self.tag_versions(list(versions)) != versions:
+            self.stale += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return body
+
+    def set(self, key, body, versions, ttl=None):
+        """
+        Stores `body` under `key`. `versions` must be the tag versions read
+        *before* the body was computed, so a write that lands meanwhile leaves
+        the entry stale instead of hiding behind the newer version.
+        """
+        ttl = ttl or get_config()['TTL']
+        entry = (body, dict(versions))
+        self.local.set(key, entry, len(body), ttl)
+        shared = self.shared
+        if shared is not None:
+            shared.set(f"resp:{key}", entry, timeout=ttl)
+
+    def clear(self):
+        self.local.clear()
+        self._local_tags.clear()
+        self.hits = self.misses = self.stale = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        local = self.local
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'local_entries': len(local.entries),
+            'local_bytes': local.bytes,
+            'local_evictions': local.evictions,
+            'shared_tier': get_config()['SHARED_ALIAS'],
+            'tag_store': get_config()['TAG_STORE'],
+        }
+
+
+response_cache = TieredCache()
+
+def invalidate_auction(auction_id):
+    """ For write paths that bypass document signals (queryset updates) """
+    response_cache.invalidate(auction_tag(auction_id), LISTING_TAG)
+
+def cached_json_view(tags, ttl=None, bypass=None):
+    """
+    Caches successful JSON responses of a view, keyed by the full request path.
+    `tags(request, *args, **kwargs)` returns the invalidation tags of the response.
+    A view may set `response.cache_ttl` to shorten the lifetime of one response;
+    0 means do not cache it. Requests for which `bypass(request)` is true are
+    never cached (e.g. payloads that change every second).
+
+    The tags are also exposed as `view.cache_tags` so VersionedETagMiddleware can
+    answer conditional requests from tag versions alone.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method != 'GET' or (bypass is not None and bypass(request)):
+                return view_func(request, *args, **kwargs)
+
+            key = f"{view_func.__name__}:{request.get_full_path()}"
+            body = response_cache.get(key)
+            if body is not None:
+                response = HttpResponse(body, content_type='application/json')
+                response['X-Cache'] = 'HIT'
+                return response
+
+            versions = response_cache.tag_versions(tags(request, *args, **kwargs))
+            response = view_func(request, *args, **kwargs)
+            entry_ttl = ttl or get_config()['TTL']
+            if getattr(response, 'cache_ttl', None) is not None:
+                entry_ttl = min(entry_ttl, response.cache_ttl)
+            if response.status_code == 200 and not getattr(response, 'streaming', False) and entry_ttl > 0:
+                response_cache.set(key, response.content, versions, entry_ttl)
+                response['X-Cache'] = 'MISS'
+            return response
+
+        _wrapped_view.cache_tags = tags
+        _wrapped_view.cache_bypass = bypass
+        return _wrapped_view
+    return decorator
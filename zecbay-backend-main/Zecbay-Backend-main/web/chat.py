@@ -0,0 +1,184 @@
+# web/chat.py
+import atexit
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from bson               import ObjectId
+from bson.errors        import InvalidId
+from django.conf        import settings
+from .models            import Auction, Message
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_BATCH': 50,            # Flush as soon as this many messages are buffered
+    'MAX_DELAY_MS': 50,         # ...or once the oldest buffered message is this old
+    'ACK_TIMEOUT': 5,           # Seconds a sender waits for its message to be committed
+    'AUCTION_CACHE_TTL': 300,   # Seconds an auction id is remembered as existing
+    'MISSING_CACHE_TTL': 5,     # Seconds an unknown auction id is remembered as missing
+}
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'CHAT_WRITE_BEHIND', {}))
+    return config
+
+# auction id -> (ObjectId or None, expires_at)
+_auction_cache = {}
+_auction_cache_lock = threading.Lock()
+
+def resolve_auction(auction_id):
+    """
+    Returns the ObjectId of the auction if it exists, otherwise None.
+    Results are cached so a busy room does not re-check the auction per message.
+    """
+    now = time.monotonic()
+    with _auction_cache_lock:
+        cached = _auction_cache.get(auction_id)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    config = get_config()
+    try:
+        oid = ObjectId(auction_id)
+    except (InvalidId, TypeError):
+        return None
+
+    exists = Auction.objects(id=oid).only('id').first() is not None
+    ttl = config['AUCTION_CACHE_TTL'] if exists else config['MISSING_CACHE_TTL']
+    with _auction_cache_lock:
+        _auction_cache[auction_id] = (oid if exists else None, now + ttl)
+    return oid if exists else None
+
+def forget_auction(auction_id):
+    """ Drops a cached auction lookup (e.g. after the auction is deleted) """
+    with _auction_cache_lock:
+        _auction_cache.pop(str(auction_id), None)
+
+
+def insert_messages(docs):
+    """ Writes a batch of messages with a single ordered insert_many """
+    Message.objects.insert(docs, load_bulk=False)
+
+
+class ChatWriter:
+    """
+    Per-process write-behind buffer for chat messages.
+
+    Messages are buffered in arrival order and written with one ordered
+    insert_many per flush, so per-room ordering is preserved. Each submit
+    returns a Future that resolves with the saved Message only after its
+    batch has been committed, which is when the sender may be acknowledged.
+    """
+
+    def __init__(self, insert=insert_messages):
+        self.insert = insert
+        self._lock = threading.Condition()
+        self._flush_lock = threading.Lock()  # Serialises flushes so batches commit in order
+        self._pending = []  # [(Message, Future, submitted_at)]
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self.flush_listeners = []
+
+    def submit(self, auction, sender_username, receiver_username, message, timestamp=None):
+        doc = Message(
+            auction=auction,
+            sender_username=sender_username,
+            receiver_username=receiver_username,
+            message=message,
+        )
+        if timestamp is not None:
+            doc.timestamp = timestamp
+        # Assign the id up front so it reflects arrival order and survives a bulk insert
+        doc.id = ObjectId()
+        doc.validate()
+
+        future = Future()
+        with self._lock:
+            self._ensure_thread()
+            self._pending.append((doc, future, time.monotonic()))
+            # Wake the flusher to start the delay timer, or to flush a full batch
+            if len(self._pending) == 1 or len(self._pending) >= get_config()['MAX_BATCH']:
+                self._lock.notify()
+        return future
+
+    def flush(self):
+        """ Writes everything buffered so far in MAX_BATCH chunks; returns the number written """
+        written = 0
+        max_batch = get_config()['MAX_BATCH']
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch, self._pending = self._pending[:max_batch], self._pending[max_batch:]
+                if not batch:
+                    return written
+                written += self._write(batch)
+
+    def _write(self, batch):
+        # Called with the flush lock held
+        docs = [doc for doc, _, _ in batch]
+        try:
+            self.insert(docs)
+        except Exception as error:
+            for _, future, _ in batch:
+                future.set_exception(error)
+            return 0
+
+        for listener in self.flush_listeners:
+            try:
+                listener(docs)
+            except Exception as error:
+                log.exception("Chat flush listener failed")
+
+        for doc, future, _ in batch:
+            future.set_result(doc)
+        return len(docs)
+
+    def shutdown(self):
+        """ Stops the flusher and writes whatever is still buffered """
+        with self._lock:
+            self._stopping = True
+            self._lock.notify()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=get_config()['ACK_TIMEOUT'])
+        self.flush()
+
+    def _ensure_thread(self):
+        # Called with the lock held; restarts the flusher in forked worker processes
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='chat-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            config = get_config()
+            max_delay = config['MAX_DELAY_MS'] / 1000.0
+            with self._lock:
+                while not self._stopping:
+                    if self._pending:
+                        age = time.monotonic() - self._pending[0][2]
+                        if len(self._pending) >= config['MAX_BATCH'] or age >= max_delay:
+                            break
+                        self._lock.wait(max_delay - age)
+                    else:
+                        self._lock.wait()
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+
+writer = ChatWriter()
+atexit.register(writer.shutdown)
+
+def send(auction, sender_username, receiver_username, message, timestamp=None):
+    """ Buffers a chat message and blocks until it has been committed """
+    future = writer.submit(auction, sender_username, receiver_username, message, timestamp)
+    return future.result(timeout=get_config()['ACK_TIMEOUT'])
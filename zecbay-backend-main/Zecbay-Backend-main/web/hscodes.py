@@ -0,0 +1,147 @@
+# web/hscodes.py
+import re
+from pathlib            import Path
+from types              import MappingProxyType
+
+DATASET_PATH = Path(__file__).resolve().parent / 'data' / 'hs_codes.tsv'
+
+# HS chapters are 2 digits, headings 4 and subheadings 6; national tariff lines extend them to 8 or 10
+CODE_LENGTHS = (2, 4, 6, 8, 10)
+SEPARATORS_RE = re.compile(r'[\s.\-]')
+WORD_RE = re.compile(r'[0-9a-z]+')
+STOPWORDS = frozenset('and for not other the thereof with such kind than'.split())
+MAX_SUGGESTIONS = 50
+
+
+class HSCode:
+    __slots__ = ('code', 'description')
+
+    def __init__(self, code, description):
+        self.code = code
+        self.description = description
+
+    def as_dict(self):
+        return {'code': self.code, 'description': self.description, 'level': len(self.code)}
+
+
+class PrefixTrie:
+    """
+    Character trie in which every node holds, in order, the entries whose keys
+    start with the node's prefix. Lookups cost one dict hop per prefix
+    character plus the slice returned; nothing is scanned or sorted per query.
+    """
+
+    __slots__ = ('children', 'entries')
+
+    def __init__(self):
+        self.children = {}
+        self.entries = []
+
+    def insert(self, key, entry):
+        node = self
+        for char in key:
+            node = node.children.setdefault(char, PrefixTrie())
+            node.entries.append(entry)
+
+    def freeze(self, sort_key):
+        """ Sorts and tuples every node once the trie is fully built """
+        self.entries = tuple(sorted(set(self.entries), key=sort_key))
+        for child in self.children.values():
+            child.freeze(sort_key)
+
+    def find(self, prefix):
+        node = self
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return ()
+        return node.entries
+
+
+class HSIndex:
+    """ Immutable HS-code lookup: exact codes, code prefixes and description word prefixes """
+
+    def __init__(self, rows):
+        codes = {}
+        self.by_code = PrefixTrie()
+        self.by_word = PrefixTrie()
+        for code, description in rows:
+            entry = HSCode(code, description)
+            codes[code] = entry
+            self.by_code.insert(code, entry)
+            for word in set(WORD_RE.findall(description.lower())):
+                if len(word) > 2 and word not in STOPWORDS:
+                    self.by_word.insert(word, entry)
+        self.by_code.freeze(lambda entry: entry.code)
+        self.by_word.freeze(lambda entry: (len(entry.code), entry.code))
+        self.codes = MappingProxyType(codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def get(self, code):
+        return self.codes.get(code)
+
+    def describe(self, code):
+        """ The most specific listed entry `code` falls under (e.g. its heading), or None """
+        for length in range(len(code), 1, -1):
+            entry = self.codes.get(code[:length])
+            if entry is not None:
+                return entry
+        return None
+
+    def is_valid(self, code):
+        return len(code) in CODE_LENGTHS and code.isdigit() and code[:2] in self.codes
+
+    def suggest(self, query, limit=10):
+        """ Codes starting with a numeric query, or entries whose description has words starting with every term """
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        digits = normalize(query)
+        if digits.isdigit():
+            return list(self.by_code.find(digits)[:limit])
+
+        terms = WORD_RE.findall(query.lower())
+        if not terms:
+            return []
+        # Walk the rarest term's entries and check membership in the others
+        candidates = sorted((self.by_word.find(term) for term in terms), key=len)
+        matches = []
+        others = [set(entries) for entries in candidates[1:]]
+        for entry in candidates[0]:
+            if all(entry in entries for entries in others):
+                matches.append(entry)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+
+def normalize(code):
+    """ '5208.11', '5208 11' and '5208-11' all become '520811' """
+    return SEPARATORS_RE.sub('', code or '')
+
+def load(path=DATASET_PATH):
+    rows = []
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            code, description = line.split('\t', 1)
+            rows.append((code, description))
+    return HSIndex(rows)
+
+_index = None
+
+def get_index():
+    """ The bundled dataset, loaded on first use and shared afterwards """
+    global _index
+    if _index is None:
+        _index = load()
+    return _index
+
+def validate(code):
+    """ Returns the normalized code, or raises ValueError if it is not a known HS code """
+    normalized = normalize(code)
+    if not get_index().is_valid(normalized):
+        raise ValueError(f"Invalid HS code: {code}")
+    return normalized
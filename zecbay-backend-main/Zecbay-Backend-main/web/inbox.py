@@ -0,0 +1,77 @@
+# web/inbox.py
+from bson           import ObjectId
+from pymongo        import UpdateOne
+from .models        import Conversation, Message
+
+def record_messages(messages):
+    """
+    Updates the sender's and receiver's conversation summaries for a batch of
+    saved messages with one ordered bulk write of atomic $set/$inc upserts.
+    """
+    operations = []
+    for message in messages:
+        # Read the raw reference so the auction is not dereferenced
+        auction = message.to_mongo()['auction']
+        summary = {
+            'last_message': message.message,
+            'last_sender_username': message.sender_username,
+            'last_message_id': str(message.id),
+            'last_timestamp': message.timestamp,
+        }
+
+        # Sender's view of the thread: the counterparty is the receiver
+        operations.append(UpdateOne(
+            {'owner_username': message.sender_username, 'auction': auction,
+             'counterparty_username': message.receiver_username},
+            {'$set': summary, '$setOnInsert': {'unread_count': 0}},
+            upsert=True,
+        ))
+
+        # Receiver's view: one more unread message
+        operations.append(UpdateOne(
+            {'owner_username': message.receiver_username, 'auction': auction,
+             'counterparty_username': message.sender_username},
+            {'$set': summary, '$inc': {'unread_count': 0 if message.read else 1}},
+            upsert=True,
+        ))
+
+    if operations:
+        Conversation._get_collection().bulk_write(operations, ordered=True)
+
+def list_conversations(username, limit=50, before=None):
+    """ A user's conversations, most recent first; a single indexed read """
+    query = Conversation.objects(owner_username=username)
+    if before is not None:
+        query = query.filter(last_timestamp__lt=before)
+    rows = query.order_by('-last_timestamp').limit(limit).as_pymongo()
+    return [
+        {
+            'auction_id': str(row['auction']),
+            'counterparty': row['counterparty_username'],
+            'last_message': row.get('last_message'),
+            'last_sender': row.get('last_sender_username'),
+            'last_message_id': row.get('last_message_id'),
+            'last_timestamp': row['last_timestamp'].isoformat() if row.get('last_timestamp') else None,
+            'unread_count': row.get('unread_count', 0),
+        }
+        for row in rows
+    ]
+
+def unread_total(username):
+    """ Unread messages across all of a user's conversations, summed by the server """
+    rows = list(Conversation._get_collection().aggregate([
+        {'$match': {'owner_username': username, 'unread_count': {'$gt': 0}}},
+        {'$group': {'_id': None, 'total': {'$sum': '$unread_count'}}},
+    ]))
+    return rows[0]['total'] if rows else 0
+
+def mark_read(username, auction_id, counterparty_username):
+    """ Clears the unread counter for a thread and flags its messages as read """
+    auction = ObjectId(auction_id)
+    updated = Conversation.objects(
+        owner_username=username, auction=auction, counterparty_username=counterparty_username
+    ).update_one(set__unread_count=0)
+    Message.objects(
+        auction=auction, sender_username=counterparty_username, receiver_username=username, read=False
+    ).update(set__read=True)
+    return bool(updated)
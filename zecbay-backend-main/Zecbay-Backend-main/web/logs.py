@@ -0,0 +1,134 @@
+# web/logs.py
+import copy
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from datetime           import datetime, timezone
+from logging.handlers   import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'suppressed', 'dropped'}
+
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per line: time, level, logger, message, `extra` fields and any traceback """
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if getattr(record, 'dropped', 0):
+            entry['dropped'] = record.dropped
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Rate limits records at or below `level` to `rate` per second (bursts of
+    `burst`) for each call site, so a debug line inside a loop cannot flood
+    the output. The next record let through carries how many were dropped.
+    """
+
+    def __init__(self, rate=10.0, burst=20, level='DEBUG'):
+        super().__init__()
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.level = logging._checkLevel(level)
+        self.sites = {}  # (logger, pathname, lineno) -> [tokens, updated, suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > self.level:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            site = self.sites.get(key)
+            if site is None:
+                site = self.sites[key] = [self.burst, now, 0]
+            site[0] = min(self.burst, site[0] + (now - site[1]) * self.rate)
+            site[1] = now
+            if site[0] < 1:
+                site[2] += 1
+                return False
+            site[0] -= 1
+            record.suppressed, site[2] = site[2], 0
+        return True
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Waits for the thread to make room: with a full queue put_nowait would raise and leave it running
+        self.queue.put(self._sentinel)
+
+
+class AsyncHandler(QueueHandler):
+    """
+    Hands records to a background thread that formats and writes them, so a
+    request thread only pays for a copy and a queue put. When the queue is
+    full (the output cannot keep up) records are dropped and counted rather
+    than making the caller wait; the next record queued carries the count.
+    """
+
+    def __init__(self, stream='ext://sys.stdout', max_queue=10000):
+        super().__init__(queue.Queue(maxsize=max_queue))
+        if stream == 'ext://sys.stdout':
+            stream = sys.stdout
+        elif stream == 'ext://sys.stderr':
+            stream = sys.stderr
+        self.target = logging.StreamHandler(stream)
+        self.target.setFormatter(JsonFormatter())
+        self.dropped = 0
+        self.listener = _Listener(self.queue, self.target, respect_handler_level=False)
+        self.listener.start()
+        self.running = True
+
+    def setFormatter(self, formatter):
+        self.target.setFormatter(formatter)
+
+    def prepare(self, record):
+        # Resolve the message and traceback now: args may change once the caller moves on
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        # Called under the handler lock, so the count is not raced
+        if self.dropped:
+            record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped = 0
+
+    def flush(self):
+        """ Waits until every queued record has been written (logging calls this at exit) """
+        if self.running:
+            self.queue.join()
+        self.target.flush()
+
+    def close(self):
+        if self.running:
+            self.running = False
+            self.listener.stop()
+        super().close()
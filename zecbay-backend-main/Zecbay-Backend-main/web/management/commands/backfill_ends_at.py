@@ -0,0 +1,15 @@
+# web/management/commands/backfill_ends_at.py
+
+from django.core.management.base import BaseCommand
+from web.models import Auction, AUCTION_DURATION
+
+class Command(BaseCommand):
+    help = 'Set ends_at (created_at + auction duration) on auctions stored before the field existed'
+
+    def handle(self, *args, **kwargs):
+        # One server-side update; needs MongoDB 4.2+ for pipeline updates
+        result = Auction._get_collection().update_many(
+            {'ends_at': {'$exists': False}},
+            [{'$set': {'ends_at': {'$add': ['$created_at', int(AUCTION_DURATION.total_seconds() * 1000)]}}}],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Set ends_at on {result.modified_count} auctions"))
@@ -0,0 +1,80 @@
+# web/management/commands/backfill_registrations.py
+
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+from web.models import Auction, Registration, User
+
+class Command(BaseCommand):
+    help = 'Copy Auction.registered_users into the registrations collection and recompute register_count'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500, help='Auctions per batch'
+        )
+        parser.add_argument(
+            '--clear-legacy', action='store_true', help='Unset Auction.registered_users once copied'
+        )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        registrations = Registration._get_collection()
+        auctions = Auction._get_collection()
+
+        copied = recounted = 0
+        batch = []
+        cursor = auctions.find({}, {'registered_users': 1}).batch_size(batch_size)
+        for auction in cursor:
+            batch.append(auction)
+            if len(batch) >= batch_size:
+                copied += self.copy(batch, registrations)
+                recounted += self.recount(batch, registrations, auctions)
+                batch = []
+        if batch:
+            copied += self.copy(batch, registrations)
+            recounted += self.recount(batch, registrations, auctions)
+
+        if kwargs['clear_legacy']:
+            auctions.update_many({}, {'$unset': {'registered_users': ''}})
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied {copied} registrations and recounted {recounted} auctions"
+        ))
+
+    def copy(self, batch, registrations):
+        # One lookup for the usernames of every user referenced in the batch
+        user_ids = {user_id for auction in batch for user_id in auction.get('registered_users') or []}
+        usernames = {
+            row['_id']: row.get('username')
+            for row in User.objects(userid__in=list(user_ids)).only('username').as_pymongo()
+        }
+
+        operations = [
+            UpdateOne(
+                {'auction': auction['_id'], 'user': user_id},
+                {'$setOnInsert': {'username': usernames.get(user_id), 'registered_at': datetime.utcnow()}},
+                upsert=True,
+            )
+            for auction in batch
+            for user_id in auction.get('registered_users') or []
+            if user_id in usernames  # Skip users that no longer exist
+        ]
+        if not operations:
+            return 0
+        result = registrations.bulk_write(operations, ordered=False)
+        return result.upserted_count
+
+    def recount(self, batch, registrations, auctions):
+        counts = {
+            row['_id']: row['count']
+            for row in registrations.aggregate([
+                {'$match': {'auction': {'$in': [auction['_id'] for auction in batch]}}},
+                {'$group': {'_id': '$auction', 'count': {'$sum': 1}}},
+            ])
+        }
+        operations = [
+            UpdateOne({'_id': auction['_id']}, {'$set': {'register_count': counts.get(auction['_id'], 0)}})
+            for auction in batch
+        ]
+        auctions.bulk_write(operations, ordered=False)
+        return len(operations)
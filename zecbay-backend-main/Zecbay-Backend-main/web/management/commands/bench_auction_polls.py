@@ -0,0 +1,79 @@
+# web/management/commands/bench_auction_polls.py
+
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from web.cache import response_cache
+from web.management.commands.ws_loadtest import percentile
+from web.models import Auction
+
+class Command(BaseCommand):
+    help = 'Benchmark the steady-state cost of polling the auction list and detail endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--polls', type=int, default=200, help='Polls per endpoint and mode'
+        )
+        parser.add_argument(
+            '--auction-id', type=str, default='', help='Auction for the detail endpoint (defaults to the newest)'
+        )
+        parser.add_argument(
+            '--host', type=str, default='127.0.0.1', help='Host header (must be in ALLOWED_HOSTS)'
+        )
+        parser.add_argument(
+            '--json', action='store_true', help='Emit results as JSON'
+        )
+
+    def handle(self, *args, **kwargs):
+        auction_id = kwargs['auction_id']
+        if not auction_id:
+            newest = Auction.objects.order_by('-id').only('id').first()
+            if newest is None:
+                raise CommandError("No auctions to poll; pass --auction-id")
+            auction_id = str(newest.id)
+
+        client = Client(HTTP_HOST=kwargs['host'])
+        results = []
+        for path in ['/api/auctions/', f'/api/auctions/{auction_id}/']:
+            for mode in ['rebuild', 'cached', 'conditional']:
+                results.append(self.poll(client, path, mode, kwargs['polls']))
+
+        if kwargs['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'endpoint':<40} {'mode':<12} {'p50 ms':>8} {'p95 ms':>8} {'bytes/poll':>11} statuses")
+        for row in results:
+            self.stdout.write(
+                f"{row['path']:<40} {row['mode']:<12} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+                f"{row['bytes_per_poll']:>11} {row['statuses']}"
+            )
+
+    def poll(self, client, path, mode, polls):
+        # Prime the cache and fetch the current validator
+        etag = client.get(path).get('ETag')
+
+        timings, sizes, statuses = [], [], {}
+        for _ in range(polls):
+            headers = {}
+            if mode == 'rebuild':
+                response_cache.clear()  # Every poll rebuilds the JSON from Mongo, as before caching
+            elif mode == 'conditional' and etag:
+                headers['HTTP_IF_NONE_MATCH'] = etag
+
+            start = time.perf_counter()
+            response = client.get(path, **headers)
+            timings.append((time.perf_counter() - start) * 1000)
+            sizes.append(len(response.content))
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        return {
+            'path': path,
+            'mode': mode,
+            'polls': polls,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'bytes_per_poll': round(sum(sizes) / polls),
+            'statuses': statuses,
+        }
@@ -0,0 +1,77 @@
+# web/management/commands/bench_cold_start.py
+
+import json
+import os
+import subprocess
+import sys
+from django.core.management.base import BaseCommand
+from web.management.commands.ws_loadtest import percentile
+
+# Runs in a fresh interpreter: loads the app like a WSGI entry point, idles as a
+# process would until its first request, then times that request's first query
+CHILD = r'''
+import json, os, sys, time
+started = time.perf_counter()
+mode, idle = sys.argv[1], float(sys.argv[2])
+result = {}
+import django
+if mode == 'eager':
+    # What importing settings used to do: define the connection before anything else
+    from web import mongo
+    mongo.register()
+    result['register_ms'] = mongo.timings.get('register', 0.0) * 1000
+django.setup()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+result['startup_ms'] = (time.perf_counter() - started) * 1000
+time.sleep(idle)
+first = time.perf_counter()
+try:
+    from mongoengine.connection import get_db
+    get_db().command('ping')
+    result['first_query_ms'] = (time.perf_counter() - first) * 1000
+except Exception as error:
+    result['error'] = str(error).strip().splitlines()[0]
+result['ready_ms'] = (time.perf_counter() - started - idle) * 1000
+print(json.dumps(result))
+'''
+
+MODES = {
+    'eager': '0',   # Connection defined at import, as before
+    'lazy': '0',    # Defined by the first query
+    'warm': '1',    # Defined and pinged by the background warm-up
+}
+
+class Command(BaseCommand):
+    help = 'Benchmark process start-up and time to first MongoDB query with eager, lazy and warmed-up connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes per mode')
+        parser.add_argument('--idle-ms', type=int, default=200,
+                            help='Time between start-up and the first request (routing, the platform handing over the request)')
+        parser.add_argument('--modes', default=','.join(MODES), help='Comma-separated subset of eager,lazy,warm')
+
+    def handle(self, *args, **kwargs):
+        report = {}
+        for mode in kwargs['modes'].split(','):
+            env = dict(os.environ, MONGODB_WARM_UP=MODES[mode], PYTHONPATH=os.pathsep.join(sys.path))
+            runs = []
+            for _ in range(kwargs['runs']):
+                output = subprocess.run(
+                    [sys.executable, '-c', CHILD, mode, str(kwargs['idle_ms'] / 1000)],
+                    env=env, capture_output=True, text=True, check=True,
+                ).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            report[mode] = self.summary(runs)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def summary(self, runs):
+        summary = {}
+        for key in ('register_ms', 'startup_ms', 'first_query_ms', 'ready_ms'):
+            values = [run[key] for run in runs if key in run]
+            if values:
+                summary[key] = {'p50': round(percentile(values, 50), 1), 'max': round(max(values), 1)}
+        errors = sorted({run['error'] for run in runs if 'error' in run})
+        if errors:
+            summary['errors'] = errors
+        return summary
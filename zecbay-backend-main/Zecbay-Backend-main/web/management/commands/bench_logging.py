@@ -0,0 +1,123 @@
+# web/management/commands/bench_logging.py
+
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from mongoengine.context_managers import switch_collection
+from web import logs, views
+from web.management.commands.bench_search import synthetic_auction
+from web.management.commands.ws_loadtest import percentile
+from web.models import Auction, User
+
+# How each scenario emits the per-auction trace of a listing
+MODES = {
+    'print': 'A synchronous print() per auction, as the listing used to',
+    'off': 'log.debug() per auction with DEBUG disabled',
+    'debug': 'log.debug() per auction with DEBUG on, sampled and written from the queue',
+    'debug_unsampled': 'log.debug() per auction with DEBUG on and no sampling',
+}
+
+class Command(BaseCommand):
+    help = 'Benchmark listing latency with debug logging off, on (sampled and async) and as synchronous prints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--auctions', type=int, default=500, help='Auctions per listing')
+        parser.add_argument('--requests', type=int, default=200, help='Listings per scenario')
+        parser.add_argument('--output', default=os.devnull,
+                            help='Where log output goes (a file or pipe shows the cost of a real stdout)')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--mongo', action='store_true',
+                            help='Also seed scratch collections (auctions_bench, users_bench) and time the get_auctions view')
+
+    def handle(self, *args, **kwargs):
+        rng = random.Random(kwargs['seed'])
+        now = datetime.utcnow()
+        docs = [dict(synthetic_auction(rng, now), user=rng.randint(1, 20), bids=[]) for _ in range(kwargs['auctions'])]
+        report = {'auctions': len(docs), 'output': kwargs['output']}
+
+        with open(kwargs['output'], 'w') as output:
+            for mode in MODES:
+                with self.logging(mode, output) as (log, handler):
+                    report[f"{mode}:emit_ms"] = self.summary([
+                        self.emit(mode, log, docs, output) for _ in range(kwargs['requests'])
+                    ])
+                    if handler is not None:
+                        handler.flush()
+                        report[f"{mode}:dropped"] = handler.dropped
+
+            if kwargs['mongo']:
+                report.update(self.bench_view(docs, kwargs['requests'], output))
+
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def logging(self, mode, output):
+        command = self
+
+        class Scope:
+            def __enter__(self):
+                self.log = logging.getLogger('web.views')
+                self.saved = (self.log.level, self.log.handlers[:], self.log.propagate)
+                self.handler = None
+                if mode != 'print':
+                    self.handler = logs.AsyncHandler(stream=output)
+                    if mode != 'debug_unsampled':
+                        self.handler.addFilter(logs.SamplingFilter())
+                    self.log.handlers = [self.handler]
+                    self.log.propagate = False
+                self.log.setLevel(logging.INFO if mode == 'off' else logging.DEBUG)
+                return self.log, self.handler
+
+            def __exit__(self, *exc):
+                self.log.level, self.log.handlers, self.log.propagate = self.saved
+                if self.handler is not None:
+                    self.handler.close()
+
+        return Scope()
+
+    def emit(self, mode, log, docs, output):
+        """ The listing's per-auction work that logging adds to, in ms per listing """
+        start = time.perf_counter()
+        for doc in docs:
+            entry = {'id': str(doc['_id']), 'ends_at': doc['ends_at'].isoformat(), 'bids_count': len(doc['bids'])}
+            if mode == 'print':
+                print(f"Listing auction {entry['id']} ends at {entry['ends_at']}", file=output, flush=True)
+            else:
+                log.debug("Listing auction", extra={'auction_id': entry['id'], 'ends_at': entry['ends_at'],
+                                                    'bids_count': entry['bids_count']})
+        return (time.perf_counter() - start) * 1000
+
+    def bench_view(self, docs, requests, output):
+        """ Full get_auctions requests (cache bypassed) against scratch collections """
+        report = {}
+        factory = RequestFactory()
+        with switch_collection(Auction, 'auctions_bench'), switch_collection(User, 'users_bench'):
+            auctions, users = Auction._get_collection(), User._get_collection()
+            auctions.delete_many({})
+            users.delete_many({})
+            auctions.insert_many(docs, ordered=False)
+            users.insert_many([{'_id': i, 'username': f"bench{i}"} for i in range(1, 21)], ordered=False)
+            try:
+                for mode in ('off', 'debug'):
+                    with self.logging(mode, output):
+                        timings = []
+                        for _ in range(requests):
+                            start = time.perf_counter()
+                            views.get_auctions(factory.get('/api/auctions/?legacy_time_left=1'))
+                            timings.append((time.perf_counter() - start) * 1000)
+                        report[f"{mode}:get_auctions_ms"] = self.summary(timings)
+            finally:
+                auctions.drop()
+                users.drop()
+        return report
+
+    def summary(self, values):
+        return {
+            'p50': round(percentile(values, 50), 3),
+            'p95': round(percentile(values, 95), 3),
+            'max': round(max(values), 3),
+        }
@@ -0,0 +1,120 @@
+# web/management/commands/bench_search.py
+
+import heapq
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from mongoengine.context_managers import switch_collection
+from web import search
+from web.management.commands.ws_loadtest import percentile
+from web.models import Auction
+
+CATEGORIES = {
+    "Textiles & Apparels": ["Cotton & Synthetic Fabrics", "Readymade Garments", "Home Textiles"],
+    "Engineering Goods & Machinery": ["Industrial Machinery", "Pumps & Valves", "Auto Components"],
+    "Leather & Footwear": ["Finished Leather", "Leather Footwear", "Leather Bags & Accessories"],
+    "Eco & Biodegradable Products": ["Areca Leaf Plates", "Bamboo Products", "Jute Bags"],
+}
+PRODUCTS = ['cotton', 'denim', 'shirt', 'pump', 'valve', 'gear', 'engine', 'leather', 'shoe', 'bag',
+            'bamboo', 'jute', 'plate', 'basmati', 'rice', 'steel', 'tile', 'granite', 'lamp', 'cable']
+ADJECTIVES = ['premium', 'organic', 'industrial', 'handmade', 'export', 'grade', 'bulk', 'recycled', 'durable', 'light']
+
+def synthetic_auction(rng, now):
+    category = rng.choice(list(CATEGORIES))
+    words = rng.sample(PRODUCTS, 2)
+    return {
+        '_id': ObjectId(),
+        'product_name': f"{rng.choice(ADJECTIVES)} {words[0]} {words[1]}",
+        'description': ' '.join(rng.choice(ADJECTIVES + PRODUCTS) for _ in range(20)),
+        'hs_code': f"{rng.randint(1, 9999):04d}{rng.randint(0, 99):02d}",
+        'category': category,
+        'subcategory': rng.choice(CATEGORIES[category]),
+        'initial_price': 100.0,
+        'current_price': round(rng.uniform(1, 1000), 2),
+        'unit': 'kg',
+        'quantity': '100',
+        'round': 1,
+        'total_rounds': 1,
+        'created_at': now,
+        'ends_at': now + timedelta(hours=rng.randint(-24, 24)),
+    }
+
+class Command(BaseCommand):
+    help = 'Benchmark auction search latency (inverted index in-process; optionally text and inverted backends against Mongo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--auctions', type=int, default=100000, help='Synthetic auctions to index')
+        parser.add_argument('--queries', type=int, default=200, help='Searches per scenario')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--mongo', action='store_true',
+                            help='Also seed a scratch collection (auctions_bench) and time full searches against Mongo')
+        parser.add_argument('--keep', action='store_true', help='Keep the scratch collection afterwards')
+
+    def handle(self, *args, **kwargs):
+        rng = random.Random(kwargs['seed'])
+        now = datetime.utcnow()
+        docs = [synthetic_auction(rng, now) for _ in range(kwargs['auctions'])]
+        queries = [' '.join(rng.sample(PRODUCTS + ADJECTIVES, rng.randint(1, 3))) for _ in range(kwargs['queries'])]
+        report = {'auctions': len(docs)}
+
+        # In-process inverted index: build time and score + rank latency
+        index = search.InvertedIndex()
+        start = time.perf_counter()
+        for doc in docs:
+            index.add(doc)
+        report['inverted_build_s'] = round(time.perf_counter() - start, 3)
+
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            scores = index.score(query)
+            heapq.nlargest(20, scores, key=scores.get)
+            timings.append((time.perf_counter() - start) * 1000)
+        report['inverted_rank_ms'] = self.summary(timings)
+
+        if kwargs['mongo']:
+            report.update(self.bench_mongo(docs, queries, rng, kwargs['keep']))
+
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def bench_mongo(self, docs, queries, rng, keep):
+        report = {}
+        with switch_collection(Auction, 'auctions_bench'):
+            collection = Auction._get_collection()  # Creates the text and filter indexes
+            collection.delete_many({})
+            for offset in range(0, len(docs), 5000):
+                collection.insert_many(docs[offset:offset + 5000], ordered=False)
+
+            scenarios = {
+                'text_query': lambda q: search.search(q),
+                'text_query_category_price': lambda q: search.search(
+                    q, category=rng.choice(list(CATEGORIES)), min_price=100.0, max_price=500.0),
+                'browse_category_page_5': lambda q: search.search('', page=5, category=rng.choice(list(CATEGORIES))),
+            }
+            try:
+                for backend in ('text', 'inverted'):
+                    search.inverted_index = search.InvertedIndex()
+                    with override_settings(SEARCH={'BACKEND': backend, 'FACET_TTL': 0.001}):
+                        for name, run in scenarios.items():
+                            timings = []
+                            for query in queries:
+                                start = time.perf_counter()
+                                run(query)
+                                timings.append((time.perf_counter() - start) * 1000)
+                            report[f"{backend}:{name}_ms"] = self.summary(timings)
+            finally:
+                search.inverted_index = search.InvertedIndex()
+                if not keep:
+                    collection.drop()
+        return report
+
+    def summary(self, values):
+        return {
+            'p50': round(percentile(values, 50), 3),
+            'p95': round(percentile(values, 95), 3),
+            'max': round(max(values), 3),
+        }
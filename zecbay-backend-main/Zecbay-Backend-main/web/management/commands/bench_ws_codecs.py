@@ -0,0 +1,106 @@
+# web/management/commands/bench_ws_codecs.py
+
+import json
+import random
+import time
+import zlib
+from django.core.management.base import BaseCommand, CommandError
+from Zecbay import protocol
+
+class Command(BaseCommand):
+    help = 'Benchmark bytes per event and serialization CPU for the JSON and MessagePack WebSocket protocols'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--events', type=int, default=2000, help='Events published per event type'
+        )
+        parser.add_argument(
+            '--group-sizes', type=str, default='10,100,500', help='Comma separated group sizes to simulate'
+        )
+        parser.add_argument(
+            '--json', action='store_true', help='Emit results as JSON'
+        )
+
+    def handle(self, *args, **kwargs):
+        if protocol.msgpack is None:
+            raise CommandError("msgpack is not installed")
+
+        events = kwargs['events']
+        group_sizes = [int(size) for size in kwargs['group_sizes'].split(',')]
+        codecs = {'json': protocol.JsonCodec(), 'msgpack': protocol.MsgpackCodec()}
+
+        results = []
+        for event_type, key, make_payload in self.event_generators():
+            payloads = [make_payload(i) for i in range(events)]
+            for name, codec in codecs.items():
+                # Each recipient encodes its own frame, so CPU scales with group size
+                start = time.perf_counter()
+                frames = [codec.encode(event_type, key, payload, auction_id='6650f1c2a9d3e40012ab34cd', timestamp=1718000000000 + i)
+                          for i, payload in enumerate(payloads)]
+                encode_seconds = (time.perf_counter() - start) / events
+                raw = [frame['text_data'].encode('utf-8') if 'text_data' in frame else frame['bytes_data']
+                       for frame in frames]
+
+                # permessage-deflate with context takeover, as negotiated by the ASGI server
+                # (the 4-byte sync flush trailer is stripped on the wire)
+                deflater = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+                deflated = sum(len(deflater.compress(data) + deflater.flush(zlib.Z_SYNC_FLUSH)) - 4 for data in raw)
+
+                for group_size in group_sizes:
+                    results.append({
+                        'event': key,
+                        'encoding': name,
+                        'group_size': group_size,
+                        'bytes_per_event': round(sum(len(data) for data in raw) / events, 1),
+                        'deflated_bytes_per_event': round(deflated / events, 1),
+                        'bytes_per_fanout': round(sum(len(data) for data in raw) / events * group_size),
+                        'encode_us_per_fanout': round(encode_seconds * group_size * 1e6, 1),
+                    })
+
+        if kwargs['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        header = f"{'event':<8}{'encoding':<10}{'group':>7}{'bytes':>9}{'deflated':>10}{'fanout B':>11}{'fanout us':>11}"
+        self.stdout.write(header)
+        for row in results:
+            self.stdout.write(
+                f"{row['event']:<8}{row['encoding']:<10}{row['group_size']:>7}{row['bytes_per_event']:>9}"
+                f"{row['deflated_bytes_per_event']:>10}{row['bytes_per_fanout']:>11}{row['encode_us_per_fanout']:>11}"
+            )
+
+    def event_generators(self):
+        rng = random.Random(42)
+
+        def bid(i):
+            # Shape of the payload the frontend sends today
+            return {
+                'exporterId': rng.randint(100000, 999999),
+                'product_name': 'Organic Cotton Yarn 40s',
+                'category': 'Textiles & Apparels',
+                'initial_price': 420.0,
+                'current_price': round(rng.uniform(300, 420), 2),
+                'mmq': 500,
+                'moq': 1000,
+                'round': 1,
+                'total_rounds': 3,
+                'time_left': f"{rng.randint(0, 23)}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+                'bidMMQ': 750,
+                'pricePerQuantity': round(rng.uniform(300, 420), 2),
+            }
+
+        def price(i):
+            return {'current_price': round(rng.uniform(300, 420), 2), 'winner_bid_id': '6650f1c2a9d3e40012ab%04x' % i}
+
+        def chat(i):
+            return {
+                'sender_username': 'ABCD1234',
+                'receiver_username': 'WXYZ9876',
+                'message': rng.choice(['Can you do 380?', 'Delivery in 3 weeks', 'Please share the spec sheet', 'Agreed']),
+            }
+
+        return [
+            (protocol.BID_EVENT, 'bid', bid),
+            (protocol.PRICE_EVENT, 'price', price),
+            (protocol.CHAT_EVENT, 'message', chat),
+        ]
@@ -0,0 +1,33 @@
+# web/management/commands/rebuild_inbox.py
+
+from django.core.management.base import BaseCommand
+from web.inbox import record_messages
+from web.models import Conversation, Message
+
+class Command(BaseCommand):
+    help = 'Rebuild conversation summaries and unread counters from the messages collection'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000, help='Messages per bulk write'
+        )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        Conversation.objects.delete()
+
+        # Replay messages in order so each summary ends on the latest message
+        batch, total = [], 0
+        for message in Message.objects.order_by('timestamp', 'id').no_dereference().batch_size(batch_size):
+            batch.append(message)
+            if len(batch) >= batch_size:
+                record_messages(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            record_messages(batch)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {Conversation.objects.count()} conversations from {total} messages"
+        ))
@@ -0,0 +1,31 @@
+# web/management/commands/rebuild_rollups.py
+
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from web import rollups
+
+class Command(BaseCommand):
+    help = 'Recompute the hourly and daily analytics rollups of a date range from the bids and auctions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from', dest='start', help='First day to rebuild (YYYY-MM-DD, UTC); defaults to 30 days ago'
+        )
+        parser.add_argument(
+            '--to', dest='end', help='Last day to rebuild (YYYY-MM-DD, UTC); defaults to today'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000, help='Bids read and written per batch'
+        )
+
+    def handle(self, *args, **kwargs):
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        try:
+            start = datetime.fromisoformat(kwargs['start']) if kwargs['start'] else today - timedelta(days=30)
+            end = datetime.fromisoformat(kwargs['end']) if kwargs['end'] else today
+        except ValueError as e:
+            raise CommandError(str(e))
+        counts = rollups.rebuild(start, end + timedelta(days=1), batch_size=kwargs['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rollups from {start.date()} to {end.date()}: {counts['auctions']} auctions, {counts['bids']} bids"
+        ))
@@ -0,0 +1,83 @@
+# web/management/commands/reconcile_orphans.py
+
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from mongoengine import Q
+from pymongo import ReplaceOne
+from web.models import Auction, Bids, Message, User
+
+# (document, reference field, referenced document) pairs checked for dangling references
+REFERENCES = [
+    (Message, 'auction', Auction),
+    (Bids, 'auctionID', Auction),
+    (Bids, 'exporterId', User),
+]
+
+class Command(BaseCommand):
+    help = 'Find messages and bids whose auction (or exporter) no longer exists, and delete or archive them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000, help='Documents checked per batch'
+        )
+        parser.add_argument(
+            '--archive', action='store_true', help='Copy orphans to <collection>_orphans before deleting them'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', help='Only count orphans'
+        )
+
+    def handle(self, *args, **kwargs):
+        for document, field, target in REFERENCES:
+            scanned, orphaned = self.reconcile(document, field, target, kwargs)
+            action = 'found' if kwargs['dry_run'] else ('archived' if kwargs['archive'] else 'deleted')
+            self.stdout.write(self.style.SUCCESS(
+                f"{document._get_collection_name()}.{field}: scanned {scanned}, {action} {orphaned} orphans"
+            ))
+
+    def reconcile(self, document, field, target, options):
+        collection = document._get_collection()
+        archive = collection.database[f"{collection.name}_orphans"]
+        scanned = orphaned = 0
+        last_id = None
+
+        # Walk the collection in _id order, one batch at a time, so deletes never disturb the scan
+        while True:
+            query = {'_id': {'$gt': last_id}} if last_id is not None else {}
+            batch = list(collection.find(query, {field: 1}).sort('_id', 1).limit(options['batch_size']))
+            if not batch:
+                break
+            last_id = batch[-1]['_id']
+            scanned += len(batch)
+
+            # One $in query for every reference in the batch
+            refs = {doc.get(field) for doc in batch}
+            existing = {
+                row['_id'] for row in target._get_collection().find({'_id': {'$in': list(refs)}}, {'_id': 1})
+            }
+            orphan_ids = [doc['_id'] for doc in batch if doc.get(field) not in existing]
+            if not orphan_ids:
+                continue
+            orphaned += len(orphan_ids)
+            if options['dry_run']:
+                continue
+
+            if options['archive']:
+                # Upserts, so a rerun after an interrupted batch archives nothing twice
+                archived_at = datetime.utcnow()
+                archive.bulk_write([
+                    ReplaceOne({'_id': doc['_id']}, dict(doc, archived_at=archived_at, orphaned_by=field), upsert=True)
+                    for doc in collection.find({'_id': {'$in': orphan_ids}})
+                ], ordered=False)
+            collection.delete_many({'_id': {'$in': orphan_ids}})
+            if document is Bids:
+                self.detach_bids(orphan_ids)
+
+        return scanned, orphaned
+
+    def detach_bids(self, bid_ids):
+        """ Bids orphaned by a deleted exporter may still be listed on a live auction """
+        for auction in Auction.objects(Q(bids__in=bid_ids) | Q(winner__in=bid_ids)):
+            Auction.objects(id=auction.id).update_one(pull_all__bids=bid_ids, inc__version=1)
+            auction.reload('version', 'current_price', 'winner')
+            auction.refresh_standing()
@@ -0,0 +1,14 @@
+# web/management/commands/reconcile_stats.py
+
+from django.core.management.base import BaseCommand
+from web import stats
+
+class Command(BaseCommand):
+    help = 'Recompute the admin dashboard stats snapshot from the collections'
+
+    def handle(self, *args, **kwargs):
+        snapshot = stats.reconcile()
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled: {snapshot['users']} users, {snapshot['auctions']} auctions, "
+            f"{snapshot['bids']} bids, {snapshot['messages']} messages"
+        ))
@@ -0,0 +1,332 @@
+# web/management/commands/ws_loadtest.py
+
+import asyncio
+import json
+import resource
+import time
+import tracemalloc
+from datetime                       import datetime
+from bson                           import ObjectId
+from django.core.management.base    import BaseCommand, CommandError
+from web                            import chat, inbox
+from web.models                     import AUCTION_DURATION, Auction, Bids, Message, User
+from Zecbay                         import protocol
+
+# Ids of the auctions and exporters seeded for an in-process run (removed afterwards)
+SEED_USERID_BASE = 990000000
+SEED_MARKER = 'ws_loadtest'
+
+def percentile(values, pct):
+    """ Nearest-rank percentile of a list of numbers """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def current_rss():
+    """ Resident set size right now in bytes (ru_maxrss is the peak), or None without /proc """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class InProcessSocket:
+    """ Drives Zecbay.asgi.application directly over the ASGI websocket interface """
+
+    def __init__(self, path, subprotocols):
+        from asgiref.testing    import ApplicationCommunicator
+        from Zecbay.asgi        import application
+        self.communicator = ApplicationCommunicator(application, {
+            'type': 'websocket',
+            'path': path,
+            'query_string': b'',
+            'headers': [],
+            'subprotocols': subprotocols,
+        })
+
+    async def connect(self, timeout):
+        await self.communicator.send_input({'type': 'websocket.connect'})
+        message = await self.communicator.receive_output(timeout)
+        return message['type'] == 'websocket.accept'
+
+    async def send(self, text_data=None, bytes_data=None):
+        if text_data is not None:
+            await self.communicator.send_input({'type': 'websocket.receive', 'text': text_data})
+        else:
+            await self.communicator.send_input({'type': 'websocket.receive', 'bytes': bytes_data})
+
+    async def receive(self, timeout):
+        message = await self.communicator.receive_output(timeout)
+        if message['type'] == 'websocket.close':
+            raise ConnectionError(f"closed with code {message.get('code')}")
+        return message.get('text') or message.get('bytes')
+
+    async def close(self):
+        await self.communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await self.communicator.wait(timeout=1)
+
+
+class RemoteSocket:
+    """ Talks to a running ASGI server over a real socket (requires the websockets package) """
+
+    def __init__(self, url, subprotocols):
+        self.url = url
+        self.subprotocols = subprotocols or None
+        self.ws = None
+
+    async def connect(self, timeout):
+        import websockets
+        self.ws = await asyncio.wait_for(websockets.connect(self.url, subprotocols=self.subprotocols), timeout)
+        return True
+
+    async def send(self, text_data=None, bytes_data=None):
+        await self.ws.send(text_data if text_data is not None else bytes_data)
+
+    async def receive(self, timeout):
+        return await asyncio.wait_for(self.ws.recv(), timeout)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+
+class Command(BaseCommand):
+    help = 'Open N WebSockets across M auctions, drive bid/chat traffic and report latency, throughput and errors as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=100, help='Total sockets to open')
+        parser.add_argument('--auctions', type=int, default=10, help='Auctions to spread the sockets across')
+        parser.add_argument('--auction-ids', type=str, default='',
+                            help='Comma separated auction ids; required with --url. In-process runs seed scratch '
+                                 'auctions and exporters when omitted and delete them afterwards')
+        parser.add_argument('--exporter-ids', type=str, default='',
+                            help='Comma separated user ids bids are placed as (required with --auction-ids for bids)')
+        parser.add_argument('--channel', choices=['bids', 'messages', 'both'], default='messages')
+        parser.add_argument('--bid-rate', type=float, default=0.2, help='Bids per second per bid socket')
+        parser.add_argument('--chat-rate', type=float, default=0.5, help='Chat messages per second per message socket')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds of traffic after all sockets connect')
+        parser.add_argument('--url', type=str, default='', help='Base ws:// URL of a running server (in-process when omitted)')
+        parser.add_argument('--msgpack', action='store_true', help='Negotiate the MessagePack subprotocol')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Connect timeout in seconds')
+        parser.add_argument('--output', type=str, default='', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['msgpack'] and protocol.msgpack is None:
+            raise CommandError("msgpack is not installed")
+        auction_ids = [a for a in kwargs['auction_ids'].split(',') if a]
+        exporter_ids = [int(e) for e in kwargs['exporter_ids'].split(',') if e]
+        if kwargs['url'] and not auction_ids:
+            raise CommandError("--auction-ids is required with --url")
+        if auction_ids and kwargs['channel'] != 'messages' and not exporter_ids:
+            raise CommandError("--exporter-ids is required to place bids on existing auctions")
+
+        seeded = None
+        if not auction_ids:
+            seeded = self.seed(kwargs['auctions'], kwargs['sockets'])
+            auction_ids, exporter_ids = seeded
+        try:
+            report = asyncio.run(self.run(kwargs, auction_ids, exporter_ids))
+        finally:
+            if seeded:
+                self.cleanup(*seeded)
+
+        payload = json.dumps(report, indent=2)
+        if kwargs['output']:
+            with open(kwargs['output'], 'w') as handle:
+                handle.write(payload)
+        else:
+            self.stdout.write(payload)
+
+    def seed(self, auctions, exporters):
+        """ Inserts scratch auctions and exporters so bids and chat reach real documents """
+        now = datetime.utcnow()
+        users = [{'_id': SEED_USERID_BASE + i, 'username': f"LOAD{i:04d}", 'email': f"load{i}@{SEED_MARKER}.invalid",
+                  'user_type': 'exporter'} for i in range(exporters + 1)]
+        User._get_collection().insert_many(users, ordered=False)
+        docs = [{
+            'product_name': SEED_MARKER, 'category': SEED_MARKER, 'description': SEED_MARKER,
+            'initial_price': 100.0, 'current_price': 100.0, 'unit': 'kg', 'quantity': '1', 'round': 1,
+            'total_rounds': 1, 'bids': [], 'created_at': now, 'ends_at': now + AUCTION_DURATION, 'user': users[-1]['_id'],
+            'register_count': 0, 'version': 0,
+        } for _ in range(auctions)]
+        result = Auction._get_collection().insert_many(docs)
+        return [str(oid) for oid in result.inserted_ids], [user['_id'] for user in users[:-1]]
+
+    def cleanup(self, auction_ids, exporter_ids):
+        oids = [ObjectId(a) for a in auction_ids]
+        chat.writer.flush()
+        Bids._get_collection().delete_many({'auctionID': {'$in': oids}})
+        Message._get_collection().delete_many({'auction': {'$in': oids}})
+        inbox.Conversation._get_collection().delete_many({'auction': {'$in': oids}})
+        Auction._get_collection().delete_many({'_id': {'$in': oids}})
+        User._get_collection().delete_many({'_id': {'$in': exporter_ids + [SEED_USERID_BASE + len(exporter_ids)]}})
+
+    async def run(self, options, auction_ids, exporter_ids):
+        self.exporter_ids = exporter_ids
+        subprotocols = [protocol.MSGPACK_SUBPROTOCOL] if options['msgpack'] else []
+        codec = protocol.MsgpackCodec() if options['msgpack'] else protocol.JsonCodec()
+
+        self.stats = {
+            'connect_ms': [],
+            'fanout_ms': [],
+            'sent': 0,
+            'received': 0,
+            'error_frames': {},
+            'errors': {'connect': 0, 'send': 0, 'receive': 0, 'closed': 0},
+        }
+
+        tracemalloc.start()
+        rss_before = current_rss()
+        heap_before = tracemalloc.get_traced_memory()[0]
+
+        sockets = []
+        for i in range(options['sockets']):
+            auction_id = auction_ids[i % len(auction_ids)]
+            channel = options['channel']
+            if channel == 'both':
+                channel = 'bids' if i % 2 == 0 else 'messages'
+            path = f"/ws/{channel}/{auction_id}/"
+            sock = RemoteSocket(options['url'].rstrip('/') + path, subprotocols) if options['url'] \
+                else InProcessSocket(path, subprotocols)
+            sockets.append((sock, channel, i))
+
+        connected = await asyncio.gather(*[self.open(sock, options['timeout']) for sock, _, _ in sockets])
+        live = [entry for entry, ok in zip(sockets, connected) if ok]
+
+        heap_after = tracemalloc.get_traced_memory()[0]
+        rss_after = current_rss()
+
+        started = time.perf_counter()
+        deadline = started + options['duration']
+        await asyncio.gather(*[
+            self.drive(sock, channel, index, codec, options, deadline) for sock, channel, index in live
+        ])
+        elapsed = time.perf_counter() - started
+
+        await asyncio.gather(*[sock.close() for sock, _, _ in live], return_exceptions=True)
+        tracemalloc.stop()
+
+        return {
+            'mode': 'remote' if options['url'] else 'in-process',
+            'encoding': 'msgpack' if options['msgpack'] else 'json',
+            'sockets': options['sockets'],
+            'connected': len(live),
+            'auctions': len(auction_ids),
+            'duration_s': round(elapsed, 3),
+            'connect_ms': self.summary(self.stats['connect_ms']),
+            'fanout_latency_ms': self.summary(self.stats['fanout_ms']),
+            'sent': self.stats['sent'],
+            'received': self.stats['received'],
+            'throughput_msgs_per_s': round(self.stats['received'] / elapsed, 1) if elapsed else None,
+            'memory_per_connection_bytes': {
+                'python_heap': round((heap_after - heap_before) / max(len(live), 1)),
+                'rss': round((rss_after - rss_before) / max(len(live), 1)) if rss_before is not None else None,
+            },
+            'error_frames': self.stats['error_frames'],
+            'errors': self.stats['errors'],
+        }
+
+    async def open(self, sock, timeout):
+        start = time.perf_counter()
+        try:
+            ok = await sock.connect(timeout)
+        except Exception:
+            ok = False
+        if ok:
+            self.stats['connect_ms'].append((time.perf_counter() - start) * 1000)
+        else:
+            self.stats['errors']['connect'] += 1
+        return ok
+
+    async def drive(self, sock, channel, index, codec, options, deadline):
+        rate = options['bid_rate'] if channel == 'bids' else options['chat_rate']
+        interval = 1.0 / rate if rate > 0 else None
+        receiver = asyncio.ensure_future(self.receive_loop(sock, codec, deadline))
+
+        seq = 0
+        while interval and time.perf_counter() < deadline:
+            frame = self.make_frame(channel, index, seq)
+            try:
+                await sock.send(text_data=json.dumps(frame))
+                self.stats['sent'] += 1
+            except Exception:
+                self.stats['errors']['send'] += 1
+                break
+            seq += 1
+            await asyncio.sleep(interval)
+
+        await receiver
+
+    async def receive_loop(self, sock, codec, deadline):
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return
+            try:
+                data = await sock.receive(timeout=remaining)
+            except (asyncio.TimeoutError, TimeoutError):
+                return
+            except ConnectionError:
+                self.stats['errors']['closed'] += 1
+                return
+            except Exception:
+                self.stats['errors']['receive'] += 1
+                return
+
+            event, sent_at = self.parse(data)
+            if event == 'error':
+                self.stats['error_frames'][sent_at] = self.stats['error_frames'].get(sent_at, 0) + 1
+                continue
+            self.stats['received'] += 1
+            if sent_at is not None:
+                self.stats['fanout_ms'].append((time.time() - sent_at) * 1000)
+
+    def make_frame(self, channel, index, seq):
+        # sent_at is echoed back in the group broadcast and used for fan-out latency
+        sent_at = time.time()
+        if channel == 'bids':
+            return {'bid': {
+                'exporterId': self.exporter_ids[index % len(self.exporter_ids)],
+                'pricePerQuantity': round(100.0 - seq * 0.01 - index * 0.0001, 4),
+                'bidMMQ': 1,
+                'round': 1,
+                'sent_at': sent_at,
+            }}
+        return {'message': {
+            'sender_username': f"LOAD{index:04d}",
+            'receiver_username': 'LOADHOST',
+            'message': f"load test message {seq}",
+            'sent_at': sent_at,
+        }}
+
+    def parse(self, data):
+        """ (event kind, sent_at) of a received frame; error frames give ('error', error code) """
+        try:
+            if isinstance(data, bytes):
+                # The compact binary schema only carries the server timestamp (milliseconds)
+                event_type, payload = protocol.unpack_event(data)
+                if event_type == protocol.ERROR_EVENT:
+                    return 'error', payload['error']
+                return event_type, payload['timestamp'] / 1000.0 if payload.get('timestamp') else None
+            body = json.loads(data)
+            if 'error' in body:
+                return 'error', body['error']
+            kind = next(iter(body), None)
+            event = body.get(kind)
+            return kind, event.get('sent_at') if isinstance(event, dict) else None
+        except Exception:
+            return None, None
+
+    def summary(self, values):
+        if not values:
+            return {'count': 0}
+        return {
+            'count': len(values),
+            'p50': round(percentile(values, 50), 3),
+            'p95': round(percentile(values, 95), 3),
+            'p99': round(percentile(values, 99), 3),
+            'max': round(max(values), 3),
+        }
@@ -0,0 +1,242 @@
+# web/metrics.py
+import logging
+import threading
+import time
+from collections        import deque
+from contextvars        import ContextVar
+import bson
+from django.conf        import settings
+from pymongo            import monitoring
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'TOKEN': None,          # Bearer token for /metrics; without one the endpoint only answers when DEBUG is on
+    'SLOW_MS': 500,         # Requests at least this slow go to the slow log
+    'SLOW_LOG_SIZE': 100,   # Slow requests kept in memory
+    'MAX_COMMANDS': 50,     # Commands per request kept for the slow log
+    'REPLY_BYTES': False,   # Measure reply sizes; re-encodes every reply to BSON, so only for investigations
+}
+
+# Histogram buckets
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+DOCUMENT_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+BYTE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024)
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'METRICS', {}))
+    return config
+
+
+class Histogram:
+    """ Prometheus histogram with labels, kept per process """
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {key: list(values) for key, values in self.series.items()}
+        for label_values in sorted(series):
+            values = series[label_values]
+            labels = ','.join(f'{name}="{escape(value)}"' for name, value in zip(self.labels, label_values))
+            prefix = labels + ',' if labels else ''
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {values[-1]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {values[-2]}')
+            lines.append(f'{self.name}_count{{{labels}}} {values[-1]}')
+        return '\n'.join(lines)
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_SECONDS = Histogram('zecbay_request_duration_seconds', 'Wall time of a request',
+                            ('view', 'method'), SECONDS_BUCKETS)
+MONGO_COMMANDS = Histogram('zecbay_request_mongo_commands', 'MongoDB commands issued by a request',
+                           ('view',), COUNT_BUCKETS)
+MONGO_SECONDS = Histogram('zecbay_request_mongo_duration_seconds', 'Time a request spent waiting on MongoDB',
+                          ('view',), SECONDS_BUCKETS)
+MONGO_DOCUMENTS = Histogram('zecbay_request_mongo_documents', 'Documents returned to a request by MongoDB',
+                            ('view',), DOCUMENT_BUCKETS)
+MONGO_BYTES = Histogram('zecbay_request_mongo_bytes', 'Reply bytes returned to a request by MongoDB',
+                        ('view',), BYTE_BUCKETS)
+HISTOGRAMS = (REQUEST_SECONDS, MONGO_COMMANDS, MONGO_SECONDS, MONGO_DOCUMENTS, MONGO_BYTES)
+
+def render():
+    """ Prometheus text exposition of this process's histograms """
+    return '\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n'
+
+
+class RequestMetrics:
+    """ MongoDB commands of one request """
+
+    def __init__(self, max_commands, reply_bytes):
+        self.commands = 0
+        self.seconds = 0.0
+        self.documents = 0
+        self.bytes = 0
+        self.log = []       # (command name, collection, command, seconds, documents), up to max_commands
+        self.pending = {}   # (connection, request id) -> (collection, command) of commands in flight
+        self.max_commands = max_commands
+        self.reply_bytes = reply_bytes
+
+    def server_timing(self, seconds):
+        return (f'app;dur={seconds * 1000:.1f}, '
+                f'mongo;dur={self.seconds * 1000:.1f};desc="{self.commands} commands, {self.documents} docs"')
+
+
+# Metrics of the request currently being tracked, if any
+_metrics = ContextVar('request_metrics', default=None)
+
+def begin():
+    config = get_config()
+    return _metrics.set(RequestMetrics(config['MAX_COMMANDS'], config['REPLY_BYTES']))
+
+def end(token):
+    metrics = _metrics.get()
+    _metrics.reset(token)
+    return metrics
+
+def current_metrics():
+    return _metrics.get()
+
+
+# Fields holding the filter of each command, for the slow log
+FILTER_FIELDS = {
+    'find': 'filter', 'aggregate': 'pipeline', 'count': 'query', 'distinct': 'query',
+    'findAndModify': 'query', 'update': 'updates', 'delete': 'deletes',
+}
+
+def returned_documents(name, reply):
+    cursor = reply.get('cursor')
+    if cursor is not None:
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', ())))
+    if name == 'findAndModify':
+        return int(reply.get('value') is not None)
+    return 0
+
+def shape(value, depth=0):
+    """ Structure of a filter with its values elided, so the slow log holds no user data """
+    if depth > 4:
+        return '...'
+    if isinstance(value, dict):
+        return {key: shape(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [shape(value[0], depth + 1)] if value and isinstance(value[0], (dict, list, tuple)) else '?'
+    return '?'
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """
+    Attributes every MongoDB command to the request that issued it. Events
+    run in the thread that sent the command, so the request context is at
+    hand; commands outside a tracked request are ignored.
+    """
+
+    def started(self, event):
+        metrics = _metrics.get()
+        if metrics is not None:
+            command = event.command
+            collection = command.get('collection' if event.command_name == 'getMore' else event.command_name)
+            metrics.pending[(event.connection_id, event.request_id)] = (
+                collection if isinstance(collection, str) else None, command,
+            )
+
+    def succeeded(self, event):
+        metrics = _metrics.get()
+        if metrics is None:
+            return
+        documents = returned_documents(event.command_name, event.reply)
+        size = len(bson.encode(event.reply)) if metrics.reply_bytes else 0
+        self.finish(metrics, event, documents, size)
+
+    def failed(self, event):
+        metrics = _metrics.get()
+        if metrics is not None:
+            self.finish(metrics, event, 0, 0)
+
+    def finish(self, metrics, event, documents, size):
+        collection, command = metrics.pending.pop((event.connection_id, event.request_id), (None, None))
+        seconds = event.duration_micros / 1e6
+        metrics.commands += 1
+        metrics.seconds += seconds
+        metrics.documents += documents
+        metrics.bytes += size
+        if len(metrics.log) < metrics.max_commands:
+            metrics.log.append((event.command_name, collection, command, seconds, documents))
+
+recorder = CommandRecorder()
+
+def install():
+    """ Registers the command listener; must run before the MongoDB client is created """
+    monitoring.register(recorder)
+
+
+# Slow requests
+
+slow_log = deque(maxlen=DEFAULTS['SLOW_LOG_SIZE'])
+
+def record_request(view, method, path, status, seconds, metrics):
+    REQUEST_SECONDS.observe(seconds, view, method)
+    MONGO_COMMANDS.observe(metrics.commands, view)
+    MONGO_SECONDS.observe(metrics.seconds, view)
+    MONGO_DOCUMENTS.observe(metrics.documents, view)
+    if metrics.reply_bytes:
+        MONGO_BYTES.observe(metrics.bytes, view)
+
+    config = get_config()
+    if seconds * 1000 < config['SLOW_MS']:
+        return
+    if slow_log.maxlen != config['SLOW_LOG_SIZE']:
+        resize_slow_log(config['SLOW_LOG_SIZE'])
+    entry = {
+        'at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'view': view,
+        'method': method,
+        'path': path,
+        'status': status,
+        'ms': round(seconds * 1000, 1),
+        'mongo_ms': round(metrics.seconds * 1000, 1),
+        'mongo_commands': metrics.commands,
+        'commands': [
+            {
+                'command': name,
+                'collection': collection,
+                'filter': shape(command.get(FILTER_FIELDS[name])) if command and name in FILTER_FIELDS else None,
+                'ms': round(command_seconds * 1000, 1),
+                'documents': documents,
+            }
+            for name, collection, command, command_seconds, documents in metrics.log
+        ],
+    }
+    slow_log.append(entry)
+    log.warning("Slow request", extra=entry)
+
+def resize_slow_log(size):
+    global slow_log
+    slow_log = deque(slow_log, maxlen=size)
+
+def slow_requests():
+    """ Slowest first """
+    return sorted(slow_log, key=lambda entry: -entry['ms'])
@@ -0,0 +1,115 @@
+# web/middleware.py
+import hashlib
+import hmac
+import time
+from django.conf        import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http  import quote_etag
+from .                  import metrics, writes
+from .cache             import response_cache
+
+class WriteCountMiddleware:
+    """ Reports the document writes a request issued in X-Write-Count / X-Write-Bytes """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = writes.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            stats = writes.end(token)
+
+        response['X-Write-Count'] = str(stats.writes)
+        response['X-Write-Bytes'] = str(stats.bytes)
+        if stats.collapsed:
+            response['X-Write-Collapsed'] = str(stats.collapsed)
+        return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Times each request and the MongoDB commands it issues, for the /metrics
+    histograms, the slow request log and a Server-Timing header. Commands run
+    while a streamed body is sent come after the header and are not counted.
+
+    The header tells anyone how long the database took, so it is only added
+    when DEBUG is on, for requests carrying the metrics token and for
+    signed-in admins.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def shows_timing(self, request):
+        if settings.DEBUG:
+            return True
+        token = metrics.get_config()['TOKEN']
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if token and supplied and hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8')):
+            return True
+        session = getattr(request, 'session', None)
+        if session is not None and session.get('admin_claim'):
+            from zecbay_admin.auth import claimed_admin
+            return claimed_admin(request) is not None
+        return False
+
+    def __call__(self, request):
+        token = metrics.begin()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            seconds = time.perf_counter() - started
+            request_metrics = metrics.end(token)
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else 'unresolved'
+        metrics.record_request(view, request.method, request.path, response.status_code, seconds, request_metrics)
+        if self.shows_timing(request):
+            response['Server-Timing'] = request_metrics.server_timing(seconds)
+        return response
+
+
+class VersionedETagMiddleware:
+    """
+    Conditional GET for views decorated with cached_json_view. The ETag is
+    derived from the versions of the response's invalidation tags (bumped on
+    every bid, registration, user change or auction close), so a matching
+    If-None-Match is answered with 304 without running the view or reading
+    any auction document.
+
+    Validators are only issued when the tag versions are shared by every
+    process (TAG_STORE 'shared' or 'mongo'). With process-local versions a
+    worker that never saw a write would keep answering 304 for stale data.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        etag = getattr(request, 'versioned_etag', None)
+        if etag and response.status_code == 200 and not response.has_header('ETag'):
+            response['ETag'] = etag
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        tags = getattr(view_func, 'cache_tags', None)
+        if tags is None or request.method not in ('GET', 'HEAD') or not response_cache.tags_are_shared:
+            return None
+        bypass = getattr(view_func, 'cache_bypass', None)
+        if bypass is not None and bypass(request):
+            return None
+
+        versions = response_cache.tag_versions(tags(request, *view_args, **view_kwargs))
+        request.versioned_etag = versioned_etag(request, versions)
+        return get_conditional_response(request, etag=request.versioned_etag)
+
+
+def versioned_etag(request, versions):
+    """ Weak validator over the request path and the tag versions it depends on """
+    state = request.get_full_path() + '|' + '|'.join(f"{tag}={versions[tag]}" for tag in sorted(versions))
+    digest = hashlib.sha1(state.encode('utf-8')).hexdigest()[:20]
+    return 'W/' + quote_etag(f"{response_cache.epoch()}-{digest}")
@@ -1,7 +1,12 @@
 # models.py
-from mongoengine    import Document, StringField, IntField, EmailField, FloatField, ReferenceField, DateTimeField, BooleanField, ListField, DictField, ValidationError
+from mongoengine    import Document, StringField, IntField, EmailField, FloatField, ReferenceField, DateTimeField, BooleanField, ListField, DictField, BinaryField, ValidationError, Q
+import logging
 import pytz
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from .cache import invalidate_auction
+from . import realtime, taxonomy, writes
+
+log = logging.getLogger(__name__)
 
 # Helper function to convert UTC time to IST
 def convert_to_ist(utc_time):
@@ -17,6 +22,17 @@ def convert_to_ist(utc_time):
     ist_time = utc_time.astimezone(ist_timezone)  # Convert to IST
     return ist_time
 
+def as_utc(value):
+    """ Treats naive datetimes (as stored by MongoDB) as UTC """
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+# How long an auction runs after it is created
+AUCTION_DURATION = timedelta(hours=24)
+
 class Business(Document):
     # Business Details fields
     business_name       =   StringField     (max_length=255, blank=True, null=True)
@@ -96,15 +112,32 @@ class Auction(Document):
 
     # Additional details
     created_at      =   DateTimeField   (default=datetime.utcnow, required=True)
+    ends_at         =   DateTimeField   ()  # UTC; created_at + AUCTION_DURATION, set at creation
 
     # Reference to User (User who created the auction)
     user            =   ReferenceField  (User, required=True)
 
-    # To store registered users' usernames
+    # Legacy list of registered users; registrations now live in the Registration collection
     registered_users = ListField        (ReferenceField(User, reverse_delete_rule=2), default=[])
+    register_count  =   IntField        (default=0, min_value=0)  # Maintained with $inc by web/registrations.py
+
+    # Bumped on every write to derived state; guards conditional updates
+    version         =   IntField        (default=0)
 
     meta = {
-        'collection': 'auctions'  # The name of the collection in MongoDB
+        'collection': 'auctions',  # The name of the collection in MongoDB
+        'indexes': [
+            # Full-text search (web/search.py); weights match search.WEIGHTS
+            {
+                'fields': ['$product_name', '$hs_code', '$description'],
+                'weights': {'product_name': 10, 'hs_code': 5, 'description': 1},
+                'default_language': 'english',
+                'name': 'auction_text',
+            },
+            ('category', 'subcategory', 'current_price'),  # Taxonomy and price filters
+            '-created_at',                                  # Admin auction list, newest first
+            'ends_at',                                      # Live auctions (search, stats reconciliation)
+        ]
     }
 
     def get_reverse_auction_winner(self):
@@ -114,44 +147,105 @@ class Auction(Document):
         if not self.bids:
             return None
 
-        print(f"Bids available: {self.bids}")
-
         # Fetch the actual Bids from the database using auction ID
-        bids = Bids.objects(auctionID=self)  # Query all bids associated with this auction
+        bids = list(Bids.objects(auctionID=self))  # Query all bids associated with this auction
 
         # Check if there are any bids available
         if not bids:
-            print("No bids found for this auction.")
+            log.debug("No bids found for auction", extra={'auction_id': str(self.pk)})
             return None
 
-        # Print the bids and their prices to help with debugging
-        for bid in bids:
-            print(f"Bid ID: {bid.id}, Price per Quantity: {bid.pricePerQuantity}")
-
         # Now sort the bids by pricePerQuantity in ascending order (lowest first)
         try:
             winner_bid = min(bids, key=lambda bid: bid.pricePerQuantity)
-        except Exception as e:
-            print(f"Error in selecting winner bid: {str(e)}")
+        except Exception:
+            log.exception("Error in selecting winner bid", extra={'auction_id': str(self.pk)})
             return None
 
+        log.debug("Reverse auction winner", extra={
+            'auction_id': str(self.pk), 'bids': len(bids),
+            'winner_bid_id': str(winner_bid.id), 'price': winner_bid.pricePerQuantity,
+        })
+
         # Return the winner bid object
         return winner_bid
 
-    def get_time_left(self):
-        # Convert UTC to IST
-        ist_time = convert_to_ist(self.created_at)
-
-        # Get current time in IST
-        current_time = datetime.now(pytz.timezone('Asia/Kolkata'))
-
-        print(f"IST Time: {ist_time}, Current Time in IST: {current_time}")
-
-        # Add 24 hours to the auction's created time
-        end_time = ist_time + timedelta(hours=24)
-
-        # Calculate time remaining
-        time_difference = end_time - current_time
+    def refresh_standing(self, retries=5):
+        """
+        Recomputes current_price and winner from the lowest bid and stores them
+        with a conditional partial update guarded by `version`.
+        No write is issued when neither value changes. Returns True if updated.
+        """
+        for _ in range(retries):
+            lowest = Bids.objects(auctionID=self.pk).order_by('pricePerQuantity', 'createdAt').first()
+            price = lowest.pricePerQuantity if lowest else self.initial_price
+            winner_id = lowest.pk if lowest else None
+
+            current_winner = self._data.get('winner')
+            current_winner_id = getattr(current_winner, 'id', None) if current_winner is not None else None
+            if price == self.current_price and winner_id == current_winner_id:
+                return False
+
+            # Documents written before versioning have no version field yet
+            guard = Q(version=self.version)
+            if not self.version:
+                guard = guard | Q(version__exists=False)
+
+            updated = Auction.objects(Q(pk=self.pk) & guard).update_one(
+                set__current_price=price,
+                set__winner=winner_id,
+                inc__version=1,
+            )
+            writes.record({'_id': self.pk, 'version': self.version},
+                          {'$set': {'current_price': price, 'winner': winner_id}, '$inc': {'version': 1}})
+            if updated:
+                self._data['current_price'] = price
+                self._data['winner'] = lowest
+                self._data['version'] = (self.version or 0) + 1
+                invalidate_auction(self.pk)
+                realtime.publish_price(self.pk, price, winner_id)
+                return True
+
+            # Lost a race with another writer; re-read and try again
+            self.reload('version', 'current_price', 'winner')
+        return False
+
+    def place_bid(self, exporter, price, created_at=None):
+        """
+        Saves a new bid on this auction, attaches it (with a version bump) in one
+        partial update and recomputes the price and winner. Returns the bid.
+        """
+        created_at = created_at or convert_to_ist(datetime.utcnow())
+        bid = Bids(
+            exporterId=exporter,
+            auctionID=self,
+            pricePerQuantity=price,
+            bidsMade=[f'{price} at {created_at.isoformat()}'],
+            createdAt=created_at,
+        )
+        writes.save(bid)
+
+        writes.push(self, 'bids', bid)
+        writes.inc(self, 'version')
+        writes.save(self)
+        self.reload('version', 'current_price', 'winner')
+
+        # Writes only when the price or winner changes
+        self.refresh_standing()
+        return bid
+
+    def get_ends_at(self):
+        """ UTC end time; derived from created_at for auctions stored before ends_at existed """
+        if self.ends_at:
+            return as_utc(self.ends_at)
+        return as_utc(self.created_at) + AUCTION_DURATION
+
+    def is_ended(self, now=None):
+        return self.get_ends_at() <= (now or datetime.now(timezone.utc))
+
+    def get_time_left(self, now=None):
+        """ Legacy "H:MM:SS" countdown; prefer get_ends_at() in API payloads """
+        time_difference = self.get_ends_at() - (now or datetime.now(timezone.utc))
 
         # If time remaining is greater than zero, calculate hours and minutes
         if time_difference.total_seconds() > 0:
@@ -167,100 +261,16 @@ class Auction(Document):
 
     def clean(self):
         super().clean()
-        category_map = {
-            "Textiles & Apparels": [
-                "Cotton & Synthetic Fabrics",
-                "Readymade Garments",
-                "Home Textiles",
-                "Woolen & Silk Products",
-                "Denim & Industrial Textiles",
-            ],
-            "Handicrafts & Home Decor": [
-                "Wooden Handicrafts",
-                "Metal Artware",
-                "Marble & Stone Handicrafts",
-                "Jute Products",
-                "Pottery & Ceramic Decor",
-                "Carpets & Rugs",
-            ],
-            "Engineering Goods & Machinery": [
-                "Industrial Machinery",
-                "Pumps & Valves",
-                "Auto Components",
-                "Electrical Equipment",
-                "Diesel Engines & Generators",
-                "Agricultural Implements",
-            ],
-            "Plastics & Polymers": [
-                "Plastic Packaging Materials",
-                "Household Plastic Items",
-                "PVC, HDPE, LDPE Products",
-                "Recycled Plastic Granules",
-            ],
-            "Leather & Footwear": [
-                "Finished Leather",
-                "Leather Footwear",
-                "Leather Bags & Accessories",
-                "Industrial Leather Gloves",
-            ],
-            "Building & Construction Materials": [
-                "Ceramic Tiles & Sanitaryware",
-                "Granite, Marble & Natural Stones",
-                "Cement & Clinker",
-                "Paints & Coatings",
-                "Steel & Iron Products",
-            ],
-            "Automobiles & Spare Parts": [
-                "Two-Wheelers",
-                "Three-Wheelers",
-                "Auto Spare Parts",
-                "Tires & Tubes",
-            ],
-            "Furniture & Wood Products": [
-                "Solid Wood Furniture",
-                "MDF & Particle Board",
-                "Office & School Furniture",
-                "Plywood & Veneers",
-            ],
-            "Eco & Biodegradable Products": [
-                "Areca Leaf Plates",
-                "Bamboo Products",
-                "Jute Bags",
-                "Paper Products",
-            ],
-            "Stationery & Printing": [
-                "Notebooks & Diaries",
-                "Printing Paper",
-                "Packaging Boxes",
-                "Office & Educational Supplies",
-            ],
-            "IT & Electronics": [
-                "Computer Accessories",
-                "Mobile Accessories",
-                "Consumer Electronics",
-                "LED Lights",
-            ]
-        }
+        if self.ends_at is None and self.created_at is not None:
+            self.ends_at = as_utc(self.created_at) + AUCTION_DURATION
 
         # Validate subcategory belongs to category
-        if self.category not in category_map:
-            raise ValidationError(f"Invalid category selected: {self.category}")
-        
-        if self.subcategory not in category_map[self.category]:
-            raise ValidationError(f"Subcategory '{self.subcategory}' does not belong to category '{self.category}'.")
+        taxonomy.validate(self.category, self.subcategory)
 
         # Custom unit validation
         if self.unit == 'other' and not getattr(self, 'custom_unit', None):
             raise ValidationError("Custom unit must be provided when 'other' is selected.")
 
-    def register_user(self, user):
-        if any(u.userid == user.userid for u in self.registered_users):
-            return False  # User is already registered
-        else:
-            self.registered_users.append(user)
-            self.save()  # Save the auction object with the updated registered_users list
-            return True
-
 class Bids(Document):
     exporterId          =   ReferenceField  ('User', required=True)  # Reference to the exporter (User)
     auctionID           =   ReferenceField  ('Auction', required=True)  # Reference to the Auction
@@ -276,22 +286,29 @@ class Bids(Document):
 
     # Create a descending index on createdAt to get the most recent bids first
     meta = {
-        'collection': 'bids'  # Name of the collection in MongoDB
+        'collection': 'bids',  # Name of the collection in MongoDB
+        'indexes': [
+            ('auctionID', 'pricePerQuantity'),  # Lowest bid per auction (refresh_standing)
+            '-createdAt',
+            ('exporterId', '-createdAt'),       # Admin bid list filtered by exporter
+        ]
     }
 
     def __str__(self):
         return f"Bid by {self.exporterId.username} for Auction: {self.auctionID.product_name}"
 
-    def add_bid_history(self, bid_value: float):
-        """ Adds a bid to the bid history """
-        self.bidsMade.append(f"{bid_value} at {convert_to_ist(datetime.utcnow()).isoformat()}")
-        self.save()
+    def add_bid_history(self, bid_value: float, commit=True):
+        """ Adds a bid to the bid history ($push); commit=False leaves it for the caller's save """
+        writes.push(self, 'bidsMade', f"{bid_value} at {convert_to_ist(datetime.utcnow()).isoformat()}")
+        if commit:
+            writes.save(self)
 
-    def end_bid(self):
+    def end_bid(self, commit=True):
         """ Marks the bid as ended """
         self.isEnded = True
         self.endedAt = convert_to_ist(datetime.utcnow())
-        self.save()
+        if commit:
+            writes.save(self)
 
     def get_created_at_ist(self):
         """ Directly converts the UTC createdAt time to IST when accessed """
@@ -316,9 +333,117 @@ class Message(Document):
 
     meta = {
         'collection': 'messages',  # The name of the collection in MongoDB
-        'ordering': ['timestamp']
+        'ordering': ['timestamp'],
+        # Backs keyset pagination and the latest-message lookup in get_messages
+        'indexes': [
+            ('auction', 'timestamp', 'id'),
+            '-timestamp',                   # Admin message list, newest first
+        ]
     }
 
     def get_timestamp_ist(self):
         """ Converts the UTC timestamp to IST when accessed """
         return convert_to_ist(self.timestamp)
+
+class Conversation(Document):
+    # One row per (user, auction, counterparty) thread, maintained on every message write
+    owner_username          =   StringField     (max_length=255, required=True)
+    auction                 =   ReferenceField  (Auction, required=True)
+    counterparty_username   =   StringField     (max_length=255, required=True)
+
+    # Summary of the latest message in the thread
+    last_message            =   StringField     ()
+    last_sender_username    =   StringField     (max_length=255)
+    last_message_id         =   StringField     ()
+    last_timestamp          =   DateTimeField   ()
+    unread_count            =   IntField        (default=0, min_value=0)
+
+    meta = {
+        'collection': 'conversations',
+        'indexes': [
+            {'fields': ['owner_username', 'auction', 'counterparty_username'], 'unique': True},
+            ('owner_username', '-last_timestamp'),  # Inbox listing, newest first
+        ]
+    }
+
+    def __str__(self):
+        return f"Conversation of {self.owner_username} with {self.counterparty_username}"
+
+class Registration(Document):
+    # One row per user registered for an auction
+    auction         =   ReferenceField  (Auction, required=True, reverse_delete_rule=2)
+    user            =   ReferenceField  (User, required=True, reverse_delete_rule=2)
+    username        =   StringField     (max_length=50)  # Denormalized so listings never dereference users
+    registered_at   =   DateTimeField   (default=datetime.utcnow, required=True)
+
+    meta = {
+        'collection': 'registrations',
+        'indexes': [
+            {'fields': ['auction', 'user'], 'unique': True},  # Register / unregister / is-registered
+            ('auction', 'id'),  # Registrant listing in registration order
+        ]
+    }
+
+    def __str__(self):
+        return f"Registration of {self.username}"
+
+
+class StatsSnapshot(Document):
+    # Platform counters for the admin dashboard, kept in one document (see web/stats.py)
+    key                     =   StringField     (primary_key=True)
+    users                   =   IntField        (default=0)
+    auctions                =   IntField        (default=0)
+    bids                    =   IntField        (default=0)
+    messages                =   IntField        (default=0)
+    auctions_by_category    =   DictField       ()  # category -> auctions
+    auctions_by_end_hour    =   DictField       ()  # 'YYYY-MM-DDTHH' (UTC) -> auctions ending in that hour
+    bids_by_hour            =   DictField       ()  # 'YYYY-MM-DDTHH' (UTC) -> bids placed in that hour
+    reconciled_at           =   DateTimeField   ()
+
+    meta = {
+        'collection': 'stats',
+    }
+
+class Rollup(Document):
+    # Bid and auction activity per time bucket and subcategory (see web/rollups.py)
+    granularity     =   StringField     (required=True, choices=('hour', 'day'))
+    bucket          =   DateTimeField   (required=True)  # UTC start of the hour or day
+    category        =   StringField     (required=True)
+    subcategory     =   StringField     (required=True)
+
+    auctions        =   IntField        (default=0)  # Auctions created
+    bids            =   IntField        (default=0)  # Bids placed
+    exporters       =   ListField       (IntField())  # Distinct exporters who bid
+    min_price       =   FloatField      ()
+    price_bins      =   DictField       ()  # Log-scale price histogram, for medians
+    savings_sum     =   FloatField      (default=0)  # Sum of initial_price - bid price
+    initial_sum     =   FloatField      (default=0)  # Sum of initial_price over the same bids
+
+    meta = {
+        'collection': 'rollups',
+        'indexes': [
+            {'fields': ['granularity', 'bucket', 'category', 'subcategory'], 'unique': True},
+        ]
+    }
+
+class Profile(Document):
+    # A profiled request, for download from the admin (see web/profiling.py)
+    created_at      =   DateTimeField   (default=datetime.utcnow, required=True)
+    view            =   StringField     ()
+    method          =   StringField     ()
+    path            =   StringField     ()
+    status          =   IntField        ()
+    mode            =   StringField     (choices=('sampler', 'cprofile'))
+    trigger         =   StringField     (choices=('token', 'sample'))
+    duration_ms     =   FloatField      ()
+    mongo_ms        =   FloatField      ()  # Share of duration_ms spent waiting on MongoDB
+    mongo_commands  =   IntField        ()
+    samples         =   IntField        ()  # Stacks sampled (sampler mode)
+    data            =   BinaryField     ()  # gzip of folded stacks (sampler) or marshalled pstats (cprofile)
+
+    meta = {
+        'collection': 'profiles',
+        'indexes': [
+            {'fields': ['created_at'], 'expireAfterSeconds': 7 * 24 * 3600},
+        ]
+    }
@@ -0,0 +1,101 @@
+# web/mongo.py
+import logging
+import threading
+import time
+from django.conf        import settings
+from mongoengine        import connection
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'HOST': None,                           # mongodb:// or mongodb+srv:// URI; without one no connection is defined
+    'DB': 'zecbay',
+    'AUTH_SOURCE': 'admin',
+    'MAX_POOL_SIZE': 10,                    # Per process; serverless runs many small processes
+    'MIN_POOL_SIZE': 0,
+    'MAX_IDLE_TIME_MS': 60000,              # Pooled sockets idle this long are closed
+    'SERVER_SELECTION_TIMEOUT_MS': 5000,    # Fail a request after 5s instead of pymongo's 30s when the cluster is unreachable
+    'CONNECT_TIMEOUT_MS': 5000,
+    'SOCKET_TIMEOUT_MS': 20000,
+    'WARM_UP': True,                        # Resolve, connect and ping in a background thread at startup
+}
+
+_get_connection = connection.get_connection
+_lock = threading.Lock()
+_registered = False
+
+# Seconds spent registering (SRV lookup and URI parsing) and warming up, for bench_cold_start
+timings = {}
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'MONGODB', {}))
+    return config
+
+def client_options(config):
+    """ mongoengine register_connection() arguments; the rest are passed to MongoClient """
+    return {
+        'db': config['DB'],
+        'host': config['HOST'],
+        'authentication_source': config['AUTH_SOURCE'],
+        'maxPoolSize': config['MAX_POOL_SIZE'],
+        'minPoolSize': config['MIN_POOL_SIZE'],
+        'maxIdleTimeMS': config['MAX_IDLE_TIME_MS'],
+        'serverSelectionTimeoutMS': config['SERVER_SELECTION_TIMEOUT_MS'],
+        'connectTimeoutMS': config['CONNECT_TIMEOUT_MS'],
+        'socketTimeoutMS': config['SOCKET_TIMEOUT_MS'],
+    }
+
+def register():
+    """
+    Defines the default connection once per process. Registering a
+    mongodb+srv URI resolves its SRV and TXT records, so it is left until the
+    first query (or the warm-up) rather than done when settings are imported.
+    """
+    global _registered
+    with _lock:
+        if _registered:
+            return
+        config = get_config()
+        if not config['HOST']:
+            return
+        started = time.perf_counter()
+        connection.register_connection(connection.DEFAULT_CONNECTION_NAME, **client_options(config))
+        timings['register'] = time.perf_counter() - started
+        _registered = True
+
+def get_connection(alias=connection.DEFAULT_CONNECTION_NAME, reconnect=False):
+    """ mongoengine's get_connection, registering the default connection on first use """
+    if alias == connection.DEFAULT_CONNECTION_NAME and not _registered:
+        register()
+    return _get_connection(alias, reconnect)
+
+def warm_up():
+    """ Opens the client and one pooled socket (DNS, TLS and auth) with a ping """
+    started = time.perf_counter()
+    get_connection().admin.command('ping')
+    timings['warm_up'] = time.perf_counter() - started
+    log.info("MongoDB connection warmed up", extra={'register_ms': round(timings.get('register', 0) * 1000, 1),
+                                                    'warm_up_ms': round(timings['warm_up'] * 1000, 1)})
+
+def warm_up_in_background():
+    def run():
+        try:
+            warm_up()
+        except Exception as error:
+            log.warning("MongoDB warm-up failed: %s", error)
+
+    threading.Thread(target=run, name='mongo-warm-up', daemon=True).start()
+
+def install():
+    """
+    Routes mongoengine's connection lookups through get_connection() and
+    starts the warm-up. The client lives for the process, so warm serverless
+    invocations and every request of a worker share one pool. With servers
+    that fork after loading the app (gunicorn --preload), set WARM_UP off so
+    no client is opened before the fork.
+    """
+    connection.get_connection = get_connection
+    config = get_config()
+    if config['HOST'] and config['WARM_UP']:
+        warm_up_in_background()
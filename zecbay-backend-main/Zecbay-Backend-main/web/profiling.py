@@ -0,0 +1,171 @@
+# web/profiling.py
+import cProfile
+import gzip
+import logging
+import marshal
+import random
+import sys
+import threading
+import time
+from collections        import Counter
+from django.conf        import settings
+from django.core        import signing
+from . import metrics
+from .models            import Profile
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SAMPLE_RATE': 0.0,         # Share of requests profiled without a token (sampler mode)
+    'VIEWS': None,              # View names sampling applies to; None for every view
+    'HEADER': 'X-Profile',      # Header carrying a profiling token from the admin
+    'QUERY_FLAG': '_profile',   # ...or query parameter, for requests made from a browser
+    'TOKEN_MAX_AGE': 3600,      # Seconds a profiling token stays valid
+    'INTERVAL_MS': 5,           # Stack sampling interval
+    'MAX_BYTES': 4 * 1024 * 1024,
+}
+
+MODES = ('sampler', 'cprofile')
+TOKEN_SALT = 'web.profiling'
+EXTENSIONS = {'sampler': 'folded', 'cprofile': 'prof'}
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'PROFILING', {}))
+    return config
+
+def issue_token(mode='sampler'):
+    """ Token the admin hands out to profile requests; anyone holding it can, until it expires """
+    return signing.dumps({'m': mode}, salt=TOKEN_SALT)
+
+def token_mode(value, max_age):
+    """ Profiling mode of a valid token, else None """
+    try:
+        mode = signing.loads(value, salt=TOKEN_SALT, max_age=max_age).get('m')
+    except signing.BadSignature:
+        return None
+    return mode if mode in MODES else None
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_name}".replace(';', ':')
+
+def fold(frame):
+    """ Stack of `frame`, root first, in the folded format flame graph tools read """
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class StackSampler:
+    """
+    Samples one thread's stack every `interval` seconds from a background
+    thread. The profiled thread runs untraced, so the cost is one stack walk
+    per sample; time in socket reads shows up under pymongo.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[fold(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def profile_call(mode, interval, view_func, *args, **kwargs):
+    """ Runs the view under `mode`; returns (response, raw profile bytes, samples) """
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        try:
+            response = profiler.runcall(view_func, *args, **kwargs)
+        finally:
+            profiler.create_stats()
+        # The .prof format pstats, snakeviz and flameprof load
+        return response, marshal.dumps(profiler.stats), None
+
+    sampler = StackSampler(threading.get_ident(), interval)
+    sampler.start()
+    try:
+        response = view_func(*args, **kwargs)
+    finally:
+        sampler.stop()
+    return response, sampler.folded().encode('utf-8'), sum(sampler.stacks.values())
+
+def save(request, view, mode, trigger, status, seconds, data, samples, config):
+    """ Stores a profile; profiling never fails the request it profiled """
+    request_metrics = metrics.current_metrics()
+    data = gzip.compress(data, compresslevel=6)
+    if len(data) > config['MAX_BYTES']:
+        log.warning("Profile dropped: too large", extra={'view': view, 'bytes': len(data)})
+        return
+    try:
+        Profile(
+            view=view, method=request.method, path=request.path, status=status, mode=mode, trigger=trigger,
+            duration_ms=round(seconds * 1000, 1),
+            mongo_ms=round(request_metrics.seconds * 1000, 1) if request_metrics else None,
+            mongo_commands=request_metrics.commands if request_metrics else None,
+            samples=samples, data=data,
+        ).save()
+    except Exception as error:
+        log.warning("Saving profile failed: %s", error)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the view of a request that carries a profiling token (header or
+    query flag) or is picked by SAMPLE_RATE, and stores the result for the
+    admin. Requests that are neither cost a header lookup and, when sampling
+    is on, one random number. Keep it last in MIDDLEWARE so that only the view
+    is profiled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+        self.header = 'HTTP_' + self.config['HEADER'].upper().replace('-', '_')
+        self.views = set(self.config['VIEWS']) if self.config['VIEWS'] else None
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        config = self.config
+        token = request.META.get(self.header) or request.GET.get(config['QUERY_FLAG'])
+        if token:
+            mode, trigger = token_mode(token, config['TOKEN_MAX_AGE']), 'token'
+            if mode is None:
+                return None
+        elif config['SAMPLE_RATE'] and random.random() < config['SAMPLE_RATE']:
+            mode, trigger = 'sampler', 'sample'
+        else:
+            return None
+
+        match = request.resolver_match
+        view = match.view_name or match._func_path
+        if trigger == 'sample' and self.views is not None and view not in self.views:
+            return None
+
+        started = time.perf_counter()
+        response, data, samples = profile_call(
+            mode, config['INTERVAL_MS'] / 1000, view_func, request, *view_args, **view_kwargs
+        )
+        save(request, view, mode, trigger, response.status_code, time.perf_counter() - started, data, samples, config)
+        return response
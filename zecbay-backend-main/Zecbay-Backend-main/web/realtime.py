@@ -0,0 +1,31 @@
+# web/realtime.py
+import logging
+import time
+from asgiref.sync       import async_to_sync
+from channels.layers    import get_channel_layer
+
+log = logging.getLogger(__name__)
+
+def auction_group(auction_id):
+    """ Channel layer group of an auction's BidConsumer connections """
+    return f"auction_{auction_id}"
+
+def publish_price(auction_id, price, winner_bid_id):
+    """
+    Tells the auction's WebSocket clients its current price and winning bid
+    (a price_message event). Publishing never fails the write that caused it.
+    """
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    try:
+        async_to_sync(layer.group_send)(auction_group(auction_id), {
+            'type': 'price_message',
+            'price': {
+                'current_price': price,
+                'winner_bid_id': str(winner_bid_id) if winner_bid_id is not None else None,
+            },
+            'timestamp': int(time.time() * 1000),
+        })
+    except Exception as error:
+        log.warning("Publishing price update failed: %s", error, extra={'auction_id': str(auction_id)})
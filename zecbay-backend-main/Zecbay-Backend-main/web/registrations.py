@@ -0,0 +1,83 @@
+# web/registrations.py
+from datetime           import datetime
+from bson               import ObjectId
+from mongoengine        import signals
+from pymongo.errors     import DuplicateKeyError
+from .cache             import LISTING_TAG, auction_tag, invalidate_auction, response_cache
+from .models            import Auction, Registration, User
+
+def register(auction_id, user):
+    """
+    Registers `user` for the auction with a single insert guarded by the unique
+    (auction, user) index. Returns False if the user was already registered.
+    """
+    auction = ObjectId(auction_id)
+    try:
+        Registration._get_collection().insert_one({
+            'auction': auction,
+            'user': user.pk,
+            'username': user.username,
+            'registered_at': datetime.utcnow(),
+        })
+    except DuplicateKeyError:
+        return False
+
+    Auction.objects(id=auction).update_one(inc__register_count=1)
+    invalidate_auction(auction)
+    return True
+
+def unregister(auction_id, user_id):
+    """ Removes a registration; returns False if there was none """
+    auction = ObjectId(auction_id)
+    deleted = Registration._get_collection().delete_one({'auction': auction, 'user': user_id}).deleted_count
+    if not deleted:
+        return False
+
+    # Only decrement for a registration that actually existed, so the count never drifts below it
+    Auction.objects(id=auction, register_count__gt=0).update_one(dec__register_count=1)
+    invalidate_auction(auction)
+    return True
+
+def is_registered(auction_id, user_id):
+    """ Answered from the unique index alone """
+    return Registration._get_collection().count_documents(
+        {'auction': ObjectId(auction_id), 'user': user_id}, limit=1
+    ) > 0
+
+def list_registrants(auction_id, limit=50, after=None):
+    """
+    One page of an auction's registrants in registration order. Returns the rows
+    and the cursor for the next page (None on the last page).
+    """
+    query = {'auction': ObjectId(auction_id)}
+    if after:
+        query['_id'] = {'$gt': ObjectId(after)}
+
+    rows = list(Registration._get_collection().find(
+        query, {'user': 1, 'username': 1, 'registered_at': 1}
+    ).sort('_id', 1).limit(limit + 1))
+
+    next_cursor = str(rows[limit - 1]['_id']) if len(rows) > limit else None
+    return [
+        {
+            'user_id': row['user'],
+            'username': row.get('username'),
+            'registered_at': row['registered_at'].isoformat() if row.get('registered_at') else None,
+        }
+        for row in rows[:limit]
+    ], next_cursor
+
+def user_deleting(sender, document, **kwargs):
+    """
+    Deleting a user cascades their registrations away (reverse_delete_rule),
+    which does not touch register_count; decrement it on their auctions first.
+    """
+    auctions = Registration._get_collection().distinct('auction', {'user': document.pk})
+    if not auctions:
+        return
+    Auction.objects(id__in=auctions, register_count__gt=0).update(dec__register_count=1)
+    response_cache.invalidate(*[auction_tag(auction) for auction in auctions], LISTING_TAG)
+
+def connect():
+    """ Keeps register_count in step when registrations go with a deleted user """
+    signals.pre_delete.connect(user_deleting, sender=User)
@@ -0,0 +1,270 @@
+# web/rollups.py
+import logging
+import math
+from datetime           import datetime, timedelta
+from mongoengine        import signals
+from pymongo            import UpdateOne
+from .cache             import LRUCache
+from .models            import Auction, Bids, Rollup, as_utc
+
+log = logging.getLogger(__name__)
+
+GRANULARITIES = ('hour', 'day')
+PRICE_RESOLUTION = 0.01     # Width of a price bin relative to its price; medians are within about 1%
+AUCTION_FACTS_TTL = 3600    # category, subcategory and initial_price never change after creation
+STEPS = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+DEFAULT_BUCKETS = {'hour': 48, 'day': 30}
+MAX_BUCKETS = 1000          # Largest range a single read may cover
+
+_auction_facts = LRUCache(max_entries=10000, max_bytes=10000 * 200)
+
+def bucket_start(value, granularity):
+    value = as_utc(value).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+    return value.replace(hour=0) if granularity == 'day' else value
+
+def price_bin(price):
+    if price is None or price <= 0:
+        return 'z'
+    return str(math.floor(math.log(price) / math.log1p(PRICE_RESOLUTION)))
+
+def bin_price(key):
+    """ Midpoint price of a bin """
+    if key == 'z':
+        return 0.0
+    return math.exp((int(key) + 0.5) * math.log1p(PRICE_RESOLUTION))
+
+def reference_id(value):
+    return getattr(value, 'id', value)
+
+def auction_facts(value):
+    """ (category, subcategory, initial_price) of an auction, without a query when it is loaded or cached """
+    if isinstance(value, Auction) and value.category is not None:
+        return value.category, value.subcategory, value.initial_price
+    auction_id = reference_id(value)
+    facts = _auction_facts.get(auction_id)
+    if facts is None:
+        doc = Auction._get_collection().find_one(
+            {'_id': auction_id}, {'category': 1, 'subcategory': 1, 'initial_price': 1}
+        ) or {}
+        facts = (doc.get('category'), doc.get('subcategory'), doc.get('initial_price'))
+        _auction_facts.set(auction_id, facts, size=200, ttl=AUCTION_FACTS_TTL)
+    return facts
+
+
+# Updates: the change one write makes to the buckets it falls in
+
+def bid_change(price, exporter_id, initial_price):
+    change = {'$inc': {'bids': 1, f"price_bins.{price_bin(price)}": 1}}
+    if price is not None:
+        change['$min'] = {'min_price': price}
+        if initial_price:
+            change['$inc']['savings_sum'] = initial_price - price
+            change['$inc']['initial_sum'] = initial_price
+    if exporter_id is not None:
+        change['$addToSet'] = {'exporters': exporter_id}
+    return change
+
+def auction_change():
+    return {'$inc': {'auctions': 1}}
+
+def bucket_updates(when, category, subcategory, change):
+    """ One upsert per granularity """
+    return [
+        UpdateOne({
+            'granularity': granularity,
+            'bucket': bucket_start(when, granularity),
+            'category': category,
+            'subcategory': subcategory,
+        }, change, upsert=True)
+        for granularity in GRANULARITIES
+    ]
+
+def write(collection, operations):
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+def apply(operations):
+    """ Writes rollup updates in one round trip; analytics never fail a write """
+    try:
+        write(Rollup._get_collection(), operations)
+    except Exception as error:
+        log.warning("Rollup update failed: %s", error)
+
+def bid_saved(sender, document, created=False, **kwargs):
+    if not created:
+        return
+    try:
+        category, subcategory, initial_price = auction_facts(document._data.get('auctionID'))
+    except Exception as error:
+        log.warning("Rollup update failed: %s", error)
+        return
+    if category is None:
+        return
+    change = bid_change(document.pricePerQuantity, reference_id(document._data.get('exporterId')), initial_price)
+    apply(bucket_updates(document.createdAt, category, subcategory, change))
+
+def auction_saved(sender, document, created=False, **kwargs):
+    if created:
+        apply(bucket_updates(document.created_at, document.category, document.subcategory, auction_change()))
+
+def connect():
+    """ Rolls every new bid and auction into its hourly and daily buckets """
+    signals.post_save.connect(bid_saved, sender=Bids)
+    signals.post_save.connect(auction_saved, sender=Auction)
+
+
+# Reads: O(buckets), whatever the number of bids behind them
+
+def window(granularity, start=None, end=None, now=None):
+    """
+    [start, end) widened to whole buckets: the last DEFAULT_BUCKETS buckets
+    unless given, and no more than MAX_BUCKETS of them. Bad values are a ValueError.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    step = STEPS[granularity]
+    end = end or now or datetime.utcnow()
+    aligned = bucket_start(end, granularity)
+    end = aligned + step if aligned < as_utc(end).replace(tzinfo=None) else aligned
+    start = bucket_start(start, granularity) if start else end - DEFAULT_BUCKETS[granularity] * step
+    if start >= end:
+        raise ValueError("from must be before to")
+    if (end - start) / step > MAX_BUCKETS:
+        raise ValueError(f"Ranges are limited to {MAX_BUCKETS} {granularity} buckets")
+    return start, end
+
+def series(granularity, start, end, category=None, subcategory=None):
+    """
+    One point per bucket in [start, end), combining the subcategories that
+    match the filters: bids, auctions, distinct exporters, min and median
+    price, and savings against initial_price.
+    """
+    query = {'granularity': granularity, 'bucket': {'$gte': start, '$lt': end}}
+    if category:
+        query['category'] = category
+    if subcategory:
+        query['subcategory'] = subcategory
+
+    points = {}
+    for doc in Rollup._get_collection().find(query, {'_id': 0}):
+        point = points.setdefault(doc['bucket'], {
+            'bids': 0, 'auctions': 0, 'exporters': set(), 'min_price': None,
+            'price_bins': {}, 'savings_sum': 0.0, 'initial_sum': 0.0,
+        })
+        point['bids'] += doc.get('bids', 0)
+        point['auctions'] += doc.get('auctions', 0)
+        point['exporters'].update(doc.get('exporters', []))
+        if doc.get('min_price') is not None:
+            point['min_price'] = doc['min_price'] if point['min_price'] is None else min(point['min_price'], doc['min_price'])
+        for key, count in (doc.get('price_bins') or {}).items():
+            point['price_bins'][key] = point['price_bins'].get(key, 0) + count
+        point['savings_sum'] += doc.get('savings_sum', 0.0)
+        point['initial_sum'] += doc.get('initial_sum', 0.0)
+
+    return [format_point(bucket, points[bucket]) for bucket in sorted(points)]
+
+def median_price(price_bins):
+    total = sum(price_bins.values())
+    if not total:
+        return None
+    seen = 0
+    for key in sorted(price_bins, key=lambda key: -math.inf if key == 'z' else int(key)):
+        seen += price_bins[key]
+        if seen * 2 >= total:
+            return round(bin_price(key), 2)
+
+def format_point(bucket, point):
+    return {
+        'bucket': bucket.isoformat() + 'Z',
+        'bids': point['bids'],
+        'auctions': point['auctions'],
+        'distinct_exporters': len(point['exporters']),
+        'min_price': point['min_price'],
+        'median_price': median_price(point['price_bins']),
+        'savings': round(point['savings_sum'], 2),
+        'savings_pct': round(100 * point['savings_sum'] / point['initial_sum'], 2) if point['initial_sum'] else None,
+    }
+
+
+# Rebuilds, for backfills and repairs
+
+class Combiner:
+    """ Merges the changes of many writes into one update per bucket """
+
+    def __init__(self):
+        self.changes = {}
+
+    def add(self, when, category, subcategory, change):
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(when, granularity), category, subcategory)
+            merged = self.changes.setdefault(key, {'$inc': {}, '$min': {}, '$addToSet': {}})
+            for field, delta in change.get('$inc', {}).items():
+                merged['$inc'][field] = merged['$inc'].get(field, 0) + delta
+            for field, value in change.get('$min', {}).items():
+                merged['$min'][field] = min(merged['$min'].get(field, value), value)
+            for field, value in change.get('$addToSet', {}).items():
+                merged['$addToSet'].setdefault(field, set()).add(value)
+
+    def operations(self):
+        operations = []
+        for (granularity, bucket, category, subcategory), merged in self.changes.items():
+            update = {operator: fields for operator, fields in merged.items() if fields}
+            if '$addToSet' in update:
+                update['$addToSet'] = {field: {'$each': sorted(values)} for field, values in update['$addToSet'].items()}
+            operations.append(UpdateOne({
+                'granularity': granularity, 'bucket': bucket, 'category': category, 'subcategory': subcategory,
+            }, update, upsert=True))
+        return operations
+
+def rebuild(start, end, batch_size=5000):
+    """
+    Recomputes the buckets of [start, end) (whole days) from the collections,
+    with bids at their current price. Auctions and bids are read once, in
+    batches; each batch becomes one bulk write with an update per bucket.
+    """
+    start, end = bucket_start(start, 'day'), bucket_start(end, 'day')
+    if end <= start:
+        end = start + timedelta(days=1)
+    rollups = Rollup._get_collection()
+    rollups.delete_many({'bucket': {'$gte': start, '$lt': end}})
+    auctions = Auction._get_collection()
+    counts = {'auctions': 0, 'bids': 0}
+
+    combiner = Combiner()
+    cursor = auctions.find({'created_at': {'$gte': start, '$lt': end}}, {'created_at': 1, 'category': 1, 'subcategory': 1})
+    for doc in cursor.batch_size(batch_size):
+        if doc.get('category') is not None:
+            combiner.add(doc['created_at'], doc['category'], doc.get('subcategory'), auction_change())
+            counts['auctions'] += 1
+    write(rollups, combiner.operations())
+
+    batch = []
+    cursor = Bids._get_collection().find({'createdAt': {'$gte': start, '$lt': end}},
+                                         {'auctionID': 1, 'exporterId': 1, 'pricePerQuantity': 1, 'createdAt': 1})
+    for doc in cursor.batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            counts['bids'] += rebuild_bids(batch, auctions, rollups)
+            batch = []
+    if batch:
+        counts['bids'] += rebuild_bids(batch, auctions, rollups)
+    return counts
+
+def rebuild_bids(batch, auctions, rollups):
+    # One lookup of the auctions behind the whole batch
+    facts = {
+        doc['_id']: (doc.get('category'), doc.get('subcategory'), doc.get('initial_price'))
+        for doc in auctions.find({'_id': {'$in': list({bid.get('auctionID') for bid in batch})}},
+                                 {'category': 1, 'subcategory': 1, 'initial_price': 1})
+    }
+    combiner = Combiner()
+    rolled = 0
+    for bid in batch:
+        category, subcategory, initial_price = facts.get(bid.get('auctionID'), (None, None, None))
+        if category is None:
+            continue
+        combiner.add(bid['createdAt'], category, subcategory,
+                     bid_change(bid.get('pricePerQuantity'), bid.get('exporterId'), initial_price))
+        rolled += 1
+    write(rollups, combiner.operations())
+    return rolled
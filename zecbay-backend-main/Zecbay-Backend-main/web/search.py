@@ -0,0 +1,329 @@
+# web/search.py
+import heapq
+import math
+import re
+import threading
+import time
+from collections        import Counter
+from datetime           import datetime
+from django.conf        import settings
+from pymongo.errors     import OperationFailure
+from .cache             import LRUCache
+from .models            import Auction
+
+DEFAULTS = {
+    'BACKEND': 'auto',          # 'text' (Mongo text index), 'inverted' (in-process index) or 'auto'
+    'MAX_PAGE_SIZE': 100,
+    'FACET_TTL': 30,            # Seconds facet counts are reused across pages of the same search
+    'CATCH_UP_INTERVAL': 1,     # Seconds between checks of the inverted index for new auctions
+    'REBUILD_INTERVAL': 600,    # Seconds between full rebuilds, which pick up other processes' edits and deletes
+    'MAX_CANDIDATES': 5000,     # Best-scoring auctions the inverted backend filters, counts and pages
+}
+
+# Field weights, shared by the text index and the inverted index
+WEIGHTS = {'product_name': 10, 'hs_code': 5, 'description': 1}
+
+RESULT_FIELDS = ['product_name', 'category', 'subcategory', 'hs_code', 'current_price', 'unit', 'quantity', 'ends_at']
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'SEARCH', {}))
+    return config
+
+STOPWORDS = frozenset('a an and are as at be by for from in is it of on or the to with'.split())
+TOKEN_RE = re.compile(r'[0-9a-z]+')
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall((text or '').lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+class InvertedIndex:
+    """
+    In-process inverted index over the searchable auction fields, for
+    deployments without Mongo text indexes. New auctions are picked up by an
+    _id range scan; saves and deletes in this process re-index or remove the
+    auction through web/signals.py, and a periodic rebuild catches edits and
+    deletes made by other processes.
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection
+        self.postings = {}  # term -> {auction_id: weighted term frequency}
+        self.terms = {}     # auction_id -> its terms, so it can be removed
+        self.size = 0
+        self.last_id = None
+        self.last_check = 0.0
+        self.built_at = None
+        self.lock = threading.Lock()
+
+    def add(self, doc):
+        self.remove(doc['_id'])
+        weights = Counter()
+        for field, weight in WEIGHTS.items():
+            for token in tokenize(doc.get(field)):
+                weights[token] += weight
+        for token, weight in weights.items():
+            self.postings.setdefault(token, {})[doc['_id']] = weight
+        self.terms[doc['_id']] = list(weights)
+        self.size += 1
+
+    def remove(self, doc_id):
+        terms = self.terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for token in terms:
+            postings = self.postings.get(token)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[token]
+        self.size -= 1
+
+    def reindex(self, document):
+        """ Re-indexes a saved auction; auctions the index has not reached yet are left to catch_up """
+        if self.last_id is None or (document.pk not in self.terms and document.pk > self.last_id):
+            return
+        with self.lock:
+            self.add(dict({field: getattr(document, field) for field in WEIGHTS}, _id=document.pk))
+
+    def discard(self, doc_id):
+        with self.lock:
+            self.remove(doc_id)
+
+    def get_collection(self):
+        return self.collection if self.collection is not None else Auction._get_collection()
+
+    def scan(self, query):
+        projection = {field: 1 for field in WEIGHTS}
+        for doc in self.get_collection().find(query, projection).sort('_id', 1).batch_size(1000):
+            self.add(doc)
+            self.last_id = doc['_id']
+
+    def catch_up(self, interval=0, rebuild_interval=None):
+        """
+        Indexes auctions created since the last call (one indexed _id range
+        scan), or rebuilds the whole index once rebuild_interval has passed
+        """
+        now = time.monotonic()
+        if now - self.last_check < interval:
+            return
+        if rebuild_interval is not None and self.built_at is not None and now - self.built_at >= rebuild_interval:
+            self.rebuild(now)
+            return
+        with self.lock:
+            self.last_check = now
+            self.scan({'_id': {'$gt': self.last_id}} if self.last_id is not None else {})
+            if self.built_at is None:
+                self.built_at = now
+
+    def rebuild(self, now=None):
+        """ Builds a fresh index aside and swaps it in, so searches keep the old one meanwhile """
+        fresh = InvertedIndex(self.collection)
+        fresh.scan({})
+        with self.lock:
+            self.postings, self.terms, self.size, self.last_id = fresh.postings, fresh.terms, fresh.size, fresh.last_id
+            self.last_check = self.built_at = now if now is not None else time.monotonic()
+
+    def score(self, query):
+        """ {auction_id: score} for auctions matching any query term, tf-idf weighted """
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + self.size / len(postings))
+            for doc_id, weight in postings.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * idf
+        return scores
+
+
+inverted_index = InvertedIndex()
+_facet_cache = LRUCache(max_entries=256, max_bytes=4 * 1024 * 1024)
+_text_index_available = None
+
+def text_index_available():
+    global _text_index_available
+    backend = get_config()['BACKEND']
+    if backend != 'auto':
+        return backend == 'text'
+    if _text_index_available is None:
+        try:
+            indexes = Auction._get_collection().index_information()
+            _text_index_available = any(
+                any(kind == 'text' for _, kind in index['key']) for index in indexes.values()
+            )
+        except OperationFailure:
+            _text_index_available = False
+    return _text_index_available
+
+def disable_text_index():
+    global _text_index_available
+    _text_index_available = False
+
+
+def build_filters(category=None, subcategory=None, min_price=None, max_price=None, active=False):
+    """ Returns (base, narrow): base applies to results and facets, narrow (taxonomy) only to results """
+    base, narrow = {}, {}
+    price = {}
+    if min_price is not None:
+        price['$gte'] = min_price
+    if max_price is not None:
+        price['$lte'] = max_price
+    if price:
+        base['current_price'] = price
+    if active:
+        base['ends_at'] = {'$gt': datetime.utcnow()}
+    if category:
+        narrow['category'] = category
+    if subcategory:
+        narrow['subcategory'] = subcategory
+    return base, narrow
+
+def facet_stages(narrow):
+    """ Category counts ignore the taxonomy filter so clients can switch; subcategory counts honour the category """
+    subcategory_match = [{'$match': {'category': narrow['category']}}] if 'category' in narrow else []
+    return {
+        'categories': [{'$group': {'_id': '$category', 'count': {'$sum': 1}}}, {'$sort': {'count': -1, '_id': 1}}],
+        'subcategories': subcategory_match + [
+            {'$group': {'_id': {'category': '$category', 'subcategory': '$subcategory'}, 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1, '_id': 1}},
+        ],
+    }
+
+def format_facets(result):
+    return {
+        'categories': [{'category': row['_id'], 'count': row['count']} for row in result.get('categories', [])],
+        'subcategories': [
+            {'category': row['_id'].get('category'), 'subcategory': row['_id'].get('subcategory'), 'count': row['count']}
+            for row in result.get('subcategories', [])
+        ],
+    }
+
+def format_hit(doc, score):
+    ends_at = doc.get('ends_at')
+    return {
+        'id': str(doc['_id']),
+        'product_name': doc.get('product_name'),
+        'category': doc.get('category'),
+        'subcategory': doc.get('subcategory'),
+        'hs_code': doc.get('hs_code'),
+        'current_price': doc.get('current_price'),
+        'unit': doc.get('unit'),
+        'quantity': doc.get('quantity'),
+        'ends_at': ends_at.isoformat() + 'Z' if ends_at else None,
+        'score': round(score, 4) if score is not None else None,
+    }
+
+
+def search(query='', page=1, page_size=20, **filters):
+    """
+    Ranked, paginated auction search with category/subcategory facet counts.
+    Results, total and facets come from one aggregation; facets are reused
+    for a short while across pages of the same search.
+    """
+    page_size = max(1, min(page_size, get_config()['MAX_PAGE_SIZE']))
+    page = max(1, page)
+    query = (query or '').strip()
+    base, narrow = build_filters(**filters)
+
+    # Facets depend on everything but the page and the subcategory
+    facet_key = repr((query, sorted((k, v) for k, v in filters.items() if k != 'subcategory')))
+    facets = _facet_cache.get(facet_key)
+
+    if query and text_index_available():
+        try:
+            result = text_search(query, base, narrow, page, page_size, facets is None)
+        except OperationFailure:
+            # No text index on this deployment after all
+            disable_text_index()
+            result = inverted_search(query, base, narrow, page, page_size, facets is None)
+    elif query:
+        result = inverted_search(query, base, narrow, page, page_size, facets is None)
+    else:
+        result = browse(base, narrow, page, page_size, facets is None)
+
+    if facets is None:
+        facets = result['facets']
+        _facet_cache.set(facet_key, facets, size=len(repr(facets)), ttl=get_config()['FACET_TTL'])
+
+    return {
+        'results': result['results'],
+        'total': result['total'],
+        'page': page,
+        'page_size': page_size,
+        'facets': facets,
+        'backend': result['backend'],
+    }
+
+def run_facet_pipeline(match, narrow, sort, page, page_size, with_facets):
+    """ One aggregation returning the page, the total and (optionally) the facet counts """
+    branches = {
+        'hits': [{'$match': narrow}, {'$sort': sort}, {'$skip': (page - 1) * page_size}, {'$limit': page_size},
+                 {'$project': dict({field: 1 for field in RESULT_FIELDS}, score=1)}],
+        'total': [{'$match': narrow}, {'$count': 'count'}],
+    }
+    if with_facets:
+        branches.update(facet_stages(narrow))
+
+    pipeline = [{'$match': match}]
+    if '$text' in match:
+        pipeline.append({'$addFields': {'score': {'$meta': 'textScore'}}})
+    pipeline.append({'$facet': branches})
+
+    result = next(Auction._get_collection().aggregate(pipeline), {})
+    total = result.get('total') or [{'count': 0}]
+    return result, total[0]['count']
+
+def text_search(query, base, narrow, page, page_size, with_facets):
+    match = dict(base, **{'$text': {'$search': query}})
+    result, total = run_facet_pipeline(match, narrow, {'score': -1, '_id': -1}, page, page_size, with_facets)
+    return {
+        'results': [format_hit(doc, doc.get('score')) for doc in result.get('hits', [])],
+        'total': total,
+        'facets': format_facets(result) if with_facets else None,
+        'backend': 'text',
+    }
+
+def inverted_search(query, base, narrow, page, page_size, with_facets):
+    """
+    Ranks in process and lets Mongo filter. Only the MAX_CANDIDATES best
+    scores are sent to Mongo, so a broad query stays a bounded $in; its total
+    and facets then count those candidates rather than every match.
+    """
+    config = get_config()
+    inverted_index.catch_up(config['CATCH_UP_INTERVAL'], config['REBUILD_INTERVAL'])
+    scores = inverted_index.score(query)
+    if not scores:
+        return {'results': [], 'total': 0, 'facets': format_facets({}) if with_facets else None, 'backend': 'inverted'}
+
+    # Mongo applies the filters (and drops deleted auctions); ranking happens here
+    candidates = heapq.nlargest(config['MAX_CANDIDATES'], scores, key=lambda doc_id: (scores[doc_id], doc_id))
+    match = dict(base, _id={'$in': candidates})
+    branches = {'ids': [{'$match': narrow}, {'$project': {'_id': 1}}]}
+    if with_facets:
+        branches.update(facet_stages(narrow))
+    result = next(Auction._get_collection().aggregate([{'$match': match}, {'$facet': branches}]), {})
+
+    matched = [row['_id'] for row in result.get('ids', [])]
+    # Only the pages up to the requested one need ordering; newer auctions win ties
+    ranked = heapq.nlargest(page * page_size, matched, key=lambda doc_id: (scores[doc_id], doc_id))
+    page_ids = ranked[(page - 1) * page_size:]
+    docs = {doc['_id']: doc for doc in Auction._get_collection().find(
+        {'_id': {'$in': page_ids}}, {field: 1 for field in RESULT_FIELDS}
+    )}
+    return {
+        'results': [format_hit(docs[doc_id], scores[doc_id]) for doc_id in page_ids if doc_id in docs],
+        'total': len(matched),
+        'facets': format_facets(result) if with_facets else None,
+        'backend': 'inverted',
+    }
+
+def browse(base, narrow, page, page_size, with_facets):
+    """ No query text: newest first """
+    result, total = run_facet_pipeline(base, narrow, {'_id': -1}, page, page_size, with_facets)
+    return {
+        'results': [format_hit(doc, None) for doc in result.get('hits', [])],
+        'total': total,
+        'facets': format_facets(result) if with_facets else None,
+        'backend': 'browse',
+    }
@@ -0,0 +1,51 @@
+# web/signals.py
+from bson           import DBRef
+from mongoengine    import signals
+from .              import chat, search
+from .cache         import response_cache, auction_tag, messages_tag, LISTING_TAG, USERS_TAG
+from .models        import Auction, Bids, Message, User
+
+def reference_id(document, field):
+    """ Id held by a ReferenceField, read without dereferencing it """
+    value = document._data.get(field)
+    if isinstance(value, DBRef):
+        return value.id
+    return getattr(value, 'pk', value)
+
+def auction_changed(sender, document, **kwargs):
+    response_cache.invalidate(auction_tag(document.pk), LISTING_TAG)
+
+def auction_saved(sender, document, **kwargs):
+    auction_changed(sender, document)
+    search.inverted_index.reindex(document)
+
+def auction_deleted(sender, document, **kwargs):
+    auction_changed(sender, document)
+    chat.forget_auction(document.pk)
+    search.inverted_index.discard(document.pk)
+
+def bid_changed(sender, document, **kwargs):
+    # A bid changes the auction's price and winner, which listings show too
+    response_cache.invalidate(auction_tag(reference_id(document, 'auctionID')), LISTING_TAG)
+
+def message_changed(sender, document, **kwargs):
+    response_cache.invalidate(messages_tag(reference_id(document, 'auction')))
+
+def messages_inserted(sender, documents, **kwargs):
+    auction_ids = {reference_id(document, 'auction') for document in documents}
+    response_cache.invalidate(*[messages_tag(auction_id) for auction_id in auction_ids])
+
+def user_changed(sender, document, **kwargs):
+    response_cache.invalidate(USERS_TAG)
+
+def connect():
+    """ Hooks response cache invalidation (and search re-indexing) into document writes """
+    signals.post_save.connect(auction_saved, sender=Auction)
+    signals.post_delete.connect(auction_deleted, sender=Auction)
+    signals.post_save.connect(bid_changed, sender=Bids)
+    signals.post_delete.connect(bid_changed, sender=Bids)
+    signals.post_save.connect(message_changed, sender=Message)
+    signals.post_delete.connect(message_changed, sender=Message)
+    signals.post_bulk_insert.connect(messages_inserted, sender=Message)
+    signals.post_save.connect(user_changed, sender=User)
+    signals.post_delete.connect(user_changed, sender=User)
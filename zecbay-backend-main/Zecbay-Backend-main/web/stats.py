@@ -0,0 +1,186 @@
+# web/stats.py
+import logging
+import threading
+from datetime           import datetime, timedelta
+from django.conf        import settings
+from mongoengine        import signals
+from .models            import Auction, Bids, Message, StatsSnapshot, User, as_utc
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'RECONCILE_INTERVAL': 600,  # Seconds before the dashboard triggers a background reconciliation
+    'HOURS': 48,                # Hourly buckets kept by reconciliation
+}
+
+SNAPSHOT_KEY = 'platform'
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'STATS', {}))
+    return config
+
+def hour_key(value):
+    return as_utc(value).strftime('%Y-%m-%dT%H')
+
+def hour_of(field):
+    """ Aggregation expression for hour_key() of a date field """
+    return {'$dateToString': {'format': '%Y-%m-%dT%H', 'date': field}}
+
+def map_key(value):
+    """ Map keys are used in $inc paths, which cannot contain dots or start with $ """
+    return str(value).replace('.', '_').replace('$', '_')
+
+def collection():
+    return StatsSnapshot._get_collection()
+
+
+# Incremental updates: one upserted $inc per write (or per bulk insert)
+
+def increment(**counters):
+    """ Applies `counters` (field or 'map.key' -> delta) to the snapshot; stats never fail a write """
+    counters = {field: delta for field, delta in counters.items() if delta}
+    if not counters:
+        return
+    try:
+        collection().update_one({'_id': SNAPSHOT_KEY}, {'$inc': counters}, upsert=True)
+    except Exception as error:
+        log.warning("Stats update failed: %s", error)
+
+def auction_counters(document, sign):
+    counters = {'auctions': sign, f"auctions_by_category.{map_key(document.category)}": sign}
+    ends_at = document.get_ends_at()
+    if ends_at is not None:
+        counters[f"auctions_by_end_hour.{hour_key(ends_at)}"] = sign
+    return counters
+
+def auction_saved(sender, document, created=False, **kwargs):
+    if created:
+        increment(**auction_counters(document, 1))
+
+def auction_deleted(sender, document, **kwargs):
+    increment(**auction_counters(document, -1))
+
+def bid_saved(sender, document, created=False, **kwargs):
+    if created:
+        increment(bids=1, **{f"bids_by_hour.{hour_key(document.createdAt)}": 1})
+
+def bid_deleted(sender, document, **kwargs):
+    increment(bids=-1, **{f"bids_by_hour.{hour_key(document.createdAt)}": -1})
+
+def message_saved(sender, document, created=False, **kwargs):
+    if created:
+        increment(messages=1)
+
+def messages_inserted(sender, documents, **kwargs):
+    increment(messages=len(documents))
+
+def message_deleted(sender, document, **kwargs):
+    increment(messages=-1)
+
+def user_saved(sender, document, created=False, **kwargs):
+    if created:
+        increment(users=1)
+
+def user_deleted(sender, document, **kwargs):
+    increment(users=-1)
+
+def connect():
+    """ Keeps the snapshot counters in step with document writes """
+    signals.post_save.connect(auction_saved, sender=Auction)
+    signals.post_delete.connect(auction_deleted, sender=Auction)
+    signals.post_save.connect(bid_saved, sender=Bids)
+    signals.post_delete.connect(bid_deleted, sender=Bids)
+    signals.post_save.connect(message_saved, sender=Message)
+    signals.post_bulk_insert.connect(messages_inserted, sender=Message)
+    signals.post_delete.connect(message_deleted, sender=Message)
+    signals.post_save.connect(user_saved, sender=User)
+    signals.post_delete.connect(user_deleted, sender=User)
+
+
+# Reconciliation: recomputes the snapshot from the collections
+
+def reconcile(now=None):
+    """
+    Rewrites the snapshot. Totals come from collection metadata
+    (estimated_document_count), breakdowns from aggregations over indexed
+    ranges: every auction by category, the last HOURS of bids by createdAt and
+    auctions ending from the current hour on. Writes made by raw updates (which
+    send no signals) are picked up here.
+    """
+    now = now or datetime.utcnow()
+    since = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=get_config()['HOURS'] - 1)
+    auctions = Auction._get_collection()
+
+    def grouped(coll, pipeline):
+        return {map_key(row['_id']): row['count'] for row in coll.aggregate(pipeline) if row['_id'] is not None}
+
+    snapshot = {
+        'users': User._get_collection().estimated_document_count(),
+        'auctions': auctions.estimated_document_count(),
+        'bids': Bids._get_collection().estimated_document_count(),
+        'messages': Message._get_collection().estimated_document_count(),
+        'auctions_by_category': grouped(auctions, [
+            {'$group': {'_id': '$category', 'count': {'$sum': 1}}},
+        ]),
+        'auctions_by_end_hour': grouped(auctions, [
+            {'$match': {'ends_at': {'$gte': now.replace(minute=0, second=0, microsecond=0)}}},
+            {'$group': {'_id': hour_of('$ends_at'), 'count': {'$sum': 1}}},
+        ]),
+        'bids_by_hour': grouped(Bids._get_collection(), [
+            {'$match': {'createdAt': {'$gte': since}}},
+            {'$group': {'_id': hour_of('$createdAt'), 'count': {'$sum': 1}}},
+        ]),
+        'reconciled_at': now,
+    }
+    collection().replace_one({'_id': SNAPSHOT_KEY}, snapshot, upsert=True)
+    return snapshot
+
+_reconciling = threading.Lock()
+
+def reconcile_in_background():
+    """ Starts a reconciliation unless one is already running """
+    if not _reconciling.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            reconcile()
+        except Exception as error:
+            log.exception("Stats reconciliation failed")
+        finally:
+            _reconciling.release()
+
+    threading.Thread(target=run, name='stats-reconcile', daemon=True).start()
+
+
+# Reads
+
+def snapshot(now=None):
+    """
+    The dashboard view of the snapshot, from a single read. Live auctions are
+    those ending from the current hour on, so the count is exact to the hour.
+    """
+    now = now or datetime.utcnow()
+    doc = collection().find_one({'_id': SNAPSHOT_KEY}) or {}
+    reconciled_at = doc.get('reconciled_at')
+    if reconciled_at is None or (now - reconciled_at).total_seconds() > get_config()['RECONCILE_INTERVAL']:
+        reconcile_in_background()
+
+    current_hour = hour_key(now)
+    first_hour = hour_key(now - timedelta(hours=23))
+    bids_by_hour = doc.get('bids_by_hour') or {}
+    return {
+        'users': doc.get('users', 0),
+        'auctions': doc.get('auctions', 0),
+        'live_auctions': sum(count for hour, count in (doc.get('auctions_by_end_hour') or {}).items()
+                             if hour >= current_hour),
+        'bids': doc.get('bids', 0),
+        'messages': doc.get('messages', 0),
+        'auctions_by_category': sorted(
+            ((category, count) for category, count in (doc.get('auctions_by_category') or {}).items() if count > 0),
+            key=lambda item: (-item[1], item[0]),
+        ),
+        'bids_by_hour': [(hour, bids_by_hour[hour]) for hour in sorted(bids_by_hour) if hour >= first_hour],
+        'reconciled_at': reconciled_at,
+    }
@@ -0,0 +1,99 @@
+# web/streaming.py
+import zlib
+from django.conf                    import settings
+from django.core.serializers.json   import DjangoJSONEncoder
+from django.http                    import StreamingHttpResponse
+from django.utils.cache             import patch_vary_headers
+
+DEFAULTS = {
+    'BATCH_SIZE': 500,          # Documents fetched per Mongo cursor round trip
+    'CHUNK_BYTES': 64 * 1024,   # Encoded bytes buffered before a chunk is sent
+    'GZIP': True,               # Compress when the client sends Accept-Encoding: gzip
+    'GZIP_LEVEL': 6,
+}
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'STREAMING_JSON', {}))
+    return config
+
+def wants_stream(request):
+    """ Clients opt into streaming with ?stream=1 """
+    return request.GET.get('stream') in ('1', 'true')
+
+def iter_json_object(fields, chunk_bytes=None):
+    """
+    Encodes `fields` as one JSON object, yielding UTF-8 chunks of about
+    `chunk_bytes`. Iterator values are written as arrays one item at a time,
+    so only the current chunk is ever held in memory. Callable values are
+    called when reached, after any arrays before them have been written.
+    """
+    chunk_bytes = chunk_bytes or get_config()['CHUNK_BYTES']
+    encode = DjangoJSONEncoder().encode
+    parts, size = [], 0
+
+    def push(text):
+        nonlocal size
+        parts.append(text)
+        size += len(text)
+
+    def drain():
+        nonlocal parts, size
+        chunk = ''.join(parts).encode('utf-8')
+        parts, size = [], 0
+        return chunk
+
+    push('{')
+    for index, (key, value) in enumerate(fields.items()):
+        push((', ' if index else '') + encode(key) + ': ')
+        if callable(value):
+            value = value()
+        if isinstance(value, (dict, list, str, int, float, bool)) or value is None:
+            push(encode(value))
+            continue
+
+        push('[')
+        for position, item in enumerate(value):
+            push((', ' if position else '') + encode(item))
+            if size >= chunk_bytes:
+                yield drain()
+        push(']')
+    push('}')
+    yield drain()
+
+def then(chunks, callback):
+    """ Yields `chunks`, then runs `callback` once they have all been produced """
+    yield from chunks
+    callback()
+
+def gzip_chunks(chunks, level):
+    """ Compresses a chunk stream incrementally into a single gzip member """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class StreamingJsonResponse(StreamingHttpResponse):
+    """
+    JSON object response encoded incrementally from iterators (typically Mongo
+    cursors opened with no_cache() and a batch_size), optionally gzipped.
+    """
+
+    def __init__(self, request, fields, status=200, gzip=None, on_complete=None, **kwargs):
+        config = get_config()
+        chunks = iter_json_object(fields, config['CHUNK_BYTES'])
+        if on_complete is not None:
+            chunks = then(chunks, on_complete)
+
+        if gzip is None:
+            gzip = config['GZIP'] and 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if gzip:
+            chunks = gzip_chunks(chunks, config['GZIP_LEVEL'])
+
+        super().__init__(chunks, content_type='application/json', status=status, **kwargs)
+        if gzip:
+            self['Content-Encoding'] = 'gzip'
+        patch_vary_headers(self, ('Accept-Encoding',))
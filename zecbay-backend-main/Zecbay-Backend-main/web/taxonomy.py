@@ -0,0 +1,106 @@
+# web/taxonomy.py
+import hashlib
+import json
+from types              import MappingProxyType
+from mongoengine        import ValidationError
+
+# Product categories and their subcategories, in display order
+CATEGORY_TREE = (
+    ("Textiles & Apparels", (
+        "Cotton & Synthetic Fabrics",
+        "Readymade Garments",
+        "Home Textiles",
+        "Woolen & Silk Products",
+        "Denim & Industrial Textiles",
+    )),
+    ("Handicrafts & Home Decor", (
+        "Wooden Handicrafts",
+        "Metal Artware",
+        "Marble & Stone Handicrafts",
+        "Jute Products",
+        "Pottery & Ceramic Decor",
+        "Carpets & Rugs",
+    )),
+    ("Engineering Goods & Machinery", (
+        "Industrial Machinery",
+        "Pumps & Valves",
+        "Auto Components",
+        "Electrical Equipment",
+        "Diesel Engines & Generators",
+        "Agricultural Implements",
+    )),
+    ("Plastics & Polymers", (
+        "Plastic Packaging Materials",
+        "Household Plastic Items",
+        "PVC, HDPE, LDPE Products",
+        "Recycled Plastic Granules",
+    )),
+    ("Leather & Footwear", (
+        "Finished Leather",
+        "Leather Footwear",
+        "Leather Bags & Accessories",
+        "Industrial Leather Gloves",
+    )),
+    ("Building & Construction Materials", (
+        "Ceramic Tiles & Sanitaryware",
+        "Granite, Marble & Natural Stones",
+        "Cement & Clinker",
+        "Paints & Coatings",
+        "Steel & Iron Products",
+    )),
+    ("Automobiles & Spare Parts", (
+        "Two-Wheelers",
+        "Three-Wheelers",
+        "Auto Spare Parts",
+        "Tires & Tubes",
+    )),
+    ("Furniture & Wood Products", (
+        "Solid Wood Furniture",
+        "MDF & Particle Board",
+        "Office & School Furniture",
+        "Plywood & Veneers",
+    )),
+    ("Eco & Biodegradable Products", (
+        "Areca Leaf Plates",
+        "Bamboo Products",
+        "Jute Bags",
+        "Paper Products",
+    )),
+    ("Stationery & Printing", (
+        "Notebooks & Diaries",
+        "Printing Paper",
+        "Packaging Boxes",
+        "Office & Educational Supplies",
+    )),
+    ("IT & Electronics", (
+        "Computer Accessories",
+        "Mobile Accessories",
+        "Consumer Electronics",
+        "LED Lights",
+    )),
+)
+
+# Compiled once at import: category -> frozenset of subcategories, read-only
+CATEGORIES = MappingProxyType({category: frozenset(subcategories) for category, subcategories in CATEGORY_TREE})
+SUBCATEGORIES = frozenset().union(*CATEGORIES.values())
+
+# Serialized payload of /api/categories/ and its validator; the taxonomy only changes with a deploy
+CATEGORIES_JSON = json.dumps({
+    'categories': [
+        {'name': category, 'subcategories': list(subcategories)} for category, subcategories in CATEGORY_TREE
+    ],
+}).encode('utf-8')
+CATEGORIES_ETAG = '"%s"' % hashlib.sha1(CATEGORIES_JSON).hexdigest()[:20]
+
+def is_category(category):
+    return category in CATEGORIES
+
+def is_subcategory(category, subcategory):
+    return subcategory in CATEGORIES.get(category, ())
+
+def validate(category, subcategory):
+    """ Raises ValidationError unless `subcategory` belongs to `category` """
+    if category not in CATEGORIES:
+        raise ValidationError(f"Invalid category selected: {category}")
+    if subcategory not in CATEGORIES[category]:
+        raise ValidationError(f"Subcategory '{subcategory}' does not belong to category '{category}'.")
@@ -1,3 +1,1354 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import logging
+import marshal
+import threading
+import time
+import tracemalloc
+from datetime       import datetime, timedelta, timezone
+from unittest       import mock
+from bson           import ObjectId
+from django.http    import JsonResponse
+from bson           import encode as bson_encode
+from django.test    import RequestFactory, SimpleTestCase, override_settings
+from mongoengine    import Q, ValidationError, signals
+from pymongo.errors import DuplicateKeyError
 
-# Create your tests here.
+from Zecbay         import backpressure, protocol
+from web            import chat, hscodes, inbox, logs, metrics, mongo, profiling, realtime, registrations, rollups, search, stats, streaming, taxonomy, writes
+from web.cache      import LRUCache, auction_tag, cached_json_view, response_cache
+from web.middleware import RequestMetricsMiddleware, VersionedETagMiddleware
+from web.models     import Auction, Bids, Message, Rollup, User
+
+
+def isolate_write_hooks(test):
+    """ Keeps the stats and rollup handlers that signals sent by a test fire from touching the database """
+    patchers = [
+        mock.patch.object(stats, 'increment'),
+        mock.patch.object(rollups, 'apply'),
+        mock.patch.object(rollups, 'auction_facts', return_value=(None, None, None)),
+    ]
+    for patcher in patchers:
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+class SlowReader:
+    """ Stands in for a WebSocket whose client reads slower than the group publishes """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.received = []
+
+    async def send(self, text_data=None, bytes_data=None):
+        await asyncio.sleep(self.delay)
+        self.received.append(text_data)
+
+
+class OutboundQueueTests(SimpleTestCase):
+    def setUp(self):
+        backpressure.reset_metrics()
+
+    def publish(self, policy, count=50, max_size=5, delay=0.01):
+        async def run():
+            reader = SlowReader(delay)
+            queue = backpressure.OutboundQueue(reader.send, max_size=max_size, policy=policy)
+            queue.start()
+            accepted = [queue.put({'text_data': str(i)}) for i in range(count)]
+            # Let the writer flush whatever survived
+            await asyncio.sleep(delay * (max_size + 2))
+            depth = len(queue)
+            await queue.close()
+            return reader, queue, accepted, depth
+        return asyncio.run(run())
+
+    def test_drop_oldest_keeps_newest_frames(self):
+        reader, queue, accepted, depth = self.publish(backpressure.DROP_OLDEST)
+        self.assertTrue(all(accepted))
+        self.assertEqual(depth, 0)
+        self.assertEqual(reader.received[-5:], ['45', '46', '47', '48', '49'])
+        self.assertEqual(queue.dropped + len(reader.received), 50)
+
+    def test_latest_collapses_to_newest_snapshot(self):
+        reader, queue, accepted, depth = self.publish(backpressure.LATEST)
+        self.assertTrue(all(accepted))
+        self.assertEqual(reader.received[-1], '49')
+        self.assertLessEqual(len(reader.received), 6)
+
+    def test_disconnect_policy_rejects_slow_reader(self):
+        reader, queue, accepted, depth = self.publish(backpressure.DISCONNECT)
+        self.assertFalse(accepted[-1])
+        self.assertTrue(queue.overflowed)
+        self.assertEqual(backpressure.get_metrics()['slow_disconnects'], 1)
+
+    def test_queue_never_exceeds_bound(self):
+        async def run():
+            reader = SlowReader(1)
+            queue = backpressure.OutboundQueue(reader.send, max_size=3)
+            queue.start()
+            depths = []
+            for i in range(100):
+                queue.put({'text_data': str(i)})
+                depths.append(len(queue))
+            await queue.close()
+            return depths
+        self.assertLessEqual(max(asyncio.run(run())), 3)
+        self.assertGreater(backpressure.get_metrics()['frames_dropped'], 90)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_burst_then_throttle(self):
+        now = [0.0]
+        bucket = backpressure.TokenBucket(rate=2, burst=3, clock=lambda: now[0])
+        self.assertEqual([bucket.allow() for _ in range(4)], [True, True, True, False])
+        now[0] += 0.5
+        self.assertTrue(bucket.allow())
+        self.assertFalse(bucket.allow())
+
+
+class ProtocolTests(SimpleTestCase):
+    def test_json_is_default(self):
+        codec = protocol.negotiate([])
+        self.assertIsNone(codec.subprotocol)
+        self.assertEqual(codec.encode(protocol.BID_EVENT, 'bid', {'round': 1}), {'text_data': '{"bid": {"round": 1}}'})
+
+    def test_msgpack_compact_bid_round_trip(self):
+        codec = protocol.negotiate(['zecbay.msgpack.v1', 'zecbay.json.v1'])
+        self.assertEqual(codec.subprotocol, protocol.MSGPACK_SUBPROTOCOL)
+        frame = codec.encode(protocol.BID_EVENT, 'bid', {'exporterId': 7, 'pricePerQuantity': 12.5, 'product_name': 'x'},
+                             auction_id='a1', timestamp=1000)
+        event_type, payload = protocol.unpack_event(frame['bytes_data'])
+        self.assertEqual(event_type, protocol.BID_EVENT)
+        self.assertEqual(payload['exporterId'], 7)
+        self.assertEqual(payload['auction_id'], 'a1')
+        self.assertNotIn('product_name', payload)
+
+    def test_control_frames_use_the_negotiated_codec(self):
+        codec = protocol.negotiate(['zecbay.msgpack.v1'])
+        error = codec.encode(protocol.ERROR_EVENT, 'error', 'rate_limited')
+        ack = codec.encode(protocol.ACK_EVENT, 'ack', {'client_id': 'c1', 'message_id': 'm1'})
+        self.assertEqual(protocol.unpack_event(error['bytes_data']), (protocol.ERROR_EVENT, {'error': 'rate_limited'}))
+        self.assertEqual(protocol.unpack_event(ack['bytes_data'])[1], {'client_id': 'c1', 'message_id': 'm1'})
+        self.assertEqual(protocol.negotiate([]).encode(protocol.ERROR_EVENT, 'error', 'rate_limited'),
+                         {'text_data': '{"error": "rate_limited"}'})
+
+
+class BidConsumerTests(SimpleTestCase):
+    def setUp(self):
+        self.auction_id = str(ObjectId())
+
+    def exchange(self, frame):
+        from asgiref.testing import ApplicationCommunicator
+        from Zecbay.consumers import BidConsumer
+
+        async def run():
+            communicator = ApplicationCommunicator(BidConsumer.as_asgi(), {
+                'type': 'websocket', 'path': f"/ws/bids/{self.auction_id}/", 'subprotocols': [],
+                'url_route': {'kwargs': {'auction_id': self.auction_id}},
+            })
+            await communicator.send_input({'type': 'websocket.connect'})
+            self.assertEqual((await communicator.receive_output(2))['type'], 'websocket.accept')
+            await communicator.send_input({'type': 'websocket.receive', 'text': json.dumps(frame)})
+            reply = json.loads((await communicator.receive_output(2))['text'])
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await communicator.wait(timeout=1)
+            return reply
+        return asyncio.run(run())
+
+    def test_load_test_bid_frame_is_saved_and_fanned_out(self):
+        from web.management.commands.ws_loadtest import Command as LoadTest
+        load_test = LoadTest()
+        load_test.exporter_ids = [990000000]
+        frame = load_test.make_frame('bids', 0, 3)
+
+        auction = mock.Mock(is_ended=mock.Mock(return_value=False))
+        exporter = User(userid=990000000, username='LOAD0000')
+        with mock.patch.object(Auction, 'objects') as auctions, mock.patch.object(User, 'objects') as users:
+            auctions.return_value.first.return_value = auction
+            users.return_value.first.return_value = exporter
+            reply = self.exchange(frame)
+
+        auction.place_bid.assert_called_once_with(exporter, frame['bid']['pricePerQuantity'])
+        self.assertEqual(reply['bid']['sent_at'], frame['bid']['sent_at'])
+
+    def test_incomplete_or_unknown_bids_get_error_frames(self):
+        self.assertEqual(self.exchange({'bid': {'round': 1}}), {'error': 'invalid_bid'})
+        with mock.patch.object(Auction, 'objects') as auctions:
+            auctions.return_value.first.return_value = None
+            self.assertEqual(self.exchange({'bid': {'exporterId': 1, 'pricePerQuantity': 9.5}}),
+                             {'error': 'Auction not found'})
+
+
+@override_settings(CHAT_WRITE_BEHIND={'MAX_BATCH': 10, 'MAX_DELAY_MS': 20})
+class ChatWriterTests(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+
+    def insert(self, docs):
+        self.batches.append(list(docs))
+
+    def test_batches_preserve_arrival_order(self):
+        writer = chat.ChatWriter(insert=self.insert)
+        auction = ObjectId()
+        futures = [writer.submit(auction, 'a', 'b', str(i)) for i in range(25)]
+        saved = [future.result(timeout=2) for future in futures]
+        writer.shutdown()
+
+        self.assertEqual([m.message for m in saved], [str(i) for i in range(25)])
+        self.assertEqual([m.message for batch in self.batches for m in batch], [str(i) for i in range(25)])
+        self.assertLessEqual(max(len(batch) for batch in self.batches), 10)
+
+    def test_shutdown_flushes_pending_messages(self):
+        writer = chat.ChatWriter(insert=self.insert)
+        future = writer.submit(ObjectId(), 'a', 'b', 'last words')
+        writer.shutdown()
+        self.assertEqual(future.result(timeout=0).message, 'last words')
+
+    def test_failed_flush_is_not_acknowledged(self):
+        writer = chat.ChatWriter(insert=mock.Mock(side_effect=RuntimeError('down')))
+        future = writer.submit(ObjectId(), 'a', 'b', 'lost?')
+        with self.assertRaises(RuntimeError):
+            future.result(timeout=2)
+        writer.shutdown()
+
+
+class FakeMessages:
+    """ The slice of a Message queryset get_messages uses, over an in-memory thread """
+
+    def __init__(self, messages, query=None, ordering=(), limit=None):
+        self.messages, self.query, self.ordering, self._limit = messages, query or {}, ordering, limit
+
+    def __call__(self, **kwargs):
+        return self.filter(**kwargs)
+
+    def filter(self, *queries, **kwargs):
+        query = dict(self.query)
+        for q in queries + ((Q(**kwargs),) if kwargs else ()):
+            query = {'$and': [query, q.to_query(Message)]}
+        return FakeMessages(self.messages, query, self.ordering, self._limit)
+
+    def order_by(self, *keys):
+        return FakeMessages(self.messages, self.query, keys, self._limit)
+
+    def limit(self, count):
+        return FakeMessages(self.messages, self.query, self.ordering, count)
+
+    def only(self, *fields):
+        return self
+
+    no_cache = lambda self: self
+    batch_size = lambda self, size: self
+
+    def first(self):
+        return next(iter(self), None)
+
+    def __iter__(self):
+        rows = [m for m in self.messages if matches(m.to_mongo(), self.query)]
+        for key in reversed(self.ordering):
+            field = '_id' if key.lstrip('-') == 'id' else key.lstrip('-')
+            rows.sort(key=lambda m: m.to_mongo()[field], reverse=key.startswith('-'))
+        return iter(rows[:self._limit] if self._limit else rows)
+
+def matches(doc, query):
+    """ Evaluates the $and/$or/$gt/$lt/equality subset of a Mongo filter against `doc` """
+    for key, condition in query.items():
+        if key == '$and':
+            if not all(matches(doc, q) for q in condition):
+                return False
+        elif key == '$or':
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = doc.get(key)
+            if '$gt' in condition and not value > condition['$gt']:
+                return False
+            if '$lt' in condition and not value < condition['$lt']:
+                return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+class GetMessagesTests(SimpleTestCase):
+    def setUp(self):
+        response_cache.clear()
+        self.auction = ObjectId()
+        start = datetime(2026, 3, 1, 12, 0, 0)
+        # Three messages share a second, as a busy room writes them
+        self.thread = [self.message(start + timedelta(milliseconds=ms), f"m{i}") for i, ms in enumerate([0, 100, 200, 900, 2000])]
+        patchers = [
+            mock.patch.object(chat, 'resolve_auction', return_value=self.auction),
+            mock.patch.object(Message, 'objects', FakeMessages(self.thread)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def message(self, timestamp, text):
+        message = Message(auction=self.auction, sender_username='IMP1', receiver_username='EXP1', message=text, timestamp=timestamp)
+        message.id = ObjectId()
+        return message
+
+    def get(self, query='', **headers):
+        from web import views
+        response = views.get_messages(RequestFactory().get(f'/api/messages/{self.auction}/{query}', **headers),
+                                      auction_id=str(self.auction))
+        return response, (json.loads(response.content) if response.status_code == 200 else None)
+
+    def texts(self, body):
+        return [m['message'] for m in body['messages']]
+
+    def test_limit_and_before_page_backwards(self):
+        _, body = self.get('?limit=2')
+        self.assertEqual((self.texts(body), body['has_more']), (['m3', 'm4'], True))
+        _, body = self.get(f'?limit=2&before={body["messages"][0]["message_id"]}')
+        self.assertEqual(self.texts(body), ['m1', 'm2'])
+        self.assertEqual(self.get('?limit=0')[0].status_code, 400)
+
+    def test_since_returns_only_newer_messages(self):
+        _, body = self.get(f'?since={self.thread[1].id}&limit=2')
+        self.assertEqual((self.texts(body), body['has_more']), (['m2', 'm3'], True))
+        self.assertEqual(self.get(f'?since={ObjectId()}')[0].status_code, 400)
+
+    def test_unchanged_poll_gets_304_and_a_new_message_in_the_same_second_does_not(self):
+        response, _ = self.get('?limit=10')
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        self.assertEqual(self.get('?limit=10', HTTP_IF_NONE_MATCH=etag)[0].status_code, 304)
+
+        self.thread.append(self.message(self.thread[-1].timestamp + timedelta(milliseconds=5), 'm5'))
+        response, body = self.get('?limit=10', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.texts(body)[-1], 'm5')
+
+
+class InboxTests(SimpleTestCase):
+    def test_record_messages_updates_both_sides_in_one_bulk_write(self):
+        auction = ObjectId()
+        message = Message(auction=auction, sender_username='IMP1', receiver_username='EXP1', message='hello')
+        message.id = ObjectId()
+
+        collection = mock.Mock()
+        with mock.patch.object(inbox.Conversation, '_get_collection', return_value=collection):
+            inbox.record_messages([message])
+
+        collection.bulk_write.assert_called_once()
+        sender_op, receiver_op = collection.bulk_write.call_args[0][0]
+        self.assertEqual(sender_op._filter, {'owner_username': 'IMP1', 'auction': auction, 'counterparty_username': 'EXP1'})
+        self.assertNotIn('$inc', sender_op._doc)
+        self.assertEqual(receiver_op._filter['owner_username'], 'EXP1')
+        self.assertEqual(receiver_op._doc['$inc'], {'unread_count': 1})
+        self.assertTrue(receiver_op._upsert)
+
+    def test_inbox_rejects_non_positive_limits_and_totals_every_conversation(self):
+        from web import views
+        for limit in ('0', '-5', 'ten'):
+            response = views.get_inbox(RequestFactory().get(f'/api/inbox/?username=EXP1&limit={limit}'))
+            self.assertEqual(response.status_code, 400)
+
+        page = [{'auction_id': str(ObjectId()), 'unread_count': 2}]
+        collection = mock.Mock()
+        collection.aggregate.return_value = iter([{'_id': None, 'total': 7}])
+        with mock.patch.object(inbox, 'list_conversations', return_value=page) as list_conversations, \
+             mock.patch.object(inbox.Conversation, '_get_collection', return_value=collection):
+            response = views.get_inbox(RequestFactory().get('/api/inbox/?username=EXP1&limit=1'))
+        list_conversations.assert_called_once_with('EXP1', limit=1, before=None)
+        self.assertEqual(json.loads(response.content)['unread_total'], 7)
+        self.assertEqual(collection.aggregate.call_args[0][0][0]['$match']['owner_username'], 'EXP1')
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        isolate_write_hooks(self)
+        response_cache.clear()
+        self.auction_id = ObjectId()
+        self.state = {'current_price': 100.0, 'winner': 'EXP1'}
+        self.calls = 0
+
+        @cached_json_view(lambda request, auction_id: [auction_tag(auction_id)])
+        def auction_detail(request, auction_id):
+            self.calls += 1
+            return JsonResponse(dict(self.state))
+        self.view = auction_detail
+
+    def get(self):
+        request = RequestFactory().get(f'/api/auctions/{self.auction_id}/')
+        return json.loads(self.view(request, auction_id=str(self.auction_id)).content)
+
+    def commit_bid(self, price, winner):
+        self.state.update(current_price=price, winner=winner)
+        bid = Bids(auctionID=self.auction_id, pricePerQuantity=price)
+        signals.post_save.send(Bids, document=bid, created=True)
+
+    def test_repeat_reads_are_served_from_cache(self):
+        self.get()
+        self.get()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(response_cache.stats()['hits'], 1)
+
+    def test_no_stale_price_or_winner_after_bid_commit(self):
+        self.get()
+        for price, winner in [(95.0, 'EXP2'), (90.0, 'EXP3'), (89.5, 'EXP2')]:
+            self.commit_bid(price, winner)
+            body = self.get()
+            self.assertEqual(body, {'current_price': price, 'winner': winner})
+
+    def test_bid_during_computation_does_not_pin_stale_body(self):
+        original = self.view
+
+        def racing_view(request, auction_id):
+            response = original.__wrapped__(request, auction_id)
+            # A bid commits after the body was built but before it is cached
+            self.commit_bid(80.0, 'EXP9')
+            return response
+
+        racing = cached_json_view(lambda request, auction_id: [auction_tag(auction_id)])(racing_view)
+        racing(RequestFactory().get(f'/api/auctions/{self.auction_id}/'), auction_id=str(self.auction_id))
+        self.assertEqual(self.get()['current_price'], 80.0)
+
+    def test_other_auctions_stay_cached(self):
+        self.get()
+        bid = Bids(auctionID=ObjectId(), pricePerQuantity=1.0)
+        signals.post_save.send(Bids, document=bid, created=True)
+        self.get()
+        self.assertEqual(self.calls, 1)
+
+    def test_lru_is_bounded_by_bytes(self):
+        lru = LRUCache(max_entries=100, max_bytes=10)
+        for key in 'abcdef':
+            lru.set(key, key, size=3, ttl=60)
+        self.assertLessEqual(lru.bytes, 10)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.get('f'), 'f')
+
+
+class FakeTagCollection:
+    """ The cache_tags operations MongoTagStore issues, over a dict shared by every "process" """
+
+    def __init__(self):
+        self.rows = {}
+
+    def find(self, query):
+        return [dict(self.rows[tag]) for tag in query['_id']['$in'] if tag in self.rows]
+
+    def find_one(self, query):
+        row = self.rows.get(query['_id'])
+        return dict(row) if row else None
+
+    def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            self.update_one(operation._filter, operation._doc, upsert=True)
+
+    def update_one(self, query, update, upsert=False):
+        row = self.rows.setdefault(query['_id'], {'_id': query['_id']})
+        for field, amount in update.get('$inc', {}).items():
+            row[field] = row.get(field, 0) + amount
+        for field, value in update.get('$min', {}).items():
+            row[field] = min(row.get(field, value), value)
+        for field, value in update.get('$setOnInsert', {}).items():
+            row.setdefault(field, value)
+        for field in update.get('$unset', {}):
+            row.pop(field, None)
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        row = self.rows.get(query['_id'])
+        if row is None and not upsert:
+            return None
+        if row is not None and 'due' in query and not row.get('due', float('inf')) <= query['due']['$lte']:
+            return None
+        self.update_one(query, update)
+        return dict(self.rows[query['_id']])
+
+
+@override_settings(RESPONSE_CACHE={'TAG_STORE': 'mongo'})
+class MongoTagStoreTests(SimpleTestCase):
+    def setUp(self):
+        from web.cache import CacheTag, TieredCache
+        patcher = mock.patch.object(CacheTag, '_get_collection', return_value=FakeTagCollection())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Two worker processes, each with its own in-process tier
+        self.worker_a, self.worker_b = TieredCache(), TieredCache()
+
+    def test_bid_handled_by_one_worker_invalidates_the_other(self):
+        tag = auction_tag(ObjectId())
+        for worker in (self.worker_a, self.worker_b):
+            worker.set('detail', b'{"current_price": 100.0}', worker.tag_versions([tag]))
+            self.assertIsNotNone(worker.get('detail'))
+
+        self.worker_a.invalidate(tag, 'listing')
+        self.assertIsNone(self.worker_b.get('detail'))
+        self.assertEqual(self.worker_b.tag_versions([tag]), self.worker_a.tag_versions([tag]))
+
+    def test_scheduled_close_is_applied_once_for_every_worker(self):
+        tag = auction_tag(ObjectId())
+        self.worker_a.schedule_invalidation(tag, time.time() + 60)
+        self.worker_b.schedule_invalidation(tag, time.time() - 1)  # The earlier schedule wins
+        self.assertEqual(self.worker_a.tag_versions([tag]), {tag: 1})
+        self.assertEqual(self.worker_b.tag_versions([tag]), {tag: 1})
+        self.assertEqual(self.worker_a.epoch(), self.worker_b.epoch())
+
+
+class AuctionStandingTests(SimpleTestCase):
+    def setUp(self):
+        self.auction = Auction(product_name='Rice', initial_price=100.0, current_price=90.0, version=3)
+        self.auction.id = ObjectId()
+
+    def lowest_bid(self, price):
+        bid = Bids(auctionID=self.auction.id, pricePerQuantity=price)
+        bid.id = ObjectId()
+        bids = mock.Mock()
+        bids.return_value.order_by.return_value.first.return_value = bid
+        return bid, bids
+
+    def test_unchanged_standing_issues_no_write(self):
+        bid, bids = self.lowest_bid(90.0)
+        self.auction.winner = bid
+        with mock.patch.object(Bids, 'objects', bids), mock.patch.object(Auction, 'objects') as auctions:
+            self.assertFalse(self.auction.refresh_standing())
+        auctions.assert_not_called()
+
+    def test_changed_standing_is_a_versioned_partial_update(self):
+        bid, bids = self.lowest_bid(85.0)
+        with mock.patch.object(Bids, 'objects', bids), mock.patch.object(Auction, 'objects') as auctions, \
+             mock.patch.object(realtime, 'publish_price') as publish_price:
+            auctions.return_value.update_one.return_value = 1
+            self.assertTrue(self.auction.refresh_standing())
+        publish_price.assert_called_once_with(self.auction.id, 85.0, bid.id)
+
+        guard = auctions.call_args[0][0].to_query(Auction)
+        self.assertEqual(guard['version'], 3)
+        auctions.return_value.update_one.assert_called_once_with(set__current_price=85.0, set__winner=bid.id, inc__version=1)
+        self.assertEqual((self.auction.current_price, self.auction.version), (85.0, 4))
+
+    def test_deleting_a_bid_invalidates_after_the_pull(self):
+        from web import views
+        calls = mock.Mock()
+        bid = mock.Mock(pk=ObjectId())
+        bid.auctionID = mock.Mock(id=self.auction.id, is_ended=mock.Mock(return_value=False))
+        bid.delete.side_effect = lambda: calls.delete()
+        with mock.patch.object(Bids, 'objects') as bids, mock.patch.object(Auction, 'objects') as auctions, \
+             mock.patch.object(views, 'invalidate_auction', side_effect=lambda auction_id: calls.invalidate(auction_id)):
+            bids.get.return_value = bid
+            auctions.return_value.update_one.side_effect = lambda **update: calls.pull(**update)
+            response = views.delete_bid(RequestFactory().post(f'/api/bids/{bid.pk}/delete/'), bid_id=str(bid.pk))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([name for name, _, _ in calls.mock_calls], ['delete', 'pull', 'invalidate'])
+        self.assertEqual(calls.invalidate.call_args[0][0], self.auction.id)
+
+    def test_price_update_reaches_the_auction_group(self):
+        from channels.layers import get_channel_layer
+        layer = get_channel_layer()
+
+        async def subscribe():
+            channel = await layer.new_channel()
+            await layer.group_add(realtime.auction_group(self.auction.id), channel)
+            return channel
+
+        channel = asyncio.run(subscribe())
+        winner = ObjectId()
+        realtime.publish_price(self.auction.id, 85.0, winner)
+        event = asyncio.run(layer.receive(channel))
+        self.assertEqual(event['type'], 'price_message')
+        self.assertEqual(event['price'], {'current_price': 85.0, 'winner_bid_id': str(winner)})
+
+    def test_conflicting_write_rereads_and_retries(self):
+        bid, bids = self.lowest_bid(85.0)
+        with mock.patch.object(Bids, 'objects', bids), mock.patch.object(Auction, 'objects') as auctions, \
+             mock.patch.object(Auction, 'reload') as reload:
+            auctions.return_value.update_one.side_effect = [0, 1]
+            self.assertTrue(self.auction.refresh_standing())
+        reload.assert_called_once()
+        self.assertEqual(auctions.return_value.update_one.call_count, 2)
+
+
+class PartialWriteTests(SimpleTestCase):
+    def setUp(self):
+        self.collection = mock.Mock()
+        self.collection.update_one.return_value.raw_result = {'n': 1, 'updatedExisting': True}
+        # Document.save() goes through collection.with_options(write_concern=...)
+        self.collection.write_concern.document = {}
+        self.collection.with_options.return_value = self.collection
+        patcher = mock.patch.object(Bids, '_get_collection', return_value=self.collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def loaded_bid(self, history=200):
+        return Bids._from_son({
+            '_id': ObjectId(), 'auctionID': ObjectId(), 'exporterId': ObjectId(),
+            'pricePerQuantity': 100.0, 'bidsMade': [f"{100 - i} at 2025-01-01T00:00:00" for i in range(history)],
+        })
+
+    def sent(self):
+        calls = self.collection.update_one.call_args_list
+        return len(calls), sum(len(bson_encode(c[0][0])) + len(bson_encode(c[0][1])) for c in calls)
+
+    def test_bid_update_is_one_small_round_trip(self):
+        # Before: mutate, then save() twice (as update_bid did via add_bid_history)
+        bid = self.loaded_bid()
+        bid.pricePerQuantity = 90.0
+        bid.bidsMade.append("90.0 at 2025-01-02T00:00:00")
+        bid.save()
+        bid.save()
+        old_trips, old_bytes = self.sent()
+
+        self.collection.update_one.reset_mock()
+        bid = self.loaded_bid()
+        token = writes.begin()
+        bid.pricePerQuantity = 90.0
+        bid.add_bid_history(90.0, commit=False)
+        writes.save(bid)
+        writes.save(bid)
+        stats = writes.end(token)
+        new_trips, new_bytes = self.sent()
+
+        self.assertEqual(new_trips, 1)
+        self.assertEqual((stats.writes, stats.collapsed), (1, 1))
+        update = self.collection.update_one.call_args[0][1]
+        self.assertEqual(update['$set'], {'pricePerQuantity': 90.0})
+        self.assertEqual(len(update['$push']['bidsMade']['$each']), 1)
+        self.assertLessEqual(new_trips, old_trips)
+        self.assertLess(new_bytes * 20, old_bytes)
+        self.assertEqual(len(bid.bidsMade), 201)
+
+    def test_unchanged_document_issues_no_write(self):
+        bid = self.loaded_bid()
+        bid.pricePerQuantity = 100.0
+        self.assertFalse(writes.save(bid))
+        self.collection.update_one.assert_not_called()
+
+    def test_fields_filled_in_by_clean_are_written(self):
+        created_at = datetime(2025, 1, 1, 6, 0)
+        auction = Auction._from_son({
+            '_id': ObjectId(), 'product_name': 'Jute bags', 'category': 'Eco & Biodegradable Products',
+            'subcategory': 'Jute Bags', 'description': 'Legacy auction without ends_at', 'initial_price': 100.0,
+            'current_price': 100.0, 'unit': 'kg', 'quantity': '10', 'round': 1, 'total_rounds': 1,
+            'created_at': created_at, 'user': 7,
+        })
+        with mock.patch.object(Auction, '_get_collection', return_value=self.collection):
+            auction.current_price = 95.0
+            self.assertTrue(writes.save(auction))
+        update = self.collection.update_one.call_args[0][1]
+        self.assertEqual(update['$set']['current_price'], 95.0)
+        self.assertEqual(update['$set']['ends_at'], created_at.replace(tzinfo=timezone.utc) + timedelta(hours=24))
+
+    def test_add_to_set_skips_existing_member(self):
+        user = ObjectId()
+        auction = Auction._from_son({'_id': ObjectId(), 'registered_users': [user]})
+        self.assertFalse(writes.add_to_set(auction, 'registered_users', user))
+        self.assertTrue(writes.add_to_set(auction, 'registered_users', ObjectId()))
+        self.assertEqual(len(auction.__dict__['_staged_ops']['$addToSet']['registered_users']), 1)
+
+
+class RegistrationTests(SimpleTestCase):
+    def setUp(self):
+        self.auction_id = str(ObjectId())
+        self.user = User(userid=7, username='EXP7')
+        self.collection = mock.Mock()
+        patcher = mock.patch.object(registrations.Registration, '_get_collection', return_value=self.collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_register_is_one_insert_and_one_counter_increment(self):
+        with mock.patch.object(Auction, 'objects') as auctions:
+            self.assertTrue(registrations.register(self.auction_id, self.user))
+        row = self.collection.insert_one.call_args[0][0]
+        self.assertEqual((row['auction'], row['user'], row['username']), (ObjectId(self.auction_id), 7, 'EXP7'))
+        auctions.return_value.update_one.assert_called_once_with(inc__register_count=1)
+
+    def test_duplicate_registration_leaves_count_alone(self):
+        self.collection.insert_one.side_effect = DuplicateKeyError('E11000')
+        with mock.patch.object(Auction, 'objects') as auctions:
+            self.assertFalse(registrations.register(self.auction_id, self.user))
+        auctions.assert_not_called()
+
+    def test_unregister_missing_registration_is_a_no_op(self):
+        self.collection.delete_one.return_value.deleted_count = 0
+        with mock.patch.object(Auction, 'objects') as auctions:
+            self.assertFalse(registrations.unregister(self.auction_id, 7))
+        auctions.assert_not_called()
+
+    def test_deleting_a_user_decrements_the_auctions_they_registered_for(self):
+        auctions = [ObjectId(), ObjectId()]
+        self.collection.distinct.return_value = auctions
+        with mock.patch.object(Auction, 'objects') as auction_objects:
+            registrations.user_deleting(User, self.user)
+        self.collection.distinct.assert_called_once_with('auction', {'user': 7})
+        query = auction_objects.call_args[1]
+        self.assertEqual((query['id__in'], query['register_count__gt']), (auctions, 0))
+        auction_objects.return_value.update.assert_called_once_with(dec__register_count=1)
+
+    def test_registrants_are_paginated_by_cursor(self):
+        rows = [{'_id': ObjectId(), 'user': i, 'username': f'EXP{i}'} for i in range(3)]
+        self.collection.find.return_value.sort.return_value.limit.return_value = rows
+        page, next_cursor = registrations.list_registrants(self.auction_id, limit=2, after=str(rows[0]['_id']))
+
+        query = self.collection.find.call_args[0][0]
+        self.assertEqual(query['_id'], {'$gt': rows[0]['_id']})
+        self.assertEqual([r['username'] for r in page], ['EXP0', 'EXP1'])
+        self.assertEqual(next_cursor, str(rows[1]['_id']))
+
+
+class AuctionEndsAtTests(SimpleTestCase):
+    def setUp(self):
+        response_cache.clear()
+
+    def test_ends_at_falls_back_to_created_at(self):
+        auction = Auction(created_at=datetime(2025, 1, 1, 6, 0))
+        self.assertEqual(auction.get_ends_at(), datetime(2025, 1, 2, 6, 0, tzinfo=timezone.utc))
+        self.assertFalse(auction.is_ended(datetime(2025, 1, 2, 5, 59, tzinfo=timezone.utc)))
+        self.assertTrue(auction.is_ended(datetime(2025, 1, 2, 6, 0, tzinfo=timezone.utc)))
+
+    def test_legacy_time_left_uses_ends_at(self):
+        auction = Auction(ends_at=datetime(2025, 1, 2, 6, 0))
+        now = datetime(2025, 1, 2, 4, 58, 30, tzinfo=timezone.utc)
+        self.assertEqual(auction.get_time_left(now), "1:01:30")
+        self.assertEqual(auction.get_time_left(now + timedelta(hours=2)), "Auction ended")
+
+    def test_response_cache_ttl_is_capped_by_the_view(self):
+        calls = []
+
+        @cached_json_view(lambda request: ['listing'], ttl=60)
+        def listing(request):
+            calls.append(1)
+            response = JsonResponse({'auctions': []})
+            response.cache_ttl = 0 if request.GET.get('legacy') else 30
+            return response
+
+        for _ in range(2):
+            listing(RequestFactory().get('/api/auctions/'))
+            listing(RequestFactory().get('/api/auctions/?legacy=1'))
+        self.assertEqual(len(calls), 3)
+
+
+@override_settings(RESPONSE_CACHE={'TAG_STORE': 'mongo'})
+class VersionedETagTests(SimpleTestCase):
+    def setUp(self):
+        from web.cache import CacheTag
+        patcher = mock.patch.object(CacheTag, '_get_collection', return_value=FakeTagCollection())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        isolate_write_hooks(self)
+        response_cache.clear()
+        self.auction_id = str(ObjectId())
+        self.calls = 0
+
+        @cached_json_view(lambda request, auction_id: [auction_tag(auction_id)], bypass=lambda request: 'legacy' in request.GET)
+        def auction_detail(request, auction_id):
+            self.calls += 1
+            return JsonResponse({'id': auction_id})
+        self.view = auction_detail
+
+    def poll(self, etag=None, path=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        request = RequestFactory().get(path or f'/api/auctions/{self.auction_id}/', **headers)
+        middleware = VersionedETagMiddleware(lambda request: self.view(request, auction_id=self.auction_id))
+        response = middleware.process_view(request, self.view, (), {'auction_id': self.auction_id})
+        return response or middleware(request)
+
+    def test_unchanged_auction_answers_304_without_running_the_view(self):
+        etag = self.poll()['ETag']
+        response = self.poll(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.calls, 1)
+
+    def test_bid_changes_the_etag(self):
+        etag = self.poll()['ETag']
+        signals.post_save.send(Bids, document=Bids(auctionID=ObjectId(self.auction_id), pricePerQuantity=1.0), created=True)
+        response = self.poll(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_scheduled_close_changes_the_etag(self):
+        etag = self.poll()['ETag']
+        response_cache.schedule_invalidation(auction_tag(self.auction_id), 0)
+        self.assertEqual(self.poll(etag).status_code, 200)
+
+    def test_bypassed_requests_get_no_validator(self):
+        response = self.poll(path=f'/api/auctions/{self.auction_id}/?legacy=1')
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_process_local_tag_versions_get_no_validator(self):
+        with override_settings(RESPONSE_CACHE={'TAG_STORE': 'local'}):
+            response = self.poll()
+        self.assertFalse(response.has_header('ETag'))
+
+
+class StreamingJsonTests(SimpleTestCase):
+    def messages(self, count):
+        # Stands in for a no_cache() Mongo cursor: documents are produced one at a time
+        auction_id = str(ObjectId())
+        for i in range(count):
+            yield {'auction_id': auction_id, 'message_id': str(ObjectId()), 'sender': 'IMP1',
+                   'receiver': 'EXP1', 'message': f'message number {i}', 'timestamp': '2025-01-01T00:00:00'}
+
+    def peak(self, build):
+        tracemalloc.start()
+        try:
+            response = build()
+            size = 0
+            for chunk in response:
+                size += len(chunk)
+            return tracemalloc.get_traced_memory()[1], size
+        finally:
+            tracemalloc.stop()
+
+    def stream(self, count, accept=''):
+        request = RequestFactory().get('/api/messages/x/?stream=1', HTTP_ACCEPT_ENCODING=accept)
+        return streaming.StreamingJsonResponse(request, {'messages': self.messages(count), 'has_more': False})
+
+    def test_output_is_one_json_document(self):
+        body = json.loads(b''.join(self.stream(1000)))
+        self.assertEqual(len(body['messages']), 1000)
+        self.assertEqual(body['messages'][-1]['message'], 'message number 999')
+        self.assertIs(body['has_more'], False)
+
+    def test_gzip_when_accepted(self):
+        response = self.stream(500, accept='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(b''.join(response)))['messages']), 500)
+
+    def test_peak_memory_is_flat_from_10k_to_100k_items(self):
+        streamed_10k, _ = self.peak(lambda: self.stream(10_000))
+        streamed_100k, size_100k = self.peak(lambda: self.stream(100_000))
+        buffered_10k, _ = self.peak(lambda: [JsonResponse({'messages': list(self.messages(10_000))}).content])
+
+        # Ten times the items must not mean meaningfully more memory when streaming
+        peaks = f"streamed 10k={streamed_10k} 100k={streamed_100k}, buffered 10k={buffered_10k}"
+        self.assertLess(streamed_100k, streamed_10k * 1.5, peaks)
+        self.assertLess(streamed_100k * 10, buffered_10k, peaks)
+        self.assertGreater(size_100k, 10 * 1024 * 1024)
+
+    def test_gzip_stream_stays_flat(self):
+        gz_10k, _ = self.peak(lambda: self.stream(10_000, accept='gzip'))
+        gz_100k, _ = self.peak(lambda: self.stream(100_000, accept='gzip'))
+        self.assertLess(gz_100k, gz_10k * 1.5)
+
+
+class SearchTests(SimpleTestCase):
+    def setUp(self):
+        search._facet_cache.clear()
+
+    def test_inverted_index_ranks_name_matches_first(self):
+        index = search.InvertedIndex()
+        in_name, in_description = ObjectId(), ObjectId()
+        index.add({'_id': in_name, 'product_name': 'Organic Cotton Yarn', 'description': 'spun in Tiruppur'})
+        index.add({'_id': in_description, 'product_name': 'Denim', 'description': 'made from cotton'})
+        index.add({'_id': ObjectId(), 'product_name': 'Steel pipes', 'description': 'for the pump'})
+
+        scores = index.score('the COTTON')
+        self.assertEqual(set(scores), {in_name, in_description})
+        self.assertGreater(scores[in_name], scores[in_description])
+
+    def test_inverted_index_forgets_edited_and_deleted_auctions(self):
+        index = search.InvertedIndex()
+        edited, deleted = ObjectId(), ObjectId()
+        index.add({'_id': edited, 'product_name': 'Cotton yarn', 'description': 'combed'})
+        index.add({'_id': deleted, 'product_name': 'Cotton towels', 'description': 'terry'})
+        index.last_id = deleted
+
+        index.reindex(Auction(pk=edited, product_name='Jute yarn', description='combed'))
+        index.discard(deleted)
+
+        self.assertEqual(index.score('cotton'), {})
+        self.assertEqual(set(index.score('jute yarn')), {edited})
+        self.assertEqual(index.size, 1)
+        self.assertNotIn('towels', index.postings)
+
+    def test_inverted_index_rebuilds_after_interval(self):
+        kept, gone = ObjectId(), ObjectId()
+        collection = mock.Mock()
+        collection.find.return_value.sort.return_value.batch_size.return_value = [
+            {'_id': gone, 'product_name': 'Cotton'}, {'_id': kept, 'product_name': 'Cotton'},
+        ]
+        index = search.InvertedIndex(collection)
+        index.catch_up(rebuild_interval=600)
+        self.assertEqual(index.size, 2)
+
+        # Deleted by another process
+        collection.find.return_value.sort.return_value.batch_size.return_value = [{'_id': kept, 'product_name': 'Cotton'}]
+        index.built_at -= 600
+        index.catch_up(rebuild_interval=600)
+        self.assertEqual(collection.find.call_args.args[0], {})
+        self.assertEqual(set(index.score('cotton')), {kept})
+
+    def test_inverted_search_sends_only_top_candidates_to_mongo(self):
+        index = search.InvertedIndex()
+        ids = [ObjectId() for _ in range(5)]
+        for count, doc_id in enumerate(ids, 1):
+            index.add({'_id': doc_id, 'product_name': 'cotton', 'description': ' '.join(['cotton'] * count)})
+        index.last_id, index.last_check, index.built_at = ids[-1], time.monotonic(), time.monotonic()
+        collection = mock.Mock()
+        collection.aggregate.return_value = iter([{'ids': [{'_id': ids[4]}, {'_id': ids[3]}]}])
+        collection.find.return_value = [{'_id': ids[4]}, {'_id': ids[3]}]
+
+        with override_settings(SEARCH={'BACKEND': 'inverted', 'MAX_CANDIDATES': 2}), \
+                mock.patch.object(search, 'inverted_index', index), \
+                mock.patch.object(Auction, '_get_collection', return_value=collection):
+            result = search.search('cotton')
+
+        match = collection.aggregate.call_args.args[0][0]['$match']
+        self.assertEqual(match['_id'], {'$in': [ids[4], ids[3]]})
+        self.assertEqual([hit['id'] for hit in result['results']], [str(ids[4]), str(ids[3])])
+
+    def test_one_aggregation_per_search_and_facets_reused_across_pages(self):
+        collection = mock.Mock()
+        collection.aggregate.return_value = iter([{
+            'hits': [{'_id': ObjectId(), 'product_name': 'Jute bag', 'current_price': 10.0, 'score': 1.5}],
+            'total': [{'count': 41}],
+            'categories': [{'_id': 'Eco & Biodegradable Products', 'count': 41}],
+            'subcategories': [{'_id': {'category': 'Eco & Biodegradable Products', 'subcategory': 'Jute Bags'}, 'count': 41}],
+        }])
+
+        with override_settings(SEARCH={'BACKEND': 'text'}), \
+                mock.patch.object(Auction, '_get_collection', return_value=collection):
+            first = search.search('jute', category='Eco & Biodegradable Products', min_price=5.0)
+            collection.aggregate.return_value = iter([{'hits': [], 'total': [{'count': 41}]}])
+            second = search.search('jute', page=3, category='Eco & Biodegradable Products', min_price=5.0)
+
+        self.assertEqual(collection.aggregate.call_count, 2)
+        first_pipeline = collection.aggregate.call_args_list[0].args[0]
+        self.assertEqual(first_pipeline[0]['$match']['$text'], {'$search': 'jute'})
+        self.assertEqual(first_pipeline[0]['$match']['current_price'], {'$gte': 5.0})
+        self.assertIn('categories', first_pipeline[-1]['$facet'])
+        # The second page skips the facet branches and reuses the cached counts
+        second_pipeline = collection.aggregate.call_args_list[1].args[0]
+        self.assertNotIn('categories', second_pipeline[-1]['$facet'])
+        self.assertEqual(second_pipeline[-1]['$facet']['hits'][2], {'$skip': 40})
+        self.assertEqual(first['total'], 41)
+        self.assertEqual(second['facets'], first['facets'])
+        self.assertEqual(first['facets']['subcategories'][0]['subcategory'], 'Jute Bags')
+
+
+class TaxonomyTests(SimpleTestCase):
+    def test_validate(self):
+        taxonomy.validate("Leather & Footwear", "Leather Footwear")
+        with self.assertRaisesMessage(ValidationError, "does not belong"):
+            taxonomy.validate("Leather & Footwear", "Jute Bags")
+        with self.assertRaisesMessage(ValidationError, "Invalid category"):
+            taxonomy.validate("Spaceships", "Jute Bags")
+
+    def test_taxonomy_is_read_only(self):
+        with self.assertRaises(TypeError):
+            taxonomy.CATEGORIES["Spaceships"] = frozenset()
+
+    def test_categories_endpoint_revalidates_with_etag(self):
+        response = self.client.get('/api/categories/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['categories']), len(taxonomy.CATEGORY_TREE))
+        again = self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+
+class HSCodeTests(SimpleTestCase):
+    index = hscodes.get_index()
+
+    def test_code_prefix_suggestions_are_ordered(self):
+        codes = [entry.code for entry in self.index.suggest('52', limit=50)]
+        self.assertEqual(codes[0], '52')
+        self.assertEqual(codes, sorted(codes))
+        self.assertIn('5208', codes)
+        self.assertEqual([entry.code for entry in self.index.suggest('1006.3')], ['100630'])
+
+    def test_description_suggestions_match_every_term(self):
+        codes = {entry.code for entry in self.index.suggest('woven cott')}
+        self.assertEqual(codes, {'5208', '5209'})
+        self.assertEqual(self.index.suggest('xylophone'), [])
+
+    def test_validate(self):
+        self.assertEqual(hscodes.validate('5208.11.10'), '52081110')
+        self.assertEqual(self.index.describe('52081110').code, '5208')
+        for code in ('77', '520', 'cotton', ''):
+            with self.assertRaises(ValueError):
+                hscodes.validate(code)
+
+    def test_suggestions_are_sub_millisecond(self):
+        queries = ['8', '84', '8413', 'pump', 'leather foot', 'ceramic tiles']
+        start = time.perf_counter()
+        for _ in range(200):
+            for query in queries:
+                self.index.suggest(query)
+        per_query_ms = (time.perf_counter() - start) * 1000 / (200 * len(queries))
+        self.assertLess(per_query_ms, 1.0)
+
+
+class StatsTests(SimpleTestCase):
+    def setUp(self):
+        self.collection = mock.Mock()
+        patcher = mock.patch.object(stats, 'collection', return_value=self.collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_new_auction_is_one_upserted_increment(self):
+        auction = Auction(category='IT & Electronics', created_at=datetime(2026, 5, 1, 10, 30))
+        stats.auction_saved(Auction, auction, created=True)
+        stats.auction_saved(Auction, auction, created=False)
+
+        self.collection.update_one.assert_called_once_with({'_id': 'platform'}, {'$inc': {
+            'auctions': 1,
+            'auctions_by_category.IT & Electronics': 1,
+            'auctions_by_end_hour.2026-05-02T10': 1,
+        }}, upsert=True)
+
+    def test_stats_failures_never_fail_the_write(self):
+        self.collection.update_one.side_effect = RuntimeError('stats down')
+        with self.assertLogs('web.stats', 'WARNING') as logs:
+            stats.messages_inserted(Message, [Message(), Message()])
+        self.assertIn('stats down', logs.output[0])
+
+    def test_dashboard_snapshot_is_one_read(self):
+        now = datetime(2026, 5, 2, 12, 15)
+        self.collection.find_one.return_value = {
+            'users': 4, 'auctions': 9, 'bids': 30, 'messages': 12,
+            'auctions_by_category': {'Leather & Footwear': 2, 'IT & Electronics': 7, 'Jute': 0},
+            'auctions_by_end_hour': {'2026-05-02T11': 3, '2026-05-02T12': 1, '2026-05-03T09': 2},
+            'bids_by_hour': {'2026-05-01T11': 5, '2026-05-01T13': 2, '2026-05-02T12': 1},
+            'reconciled_at': now - timedelta(minutes=1),
+        }
+        with mock.patch.object(stats, 'reconcile_in_background') as reconcile:
+            snapshot = stats.snapshot(now)
+
+        reconcile.assert_not_called()
+        self.assertEqual(self.collection.method_calls, [mock.call.find_one({'_id': 'platform'})])
+        self.assertEqual(snapshot['live_auctions'], 3)
+        self.assertEqual(snapshot['auctions_by_category'], [('IT & Electronics', 7), ('Leather & Footwear', 2)])
+        self.assertEqual(snapshot['bids_by_hour'], [('2026-05-01T13', 2), ('2026-05-02T12', 1)])
+
+    def test_stale_snapshot_schedules_reconciliation(self):
+        self.collection.find_one.return_value = None
+        with mock.patch.object(stats, 'reconcile_in_background') as reconcile:
+            self.assertEqual(stats.snapshot()['users'], 0)
+        reconcile.assert_called_once_with()
+
+
+class RollupTests(SimpleTestCase):
+    def setUp(self):
+        rollups._auction_facts.clear()
+        self.collection = mock.Mock()
+        patcher = mock.patch.object(Rollup, '_get_collection', return_value=self.collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_new_bid_is_one_bulk_write_of_an_upsert_per_granularity(self):
+        auction = Auction(id=ObjectId(), category='Jute', subcategory='Jute Bags', initial_price=100.0)
+        bid = Bids(auctionID=auction, exporterId=7, pricePerQuantity=80.0, createdAt=datetime(2026, 5, 1, 10, 30))
+        with mock.patch.object(Auction, '_get_collection') as auctions:
+            rollups.bid_saved(Bids, bid, created=True)
+            rollups.bid_saved(Bids, bid, created=False)
+        auctions.assert_not_called()
+
+        self.collection.bulk_write.assert_called_once()
+        operations = self.collection.bulk_write.call_args[0][0]
+        self.assertEqual([op._filter['bucket'] for op in operations],
+                         [datetime(2026, 5, 1, 10), datetime(2026, 5, 1)])
+        self.assertEqual(operations[0]._filter['subcategory'], 'Jute Bags')
+        update = operations[0]._doc
+        self.assertEqual(update['$inc']['bids'], 1)
+        self.assertEqual(update['$inc']['savings_sum'], 20.0)
+        self.assertEqual(update['$min'], {'min_price': 80.0})
+        self.assertEqual(update['$addToSet'], {'exporters': 7})
+
+    def test_auction_facts_are_cached_by_id(self):
+        auction_id = ObjectId()
+        with mock.patch.object(Auction, '_get_collection') as auctions:
+            auctions.return_value.find_one.return_value = {'category': 'Jute', 'initial_price': 50.0}
+            rollups.auction_facts(auction_id)
+            self.assertEqual(rollups.auction_facts(auction_id), ('Jute', None, 50.0))
+        auctions.return_value.find_one.assert_called_once()
+
+    def test_series_merges_subcategories_with_an_approximate_median(self):
+        bucket = datetime(2026, 5, 1)
+        prices = [10.0, 12.0, 15.0, 40.0, 41.0]
+        bins = [{}, {}]
+        for i, price in enumerate(prices):
+            key = rollups.price_bin(price)
+            bins[i % 2][key] = bins[i % 2].get(key, 0) + 1
+        self.collection.find.return_value = [
+            {'bucket': bucket, 'bids': 3, 'auctions': 1, 'exporters': [1, 2], 'min_price': 10.0,
+             'price_bins': bins[0], 'savings_sum': 30.0, 'initial_sum': 150.0},
+            {'bucket': bucket, 'bids': 2, 'auctions': 2, 'exporters': [2, 3], 'min_price': 12.0,
+             'price_bins': bins[1], 'savings_sum': 10.0, 'initial_sum': 50.0},
+        ]
+        [point] = rollups.series('day', bucket, bucket + timedelta(days=1), category='Jute')
+
+        self.assertEqual(self.collection.find.call_args[0][0]['category'], 'Jute')
+        self.assertEqual((point['bids'], point['auctions'], point['distinct_exporters']), (5, 3, 3))
+        self.assertEqual(point['min_price'], 10.0)
+        self.assertAlmostEqual(point['median_price'], 15.0, delta=0.15)
+        self.assertEqual(point['savings_pct'], 20.0)
+
+    def test_window_defaults_and_limits(self):
+        now = datetime(2026, 5, 2, 12, 15)
+        self.assertEqual(rollups.window('hour', now=now), (datetime(2026, 4, 30, 13), datetime(2026, 5, 2, 13)))
+        with self.assertRaises(ValueError):
+            rollups.window('week')
+        with self.assertRaises(ValueError):
+            rollups.window('hour', start=datetime(2026, 1, 1), end=datetime(2026, 5, 1))
+
+
+class LazyMongoConnectionTests(SimpleTestCase):
+    def setUp(self):
+        patchers = [
+            mock.patch.object(mongo, '_registered', False),
+            mock.patch.object(mongo, '_get_connection'),
+            mock.patch.object(mongo.connection, 'register_connection'),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @override_settings(MONGODB={'HOST': 'mongodb+srv://cluster.example.net/', 'MAX_POOL_SIZE': 4, 'WARM_UP': False})
+    def test_connection_is_defined_once_on_first_use_with_pool_settings(self):
+        mongo.install()
+        mongo.connection.register_connection.assert_not_called()
+
+        threads = [threading.Thread(target=mongo.get_connection) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mongo.connection.register_connection.assert_called_once()
+        options = mongo.connection.register_connection.call_args[1]
+        self.assertEqual((options['host'], options['db']), ('mongodb+srv://cluster.example.net/', 'zecbay'))
+        self.assertEqual((options['maxPoolSize'], options['serverSelectionTimeoutMS']), (4, 5000))
+        self.assertEqual(mongo._get_connection.call_count, 8)
+
+    @override_settings(MONGODB={'HOST': 'mongodb://localhost/', 'WARM_UP': True})
+    def test_install_warms_up_in_the_background(self):
+        with mock.patch.object(mongo, 'warm_up_in_background') as warm_up:
+            mongo.install()
+        warm_up.assert_called_once_with()
+
+    @override_settings(MONGODB={'HOST': None, 'WARM_UP': True})
+    def test_without_a_host_nothing_is_defined(self):
+        with mock.patch.object(mongo, 'warm_up_in_background') as warm_up:
+            mongo.install()
+            mongo.get_connection()
+        warm_up.assert_not_called()
+        mongo.connection.register_connection.assert_not_called()
+
+
+class RequestMetricsTests(SimpleTestCase):
+    def command(self, request_id, name, command, reply, micros=2000):
+        metrics.recorder.started(mock.Mock(connection_id=('db', 27017), request_id=request_id,
+                                           command_name=name, command=command))
+        metrics.recorder.succeeded(mock.Mock(connection_id=('db', 27017), request_id=request_id,
+                                             command_name=name, reply=reply, duration_micros=micros))
+
+    def view(self, request):
+        self.command(1, 'find', {'find': 'auction', 'filter': {'category': 'Jute', 'current_price': {'$lt': 10}}},
+                     {'cursor': {'firstBatch': [{'_id': 1}, {'_id': 2}], 'id': 0}, 'ok': 1})
+        self.command(2, 'getMore', {'getMore': 5, 'collection': 'auction'},
+                     {'cursor': {'nextBatch': [{'_id': 3}], 'id': 0}, 'ok': 1}, micros=1000)
+        return JsonResponse({})
+
+    @override_settings(METRICS={'SLOW_MS': 0, 'TOKEN': 'scrape-secret'})
+    def test_request_commands_reach_the_histograms_header_and_slow_log(self):
+        request = RequestFactory().get('/api/auctions/', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        request.resolver_match = mock.Mock(view_name='get_auctions')
+        before = metrics.MONGO_DOCUMENTS.series.get(('get_auctions',), [0] * 9)[-1]
+        with self.assertLogs('web.metrics', 'WARNING') as logs:
+            response = RequestMetricsMiddleware(self.view)(request)
+        self.assertEqual(logs.records[0].view, 'get_auctions')
+
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, mongo;dur=3\.0;desc="2 commands, 3 docs"$')
+        series = metrics.MONGO_DOCUMENTS.series[('get_auctions',)]
+        self.assertEqual(series[-1], before + 1)
+        entry = metrics.slow_log[-1]
+        self.assertEqual((entry['view'], entry['mongo_commands']), ('get_auctions', 2))
+        self.assertEqual(entry['commands'][0]['filter'], {'category': '?', 'current_price': {'$lt': '?'}})
+        self.assertEqual(entry['commands'][1]['collection'], 'auction')
+
+    @override_settings(METRICS={'TOKEN': 'scrape-secret'})
+    def test_server_timing_only_for_admins_and_the_metrics_token(self):
+        def timing(**headers):
+            request = RequestFactory().get('/api/auctions/', **headers)
+            request.session = session
+            return RequestMetricsMiddleware(lambda request: JsonResponse({}))(request).get('Server-Timing')
+
+        session = {}
+        self.assertIsNone(timing())
+        self.assertIsNone(timing(HTTP_AUTHORIZATION='Bearer guess'))
+        self.assertIsNotNone(timing(HTTP_AUTHORIZATION='Bearer scrape-secret'))
+
+        session = {'admin_claim': 'signed'}
+        from zecbay_admin import auth
+        with mock.patch.object(auth, 'claimed_admin', return_value='root'):
+            self.assertIsNotNone(timing())
+        with mock.patch.object(auth, 'claimed_admin', return_value=None):
+            self.assertIsNone(timing())
+        with override_settings(DEBUG=True):
+            self.assertIsNotNone(timing())
+
+    def test_reply_sizes_are_not_measured_by_default(self):
+        token = metrics.begin()
+        try:
+            with mock.patch.object(metrics.bson, 'encode') as encode:
+                self.command(4, 'find', {'find': 'auction'}, {'cursor': {'firstBatch': [{'_id': 1}]}, 'ok': 1})
+        finally:
+            request_metrics = metrics.end(token)
+        encode.assert_not_called()
+        self.assertEqual((request_metrics.documents, request_metrics.bytes), (1, 0))
+
+    def test_commands_outside_a_request_are_ignored(self):
+        self.command(3, 'find', {'find': 'auction'}, {'cursor': {'firstBatch': []}})
+        self.assertIsNone(metrics.current_metrics())
+
+    def test_histogram_exposition(self):
+        histogram = metrics.Histogram('t_seconds', 'Test', ('view',), (0.1, 1.0))
+        histogram.observe(0.5, 'a"b')
+        self.assertEqual(histogram.render().splitlines()[2:], [
+            't_seconds_bucket{view="a\\"b",le="0.1"} 0',
+            't_seconds_bucket{view="a\\"b",le="1.0"} 1',
+            't_seconds_bucket{view="a\\"b",le="+Inf"} 1',
+            't_seconds_sum{view="a\\"b"} 0.5',
+            't_seconds_count{view="a\\"b"} 1',
+        ])
+
+    @override_settings(METRICS={'TOKEN': 'scrape-secret'})
+    def test_metrics_endpoint_requires_the_token(self):
+        from web.views import metrics_view
+        factory = RequestFactory()
+        self.assertEqual(metrics_view(factory.get('/metrics')).status_code, 401)
+        response = metrics_view(factory.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE zecbay_request_duration_seconds histogram', response.content)
+
+
+def slow_listing(request):
+    time.sleep(0.05)
+    return JsonResponse({})
+
+class ProfilingTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(profiling, 'Profile')
+        self.Profile = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, path='/api/auctions/', **headers):
+        request = RequestFactory().get(path, **headers)
+        request.resolver_match = mock.Mock(view_name='get_auctions')
+        return request
+
+    def profile(self, request, **config):
+        with override_settings(PROFILING=config):
+            middleware = profiling.ProfilingMiddleware(lambda request: None)
+        return middleware.process_view(request, slow_listing, (), {})
+
+    def test_unflagged_requests_are_not_profiled(self):
+        with mock.patch.object(profiling.random, 'random') as rand:
+            self.assertIsNone(self.profile(self.request()))
+        rand.assert_not_called()
+        self.assertIsNone(self.profile(self.request(HTTP_X_PROFILE='forged')))
+        self.Profile.assert_not_called()
+
+    def test_token_header_samples_stacks_into_folded_output(self):
+        response = self.profile(self.request(HTTP_X_PROFILE=profiling.issue_token('sampler')), INTERVAL_MS=1)
+
+        self.assertEqual(response.status_code, 200)
+        saved = self.Profile.call_args[1]
+        self.assertEqual((saved['view'], saved['mode'], saved['trigger']), ('get_auctions', 'sampler', 'token'))
+        self.assertGreater(saved['samples'], 5)
+        folded = gzip.decompress(saved['data']).decode('utf-8')
+        self.assertIn('web.tests:slow_listing', folded.splitlines()[0])
+
+    def test_query_flag_runs_cprofile(self):
+        self.profile(self.request('/api/auctions/?_profile=' + profiling.issue_token('cprofile')))
+        stats = marshal.loads(gzip.decompress(self.Profile.call_args[1]['data']))
+        self.assertIn('slow_listing', {function for _, _, function in stats})
+
+    def test_sampling_is_limited_to_the_listed_views(self):
+        self.assertIsNone(self.profile(self.request(), SAMPLE_RATE=1.0, VIEWS=['dashboard']))
+        self.profile(self.request(), SAMPLE_RATE=1.0, VIEWS=['get_auctions'], INTERVAL_MS=1)
+        self.assertEqual(self.Profile.call_args[1]['trigger'], 'sample')
+
+
+class StructuredLoggingTests(SimpleTestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.handler = logs.AsyncHandler(stream=self.stream)
+        self.addCleanup(self.handler.close)
+        self.log = logging.getLogger('web.tests.structured')
+        self.log.addHandler(self.handler)
+        self.log.setLevel(logging.DEBUG)
+        self.log.propagate = False
+        self.addCleanup(self.log.removeHandler, self.handler)
+
+    def lines(self):
+        self.handler.flush()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_records_are_json_lines_with_extra_fields(self):
+        payload = {'price': 10}
+        self.log.info("Bid %s placed", 'b1', extra={'auction_id': 'a1'})
+        payload['price'] = 99  # Changed after the call: the record keeps what was logged
+        try:
+            raise ValueError('bad bid')
+        except ValueError:
+            self.log.exception("Bid failed", extra={'payload': dict(payload)})
+
+        first, second = self.lines()
+        self.assertEqual((first['level'], first['logger'], first['msg'], first['auction_id']),
+                         ('INFO', 'web.tests.structured', 'Bid b1 placed', 'a1'))
+        self.assertIn('ValueError: bad bid', second['exc'])
+
+    def test_debug_records_are_sampled_per_call_site(self):
+        clock = [0.0]
+        sampling = logs.SamplingFilter(rate=10, burst=3)
+        self.handler.addFilter(sampling)
+        listing = lambda i: self.log.debug("Listing auction %s", i)
+        with mock.patch.object(logs.time, 'monotonic', lambda: clock[0]):
+            for i in range(10):
+                listing(i)
+            self.log.warning("Not sampled")
+            clock[0] += 1.0
+            listing('later')
+
+        lines = self.lines()
+        self.assertEqual([line['msg'] for line in lines], [
+            'Listing auction 0', 'Listing auction 1', 'Listing auction 2', 'Not sampled', 'Listing auction later',
+        ])
+        self.assertEqual(lines[-1]['suppressed'], 7)
+
+    def test_a_full_queue_drops_instead_of_blocking(self):
+        handler = logs.AsyncHandler(stream=self.stream, max_queue=1)
+        handler.listener.stop()
+        handler.running = False
+        for _ in range(3):
+            handler.handle(logging.makeLogRecord({'msg': 'x', 'levelno': logging.INFO}))
+        self.assertEqual(handler.dropped, 2)
+
+    def test_dropped_count_rides_on_the_next_record(self):
+        handler = logs.AsyncHandler(stream=self.stream, max_queue=1)
+        handler.listener.stop()
+        handler.running = False
+        for msg in ('kept', 'lost', 'lost', 'after'):
+            handler.handle(logging.makeLogRecord({'msg': msg, 'levelno': logging.INFO}))
+            if msg == 'lost' and handler.dropped == 2:
+                handler.queue.get_nowait()  # The output caught up
+
+        record = handler.queue.get_nowait()
+        self.assertEqual((record.msg, record.dropped), ('after', 2))
+        self.assertEqual(handler.dropped, 0)
+        self.assertEqual(json.loads(logs.JsonFormatter().format(record))['dropped'], 2)
+
+    def test_close_with_a_full_queue_stops_the_listener(self):
+        release = threading.Event()
+        handler = logs.AsyncHandler(stream=self.stream, max_queue=1)
+        emit = handler.target.emit
+        handler.target.emit = lambda record: (release.wait(5), emit(record))
+        for i in range(3):
+            handler.handle(logging.makeLogRecord({'msg': f'record {i}', 'levelno': logging.INFO}))
+            time.sleep(0.05)  # Lets the listener take the first record and block on it
+
+        closer = threading.Thread(target=handler.close)
+        closer.start()
+        release.set()
+        closer.join(5)
+        self.assertFalse(closer.is_alive())
+        self.assertIsNone(handler.listener._thread)
+        self.assertIn('record 1', self.stream.getvalue())
@@ -12,16 +12,25 @@ urlpatterns = [
     path('api/user/profile/', views.fetch_user_profile, name='profile'),
     path('api/user/profile-update/', views.update_user_profile, name='update-profile'),
     path('api/auctions/', views.get_auctions, name='get_auctions'),
+    path('api/auctions/search/', views.search_auctions, name='search_auctions'),
     path('api/auctions/<str:auction_id>/', views.get_auction_by_id, name='get_auction_by_id'),
     path('api/auctions/<str:auction_id>/register/', views.register_user_for_auction, name='register-user'),
+    path('api/auctions/<str:auction_id>/unregister/', views.unregister_user_from_auction, name='unregister-user'),
+    path('api/auctions/<str:auction_id>/registration/', views.get_registration_status, name='registration-status'),
+    path('api/auctions/<str:auction_id>/registrants/', views.get_auction_registrants, name='auction-registrants'),
+    path('api/categories/', views.get_categories, name='categories'),
+    path('api/hs-codes/', views.suggest_hs_codes, name='hs-codes'),
     path('api/list-product/', views.list_product, name='list_product'),
     path('api/dashboard/', views.dashboard, name='dashboard'),
     path('api/auctions_message/', views.get_auctions_message, name='get_auctions_message'),
     path('api/messages/send/', views.send_message, name='send_message'),
     path('api/messages/<str:auction_id>/', views.get_messages, name='get_messages'),
+    path('api/inbox/', views.get_inbox, name='get_inbox'),
+    path('api/inbox/mark-read/', views.mark_conversation_read, name='mark_conversation_read'),
     path('api/bids/create/', views.create_bid, name='create_bid'),
     path('api/bids/update/<str:bid_id>/', views.update_bid, name='update_bid'),
     path('api/bids/delete/<str:bid_id>/', views.delete_bid, name='delete_bid'),
+    path('metrics', views.metrics_view, name='metrics'),
 
     # WebSocket URL for bidding
     re_path(r'ws/bids/(?P<auction_id>\d+)/$', consumers.BidConsumer.as_asgi()),
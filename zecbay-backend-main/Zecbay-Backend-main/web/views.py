@@ -1,9 +1,15 @@
 import bcrypt
+import hmac
 import random
 import string
 import json
-from .models                        import User, Auction, Bids, Message
-from mongoengine                    import DoesNotExist, ValidationError
+import logging
+from functools                      import wraps
+from .models                        import User, Auction, Bids, Message, AUCTION_DURATION, as_utc
+from .                              import chat, hscodes, inbox, metrics, registrations, search, streaming, taxonomy, writes
+from .cache                         import cached_json_view, invalidate_auction, response_cache, auction_tag, messages_tag, LISTING_TAG, USERS_TAG
+from .streaming                     import StreamingJsonResponse, wants_stream
+from mongoengine                    import DoesNotExist, ValidationError, Q
 from bson                           import ObjectId
 from django.views.decorators.csrf   import csrf_exempt
 from django.contrib.auth.decorators import login_required
@@ -14,10 +20,14 @@ from rest_framework.decorators      import api_view
 from django.core.mail               import send_mail
 from django.conf                    import settings
 from django.shortcuts               import get_object_or_404
-from django.http                    import JsonResponse
+from django.http                    import JsonResponse, HttpResponse
+from django.utils.cache             import get_conditional_response
+from django.utils.http              import quote_etag
 from datetime                       import datetime
 from pytz                           import timezone
 
+log = logging.getLogger(__name__)
+
 # Define the IST timezone for consistent timestamps
 def get_ist_time():
     """ Helper function to get the current IST time """
@@ -26,6 +36,9 @@ def get_ist_time():
     IST = pytz.timezone('Asia/Kolkata')
     return datetime.now(IST)
 
+# Largest page get_messages will return for ?limit=
+MESSAGES_MAX_PAGE_SIZE = 200
+
 # Temporary in-memory storage for OTP, verification status, and business details
 temp_data = {}
 
@@ -211,7 +224,7 @@ def signup(request):
         )
 
         # Save the user to the database
-        user.save()
+        writes.save(user)
 
         # Clear temp data after successful registration
         del temp_data[email]
@@ -364,7 +377,7 @@ def fetch_user_profile(request):
         return JsonResponse(user_profile, status=200)
 
     except Exception as error:
-        print("Error fetching user profile:", error)
+        log.exception("Error fetching user profile")
         return JsonResponse({'message': 'Internal server error.'}, status=500)
 
 # API endpoint to update user profile
@@ -418,8 +431,8 @@ def update_user_profile(request):
                 user.pan_number = business_details.get('pan_number', '')
                 user.iec = business_details.get('iec', '')
 
-            # Save the updated user
-            user.save()
+            # Save the updated user (only the fields that actually changed)
+            writes.save(user)
 
             # Prepare the updated user data to return
             updated_user_data = {
@@ -444,66 +457,212 @@ def update_user_profile(request):
             return JsonResponse({'message': 'User not found.'}, status=404)
 
         except Exception as error:
-            print("Error updating user profile:", error)
+            log.exception("Error updating user profile")
             return JsonResponse({'message': 'Internal server error.'}, status=500)
 
     return JsonResponse({'message': 'Invalid request method'}, status=400)
 
+# Auction payloads carry a fixed ends_at instead of a ticking countdown, so they
+# only change on writes or when an auction closes; both bump the tag versions
+# that the response cache and VersionedETagMiddleware key on
+AUCTION_CACHE_TTL = 60
+REGISTRANTS_PAGE_SIZE = 50
+REGISTRANTS_MAX_PAGE_SIZE = 500
+
+def utc_isoformat(value):
+    return as_utc(value).isoformat().replace('+00:00', 'Z')
+
+def legacy_time_left(request):
+    """ Whether to include the ticking time_left string for older clients """
+    if request.GET.get('legacy_time_left') in ('1', 'true'):
+        return True
+    return getattr(settings, 'AUCTION_LEGACY_TIME_LEFT', False)
+
+def with_server_time(view_func):
+    """ Adds X-Server-Time so clients can count down to ends_at without trusting their own clock """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        response = view_func(request, *args, **kwargs)
+        response['X-Server-Time'] = utc_isoformat(datetime.utcnow())
+        return response
+    return _wrapped_view
+
+class CloseTracker:
+    """ Remembers the earliest end among running auctions seen while iterating a cursor """
+
+    def __init__(self, now):
+        self.now = now
+        self.next_end = None
+
+    def see(self, auction):
+        ends_at = auction.get_ends_at()
+        if ends_at > self.now and (self.next_end is None or ends_at < self.next_end):
+            self.next_end = ends_at
+
+    def schedule(self, tag):
+        # The payload changes when that auction closes, without any write
+        if self.next_end is not None:
+            response_cache.schedule_invalidation(tag, self.next_end.timestamp())
+
+def listing_queryset(request):
+    """ All auctions; a streamed listing reads them in batches without caching the documents """
+    auctions = Auction.objects.all()
+    if wants_stream(request):
+        auctions = auctions.no_cache().batch_size(streaming.get_config()['BATCH_SIZE'])
+    return auctions
+
+def stream_or_bypass(request):
+    return legacy_time_left(request) or wants_stream(request)
+
+def active_auction_summaries(auctions, tracker, legacy):
+    """ Listing entries for the auctions in `auctions` that are still running """
+    for auction in auctions:
+        tracker.see(auction)
+
+        # Only include auctions that are still active
+        if auction.is_ended(tracker.now):
+            continue
+
+        try:
+            user = User.objects.get(pk=auction.user.id)  # Fetch the User using the ObjectId
+            created_by = user.username  # Access the username of the user
+        except DoesNotExist:
+            created_by = "Unknown"
+
+        # Number of bids in the auction
+        bid_count = len(auction.bids)
+        exporter_ids = []
+
+        for bid in auction.bids:
+            try:
+                bid_obj = Bids.objects.get(id=bid.id)
+                exporter_ids.append(str(bid_obj.exporterId.id))
+            except Bids.DoesNotExist:
+                continue
+
+        # Number of registrations in the auction (denormalized counter)
+        register_count = auction.register_count or 0
+
+        auction_data = {
+            "id": str(auction.pk),
+            "product_name": auction.product_name,
+            "category": auction.category,
+            "subcategory": auction.subcategory,
+            "initial_price": auction.initial_price,
+            "current_price": auction.current_price,
+            "unit": auction.unit,
+            "quantity": auction.quantity,
+            "round": auction.round,
+            "total_rounds": auction.total_rounds,
+            "ends_at": utc_isoformat(auction.get_ends_at()),
+            "bids_count": bid_count,
+            "bid_exporter_ids": exporter_ids,
+            "created_at": auction.created_at.isoformat(),
+            "created_by": created_by,
+            "register_count": register_count
+        }
+        if legacy:
+            auction_data["time_left"] = auction.get_time_left(tracker.now)
+        # Sampled per call site when DEBUG is on; costs one level check when it is off
+        log.debug("Listing auction", extra={'auction_id': auction_data["id"], 'ends_at': auction_data["ends_at"],
+                                            'bids_count': bid_count})
+        yield auction_data
+
 # Fetch all auctions
+@with_server_time
+@cached_json_view(lambda request: [LISTING_TAG, USERS_TAG], ttl=AUCTION_CACHE_TTL, bypass=stream_or_bypass)
 def get_auctions(request):
     try:
-        auctions = Auction.objects.all()  # Get all auctions from MongoDB
-        auctions_data = []
-        for auction in auctions:
-            try:
-                user = User.objects.get(pk=auction.user.id)  # Fetch the User using the ObjectId
-                created_by = user.username  # Access the username of the user
-            except DoesNotExist:
-                created_by = "Unknown"
+        auctions = listing_queryset(request)  # Get all auctions from MongoDB
+        tracker = CloseTracker(as_utc(datetime.utcnow()))
+        summaries = active_auction_summaries(auctions, tracker, legacy_time_left(request))
 
-            # Number of bids in the auction
-            bid_count = len(auction.bids)
-            exporter_ids = []
+        if wants_stream(request):
+            # Encoded item by item from the cursor; the close is scheduled once the cursor is exhausted
+            return StreamingJsonResponse(request, {"auctions": summaries},
+                                         on_complete=lambda: tracker.schedule(LISTING_TAG))
 
-            for bid in auction.bids:
-                try:
-                    bid_obj = Bids.objects.get(id=bid.id)
-                    exporter_ids.append(str(bid_obj.exporterId.id))
-                except Bids.DoesNotExist:
-                    continue
-
-            # Recalculate time left dynamically based on current time
-            time_left = auction.get_time_left()
-
-            # Number of registrations in the auction
-            register_count = len(auction.registered_users)
-
-            # Only include auctions that are still active
-            if time_left != "Auction ended":
-                auctions_data.append({
-                    "id": str(auction.pk),
-                    "product_name": auction.product_name,
-                    "category": auction.category,
-                    "subcategory": auction.subcategory,
-                    "initial_price": auction.initial_price,
-                    "current_price": auction.current_price,
-                    "unit": auction.unit,
-                    "quantity": auction.quantity,
-                    "round": auction.round,
-                    "total_rounds": auction.total_rounds,
-                    "time_left": time_left,
-                    "bids_count": bid_count,
-                    "bid_exporter_ids": exporter_ids,
-                    "created_at": auction.created_at.isoformat(),
-                    "created_by": created_by,
-                    "register_count": register_count
-                })
+        auctions_data = list(summaries)
+        tracker.schedule(LISTING_TAG)
         return JsonResponse({"auctions": auctions_data}, status=200)
 
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
+# Search auctions by text, taxonomy and price, with facet counts
+def search_auctions(request):
+    params = request.GET
+    try:
+        page = int(params.get('page', 1))
+        page_size = int(params.get('page_size', 20))
+        min_price = float(params['min_price']) if params.get('min_price') else None
+        max_price = float(params['max_price']) if params.get('max_price') else None
+    except ValueError:
+        return JsonResponse({'error': 'page, page_size, min_price and max_price must be numbers'}, status=400)
+
+    category = params.get('category') or None
+    subcategory = params.get('subcategory') or None
+    if category and not taxonomy.is_category(category):
+        return JsonResponse({'error': f"Unknown category: {category}"}, status=400)
+    if subcategory and not (taxonomy.is_subcategory(category, subcategory) if category else
+                            subcategory in taxonomy.SUBCATEGORIES):
+        return JsonResponse({'error': f"Unknown subcategory: {subcategory}"}, status=400)
+
+    try:
+        result = search.search(
+            params.get('q', ''),
+            page=page,
+            page_size=page_size,
+            category=category,
+            subcategory=subcategory,
+            min_price=min_price,
+            max_price=max_price,
+            active=params.get('active') in ('1', 'true'),
+        )
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    return JsonResponse(result, status=200)
+
+# Prometheus scrape of this process's request and MongoDB histograms
+# Requires "Authorization: Bearer <METRICS TOKEN>"; open only in DEBUG when no token is set
+def metrics_view(request):
+    token = metrics.get_config()['TOKEN']
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8')):
+            return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer'})
+    elif not settings.DEBUG:
+        return HttpResponse(status=404)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Product taxonomy; it only changes with a deploy, so clients may cache it for a day
+def get_categories(request):
+    not_modified = get_conditional_response(request, etag=taxonomy.CATEGORIES_ETAG)
+    if not_modified is not None:
+        return not_modified
+    response = HttpResponse(taxonomy.CATEGORIES_JSON, content_type='application/json')
+    response['ETag'] = taxonomy.CATEGORIES_ETAG
+    response['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+# HS code autocomplete: ?q=5208 (code prefix) or ?q=cotton fabric (description words)
+def suggest_hs_codes(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
+    if not query:
+        return JsonResponse({'results': []}, status=200)
+
+    index = hscodes.get_index()
+    response = JsonResponse({'results': [entry.as_dict() for entry in index.suggest(query, limit)]}, status=200)
+    response['Cache-Control'] = 'public, max-age=3600'
+    return response
+
 # Fetch auction by ID
+@with_server_time
+@cached_json_view(lambda request, auction_id: [auction_tag(auction_id), USERS_TAG], ttl=AUCTION_CACHE_TTL, bypass=legacy_time_left)
 def get_auction_by_id(request, auction_id):
     try:
         auction = Auction.objects.get(id=auction_id)
@@ -515,12 +674,11 @@ def get_auction_by_id(request, auction_id):
         except DoesNotExist:
             created_by = "Unknown"  # In case the user does not exist
 
-        # Recalculate time left dynamically based on current time
-        time_left = auction.get_time_left()
+        now = as_utc(datetime.utcnow())
 
         # Fetch the bids associated with the auction
+        # (current_price and winner are maintained on the write path, so reads never write)
         bid_data = []
-        lowest_bid_price = auction.current_price
         for bid in auction.bids:
             # Fetch each individual bid from the Bids collection using its ID
             try:
@@ -537,22 +695,9 @@ def get_auction_by_id(request, auction_id):
                     "created_at": bid_obj.createdAt.isoformat(),  # Convert datetime to ISO format string
                 })
 
-                # Update lowest bid price
-                if price_float is not None and price_float < lowest_bid_price:
-                    lowest_bid_price = price_float
-
             except Bids.DoesNotExist:
                 continue
 
-        # If there are bids, update the current price of the auction to the lowest bid price
-        if bid_data:
-            auction.current_price = lowest_bid_price
-
-        # If the auction has ended, update the time_left and mark the auction as ended
-        if time_left == "Auction ended":
-            auction.time_left = "Auction ended"
-            auction.save()  # Save the auction with the updated status
-
         # Fetch the winner's bid if the auction has ended
         winner_data = None
         if auction.winner:
@@ -565,8 +710,10 @@ def get_auction_by_id(request, auction_id):
             except Bids.DoesNotExist:
                 winner_data = None  # If no winner is found
 
-        # Number of registrations in the auction
-        register_count = len(auction.registered_users)
+        # Number of registrations in the auction, and the first page of registrants
+        # (the rest via /registrants/; usernames are stored on the registration)
+        register_count = auction.register_count or 0
+        registrants, _ = registrations.list_registrants(auction.pk, limit=REGISTRANTS_PAGE_SIZE)
 
         # Prepare the auction data for response
         auction_data = {
@@ -581,18 +728,19 @@ def get_auction_by_id(request, auction_id):
             "quantity": auction.quantity,
             "round": auction.round,
             "total_rounds": auction.total_rounds,
-            "time_left": time_left,
+            "ends_at": utc_isoformat(auction.get_ends_at()),
             "bids": bid_data,
             "created_by": created_by,
             "winner": winner_data,
-            "registered_users": [user.username for user in auction.registered_users],
+            "registered_users": [registrant['username'] for registrant in registrants],
             "register_count": register_count,
         }
+        if legacy_time_left(request):
+            auction_data["time_left"] = auction.get_time_left(now)
 
-        # Save auction data with the updated current_price if necessary
-        if bid_data:
-            auction.save()  # Save the auction with the updated current_price if bids were placed
-
+        tracker = CloseTracker(now)
+        tracker.see(auction)
+        tracker.schedule(auction_tag(auction.pk))
         return JsonResponse({
             "auction": auction_data,
         }, status=200)
@@ -607,27 +755,26 @@ def get_auction_by_id(request, auction_id):
 @csrf_exempt
 def register_user_for_auction(request, auction_id):
     if request.method == 'POST':
-        try:
-            auction = Auction.objects.get(id=auction_id)
-        except Auction.DoesNotExist:
+        if chat.resolve_auction(auction_id) is None:
             return JsonResponse({"error": "Auction not found"}, status=404)
 
         try:
             body = json.loads(request.body)
             user_id = body.get("user_id")
 
-            print(f"Received user_id: {user_id}")
+            log.debug("Registration request", extra={'auction_id': auction_id, 'user_id': user_id})
 
             if not user_id:
                 return JsonResponse({"error": "User ID is required"}, status=400)
 
             # Get user object from username
             try:
-                user = User.objects.get(userid=user_id)
+                user = User.objects.only('userid', 'username').get(userid=user_id)
             except User.DoesNotExist:
                 return JsonResponse({"error": "User not found"}, status=404)
 
-            if auction.register_user(user):
+            # One insert against the unique (auction, user) index
+            if registrations.register(auction_id, user):
                 return JsonResponse({"message": "You have successfully registered for this auction."}, status=200)
             else:
                 return JsonResponse({"message": "You are already registered for this auction."}, status=400)
@@ -636,6 +783,50 @@ def register_user_for_auction(request, auction_id):
 
     return JsonResponse({"error": "Invalid request method"}, status=405)
 
+# API endpoint to unregister user from auction
+@api_view(['POST'])
+@csrf_exempt
+def unregister_user_from_auction(request, auction_id):
+    user_id = request.data.get("user_id")
+    if not user_id:
+        return JsonResponse({"error": "User ID is required"}, status=400)
+
+    try:
+        removed = registrations.unregister(auction_id, int(user_id))
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    if not removed:
+        return JsonResponse({"message": "You are not registered for this auction."}, status=404)
+    return JsonResponse({"message": "You have been unregistered from this auction."}, status=200)
+
+# API endpoint to check whether a user is registered for an auction
+def get_registration_status(request, auction_id):
+    user_id = request.GET.get("user_id")
+    if not user_id:
+        return JsonResponse({"error": "User ID is required"}, status=400)
+
+    try:
+        registered = registrations.is_registered(auction_id, int(user_id))
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"registered": registered}, status=200)
+
+# API endpoint to list an auction's registrants, one page at a time
+def get_auction_registrants(request, auction_id):
+    try:
+        limit = min(int(request.GET.get('limit', REGISTRANTS_PAGE_SIZE)), REGISTRANTS_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    if limit < 1:
+        return JsonResponse({'error': 'limit must be positive'}, status=400)
+
+    try:
+        registrants, next_cursor = registrations.list_registrants(auction_id, limit=limit, after=request.GET.get('after'))
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"registrants": registrants, "next": next_cursor}, status=200)
+
 def serialize_objectid(obj):
     """ Helper function to convert ObjectId to string """
     if isinstance(obj, ObjectId):
@@ -652,7 +843,7 @@ def create_bid(request):
     """ View to create a new bid """
     if request.method == 'POST':
         try:
-            print(f"Request data: {request.data}")
+            log.debug("Create bid request", extra={'fields': sorted(request.data)})
             auction_id = request.data.get('auction_id')
             exporter_id = request.data.get('exporter_id')
             price_per_quantity = request.data.get('price_per_quantity')
@@ -676,39 +867,23 @@ def create_bid(request):
             except User.DoesNotExist:
                 return Response({"error": "Exporter not found."}, status=status.HTTP_404_NOT_FOUND)
 
-            # Create the bid object
-            bid = Bids(
-                exporterId=exporter,
-                auctionID=auction,
-                pricePerQuantity=price_per_quantity,  # Set price per quantity
-                bidsMade=[f'{price_per_quantity} at {get_ist_time().isoformat()}'],
-                createdAt=get_ist_time()
-            )
-            bid.save()
-
-            auction.bids.append(bid)
-            auction.save()
-
-            # After creating a new bid, check for the auction winner
-            if auction.bids:
-                winner_bid = auction.get_reverse_auction_winner()
-                if winner_bid:
-                    auction.winner = winner_bid
-                    auction.save()
-                    return Response({
-                        'message': 'Bid created successfully',
-                        'bid': serialize_objectid(bid.to_mongo()),
-                        'winner_bid': serialize_objectid(winner_bid.to_mongo()),
-                        'auction_winner': serialize_objectid(auction.winner.to_mongo())
-                    }, status=status.HTTP_201_CREATED)
+            # Save the bid, attach it to the auction and recompute the price and winner
+            bid = auction.place_bid(exporter, price_per_quantity, created_at=get_ist_time())
+            if auction.winner:
+                winner_bid = auction.winner
+                return Response({
+                    'message': 'Bid created successfully',
+                    'bid': serialize_objectid(bid.to_mongo()),
+                    'winner_bid': serialize_objectid(winner_bid.to_mongo()),
+                    'auction_winner': serialize_objectid(winner_bid.to_mongo())
+                }, status=status.HTTP_201_CREATED)
             return Response({
                 'message': 'Bid created successfully',
                 'bid': serialize_objectid(bid.to_mongo())
             }, status=status.HTTP_201_CREATED)
 
         except Exception as e:
-            # Log or print error details for debugging
-            print(f"Error occurred: {str(e)}")
+            log.exception("Error creating bid")
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['POST'])
@@ -725,24 +900,24 @@ def update_bid(request, bid_id):
             except ValueError:
                 return Response({"error": "Invalid bid values."}, status=status.HTTP_400_BAD_REQUEST)
 
-            if bid.auctionID.time_left == "Auction ended":
+            auction = bid.auctionID  # Get the related auction
+            if auction.is_ended():
                 return JsonResponse({'error': 'Cannot update bid. Auction has ended.'}, status=400)
 
+            # Price and history go out together in one update_one
             bid.pricePerQuantity = price_per_quantity
-            bid.add_bid_history(price_per_quantity)  # Add the new bid to history
-            bid.save()
+            bid.add_bid_history(price_per_quantity, commit=False)  # Add the new bid to history
+            writes.save(bid)
 
-            # After updating the bid, check for the auction winner
-            auction = bid.auctionID  # Get the related auction
-            winner_bid = auction.get_reverse_auction_winner()
-            if winner_bid:
-                auction.winner = winner_bid
-                auction.save()
+            # After updating the bid, recompute the auction price and winner (writes only on change)
+            auction.refresh_standing()
+            if auction.winner:
+                winner_bid = auction.winner
                 return JsonResponse({
                     'message': 'Bid updated successfully',
                     'bid': serialize_objectid(bid.to_mongo()),
                     'winner_bid': serialize_objectid(winner_bid.to_mongo()),
-                    'auction_winner': serialize_objectid(auction.winner.to_mongo())
+                    'auction_winner': serialize_objectid(winner_bid.to_mongo())
                 })
             else:
                 return JsonResponse({'message': 'Bid updated successfully', 'bid': serialize_objectid(bid.to_mongo())})
@@ -756,36 +931,23 @@ def delete_bid(request, bid_id):
     if request.method == 'POST':
         try:
             bid = Bids.objects.get(id=bid_id)
+            auction = bid.auctionID
 
-            if bid.auctionID.time_left == "Auction ended":
+            if auction.is_ended():
                 return JsonResponse({'error': 'Cannot delete bid. Auction has ended.'}, status=400)
 
-            auction = bid.auctionID
-
             # Delete the bid
             bid.delete()
 
-            # Recalculate current price and winner after deletion
-            if auction.bids:
-                remaining_bids = Bids.objects(auctionID=auction)
-
-                if remaining_bids:
-                    # Find the lowest priced bid (reverse auction logic)
-                    winner_bid = min(remaining_bids, key=lambda b: b.pricePerQuantity)
-                    auction.current_price = winner_bid.pricePerQuantity
-                    auction.winner = winner_bid
-                else:
-                    # No bids left, reset to initial values
-                    auction.current_price = auction.initial_price
-                    auction.winner = None
-            else:
-                auction.current_price = auction.initial_price
-                auction.winner = None
-
-            # Update auction.bids list (remove deleted bid)
-            auction.bids = [b for b in auction.bids if str(b.id) != str(bid_id)]
+            # Remove it from auction.bids with a partial update. A queryset update sends no
+            # signal, and a read between the delete and the pull may have cached the bid again
+            Auction.objects(id=auction.id).update_one(pull__bids=bid.pk, inc__version=1)
+            writes.record({'_id': auction.id}, {'$pull': {'bids': bid.pk}, '$inc': {'version': 1}})
+            invalidate_auction(auction.id)
+            auction.reload('version', 'current_price', 'winner')
 
-            auction.save()
+            # Recalculate current price and winner after deletion (resets to initial price when no bids remain)
+            auction.refresh_standing()
 
             return JsonResponse({'message': 'Bid deleted successfully'})
         except Bids.DoesNotExist:
@@ -813,6 +975,14 @@ def list_product(request):
             if not username:
                 return JsonResponse({'error': 'Username is required.'}, status=400)
 
+            # Reject unknown categories and HS codes before touching the database
+            taxonomy.validate(category, subcategory)
+            if hs_code:
+                try:
+                    hs_code = hscodes.validate(hs_code)
+                except ValueError as e:
+                    return JsonResponse({'error': str(e)}, status=400)
+
             # Retrieve the user based on the provided username (MongoDB)
             try:
                 user = User.objects.get(username=username)  # Look up the user by their username
@@ -820,6 +990,7 @@ def list_product(request):
                 return JsonResponse({'error': 'User does not exist.'}, status=404)
 
             # Create the Auction product
+            created_at = get_ist_time()
             auction = Auction(
                 product_name=product_name,
                 category=category,
@@ -835,9 +1006,10 @@ def list_product(request):
                 time_left="24 hours",
                 bids=[],  # No bids yet
                 user=user,
-                created_at=get_ist_time()
+                created_at=created_at,
+                ends_at=as_utc(created_at) + AUCTION_DURATION,
             )
-            auction.save()
+            writes.save(auction)
 
             # Respond with success
             return JsonResponse({'message': 'Auction created successfully!'}, status=201)
@@ -847,32 +1019,63 @@ def list_product(request):
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
-def get_auctions_message(request):
-    try:
-        auctions = Auction.objects.all()
-        completed_auctions_data = []
+def completed_auction_details(auctions, tracker):
+    """ Entries of get_auctions_message for the auctions in `auctions` that have ended """
+    for auction in auctions:
+        tracker.see(auction)
 
-        for auction in auctions:
-            # Skip if auction is still active
-            if auction.get_time_left() != "Auction ended":
-                continue
+        # Skip if auction is still active
+        if not auction.is_ended(tracker.now):
+            continue
+
+        # Get importer (auction creator) details
+        try:
+            importer = User.objects.get(pk=auction.user.id)
+            created_by = importer.username
+            importer_details = {
+                "id": str(importer.pk),
+                "username": importer.username,
+                "full_name": importer.name,
+                "email": importer.email,
+                "phone_number": importer.phone,
+                "iec": importer.iec,
+            }
+        except ObjectDoesNotExist:
+            created_by = "Unknown"
+            importer_details = {
+                "id": str(auction.user.id),
+                "username": "unknown",
+                "full_name": "",
+                "email": "",
+                "phone_number": "",
+                "iec": "",
+            }
 
-            # Get importer (auction creator) details
+        # Get exporter (winner) details
+        winner_data = None
+        exporter_details = None
+        if auction.winner:
             try:
-                importer = User.objects.get(pk=auction.user.id)
-                created_by = importer.username
-                importer_details = {
-                    "id": str(importer.pk),
-                    "username": importer.username,
-                    "full_name": importer.name,
-                    "email": importer.email,
-                    "phone_number": importer.phone,
-                    "iec": importer.iec,
+                winner_bid = Bids.objects.get(id=auction.winner.id)
+                exporter = User.objects.get(pk=winner_bid.exporterId.id)
+                winner_data = {
+                    "id": str(winner_bid.pk),
+                    "exporter_id": str(exporter.id),
+                    "price": winner_bid.pricePerQuantity,
+                    "created_at": winner_bid.createdAt.isoformat(),
                 }
-            except ObjectDoesNotExist:
-                created_by = "Unknown"
-                importer_details = {
-                    "id": str(auction.user.id),
+                exporter_details = {
+                    "id": str(exporter.pk),
+                    "username": exporter.username,
+                    "full_name": exporter.name,
+                    "email": exporter.email,
+                    "phone_number": exporter.phone,
+                    "iec": exporter.iec,
+                }
+            except (Bids.DoesNotExist, User.DoesNotExist):
+                winner_data = None
+                exporter_details = {
+                    "id": str(auction.winner.id),
                     "username": "unknown",
                     "full_name": "",
                     "email": "",
@@ -880,64 +1083,47 @@ def get_auctions_message(request):
                     "iec": "",
                 }
 
-            # Get exporter (winner) details
-            winner_data = None
-            exporter_details = None
-            if auction.winner:
-                try:
-                    winner_bid = Bids.objects.get(id=auction.winner.id)
-                    exporter = User.objects.get(pk=winner_bid.exporterId.id)
-                    winner_data = {
-                        "id": str(winner_bid.pk),
-                        "exporter_id": str(exporter.id),
-                        "price": winner_bid.pricePerQuantity,
-                        "created_at": winner_bid.createdAt.isoformat(),
-                    }
-                    exporter_details = {
-                        "id": str(exporter.pk),
-                        "username": exporter.username,
-                        "full_name": exporter.name,
-                        "email": exporter.email,
-                        "phone_number": exporter.phone,
-                        "iec": exporter.iec,
-                    }
-                except (Bids.DoesNotExist, User.DoesNotExist):
-                    winner_data = None
-                    exporter_details = {
-                        "id": str(auction.winner.id),
-                        "username": "unknown",
-                        "full_name": "",
-                        "email": "",
-                        "phone_number": "",
-                        "iec": "",
-                    }
+        # Assemble full auction data
+        auction_data = {
+            "id": str(auction.pk),
+            "product_name": auction.product_name,
+            "category": auction.category,
+            "subcategory": auction.subcategory,
+            "description": auction.description,
+            "initial_price": auction.initial_price,
+            "final_price": auction.current_price,
+            "unit": auction.unit,
+            "quantity": auction.quantity,
+            "round": auction.round,
+            "total_rounds": auction.total_rounds,
+            "created_at": auction.created_at.isoformat(),
+            "ends_at": utc_isoformat(auction.get_ends_at()),
+            "created_by": created_by,
+            "importer_details": importer_details,
+            "winner_bid": winner_data,
+            "exporter_details": exporter_details
+        }
 
-            # Assemble full auction data
-            auction_data = {
-                "id": str(auction.pk),
-                "product_name": auction.product_name,
-                "category": auction.category,
-                "subcategory": auction.subcategory,
-                "description": auction.description,
-                "initial_price": auction.initial_price,
-                "final_price": auction.current_price,
-                "unit": auction.unit,
-                "quantity": auction.quantity,
-                "round": auction.round,
-                "total_rounds": auction.total_rounds,
-                "created_at": auction.created_at.isoformat(),
-                "created_by": created_by,
-                "importer_details": importer_details,
-                "winner_bid": winner_data,
-                "exporter_details": exporter_details
-            }
+        yield auction_data
 
-            completed_auctions_data.append(auction_data)
+@with_server_time
+@cached_json_view(lambda request: [LISTING_TAG, USERS_TAG], ttl=AUCTION_CACHE_TTL, bypass=stream_or_bypass)
+def get_auctions_message(request):
+    try:
+        auctions = listing_queryset(request)
+        tracker = CloseTracker(as_utc(datetime.utcnow()))
+        completed = completed_auction_details(auctions, tracker)
 
+        if wants_stream(request):
+            return StreamingJsonResponse(request, {"completed_auctions": completed},
+                                         on_complete=lambda: tracker.schedule(LISTING_TAG))
+
+        completed_auctions_data = list(completed)
+        tracker.schedule(LISTING_TAG)
         return JsonResponse({"completed_auctions": completed_auctions_data}, status=200)
 
     except Exception as e:
-        print("Error fetching completed auctions:", e)  # Console print for debugging
+        log.exception("Error fetching completed auctions")
         return JsonResponse({"error": str(e)}, status=500)
 
 @api_view(['POST'])
@@ -951,25 +1137,25 @@ def send_message(request):
             receiver_username = data['receiver_username']
             message_content = data['message']
 
-            try:
-                auction = Auction.objects.get(id=auction_id)
-            except Auction.DoesNotExist:
+            # Cached existence check instead of fetching the auction per message
+            auction = chat.resolve_auction(auction_id)
+            if auction is None:
                 return JsonResponse({'error': 'Auction not found'}, status=404)
 
-            # Create a new message
-            message = Message(
-                auction=auction,
-                sender_username=sender_username,
-                receiver_username=receiver_username,
-                message=message_content,
+            # Buffer the message and wait until its batch has been committed
+            message = chat.send(
+                auction,
+                sender_username,
+                receiver_username,
+                message_content,
                 timestamp=get_ist_time()  # Ensure the timestamp is in IST
             )
-            message.save()
 
             # Return the newly created message
             return JsonResponse({
                 'status': 'success',
                 'message': {
+                    'message_id': str(message.id),
                     'sender': message.sender_username,
                     'receiver': message.receiver_username,
                     'message': message.message,
@@ -984,32 +1170,178 @@ def send_message(request):
 
     return JsonResponse({'error': 'Invalid method'}, status=405)
 
+def serialize_message(auction_id, message):
+    """ JSON shape of a chat message returned by get_messages """
+    return {
+        'auction_id': auction_id,
+        'message_id': str(message.id),
+        'sender': message.sender_username,
+        'receiver': message.receiver_username,
+        'message': message.message,
+        'timestamp': message.timestamp.isoformat()
+    }
+
+def keyset_after(message):
+    """ Filter for messages ordered after `message` by (timestamp, _id) """
+    return Q(timestamp__gt=message.timestamp) | Q(timestamp=message.timestamp, id__gt=message.id)
+
+def keyset_before(message):
+    """ Filter for messages ordered before `message` by (timestamp, _id) """
+    return Q(timestamp__lt=message.timestamp) | Q(timestamp=message.timestamp, id__lt=message.id)
+
 @api_view(['GET'])
 def get_messages(request, auction_id):
-    # Retrieve all messages for a specific auction
-    try:
-        auction = Auction.objects.get(id=auction_id)
-    except Auction.DoesNotExist:
+    """
+    Chat history for an auction, ordered by (timestamp, _id).
+
+    ?limit=N                 newest N messages
+    ?limit=N&before=<id>     N messages older than <id> (page backwards)
+    ?since=<id>[&limit=N]    only messages newer than <id> (incremental polling)
+    ?stream=1                stream the full history instead of buffering it
+
+    Without parameters the full history is returned, as before. Responses carry
+    an ETag tied to the latest message so unchanged polls get a 304. There is no
+    Last-Modified: it has one-second resolution, so an If-Modified-Since poll
+    would miss messages written in the same second as the last one it saw.
+    """
+    auction = chat.resolve_auction(auction_id)
+    if auction is None:
         return JsonResponse({'error': 'Auction not found'}, status=404)
 
-    # Fetch messages related to the auction, ordered by timestamp
-    messages = Message.objects.filter(auction=auction).order_by('timestamp')
-
-    # Serialize messages to JSON format (without using serializers)
-    messages_list = [
-        {
-            'auction_id': str(auction.id),
-            'message_id': str(message.id),
-            'sender': message.sender_username,
-            'receiver': message.receiver_username,
-            'message': message.message,
-            'timestamp': message.timestamp.isoformat()
-        }
-        for message in messages
-    ]
+    thread = Message.objects(auction=auction)
+
+    # Latest message in the thread; a covered read on (auction, timestamp, _id)
+    latest = thread.order_by('-timestamp', '-id').only('id', 'timestamp').first()
+    etag = quote_etag(f"{auction}-{latest.id if latest else 'empty'}-{request.GET.urlencode()}")
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    # The ETag already pins the latest message and the query, so it doubles as the cache key
+    cache_key = f"get_messages:{etag}"
+    body = None if wants_stream(request) else response_cache.get(cache_key)
+    if body is not None:
+        response = HttpResponse(body, content_type='application/json')
+        response['X-Cache'] = 'HIT'
+    else:
+        versions = response_cache.tag_versions([messages_tag(auction)])
+        response = messages_page(request, auction, latest)
+        if response.status_code != 200:
+            return response
+        # Streamed bodies are never held in memory, so they bypass the response cache
+        if not response.streaming:
+            response_cache.set(cache_key, response.content, versions)
+
+    response['ETag'] = etag
+    return response
+
+def messages_page(request, auction, latest):
+    """ Builds the get_messages response body for the requested page """
+    thread = Message.objects(auction=auction)
+
+    try:
+        limit = request.GET.get('limit')
+        limit = min(int(limit), MESSAGES_MAX_PAGE_SIZE) if limit else None
+        if limit is not None and limit <= 0:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a positive integer'}, status=400)
+
+    since = request.GET.get('since')
+    before = request.GET.get('before')
+    has_more = False
+
+    try:
+        if since:
+            cursor = thread.filter(id=since).only('id', 'timestamp').first()
+            if cursor is None:
+                return JsonResponse({'error': 'Unknown message id in since'}, status=400)
+            query = thread.filter(keyset_after(cursor)).order_by('timestamp', 'id')
+            page = list(query.limit(limit + 1) if limit else query)
+            if limit and len(page) > limit:
+                page, has_more = page[:limit], True
+        else:
+            query = thread
+            if before:
+                cursor = thread.filter(id=before).only('id', 'timestamp').first()
+                if cursor is None:
+                    return JsonResponse({'error': 'Unknown message id in before'}, status=400)
+                query = thread.filter(keyset_before(cursor))
+
+            if limit:
+                # Read newest-first through the index, then return the page in chronological order
+                page = list(query.order_by('-timestamp', '-id').limit(limit + 1))
+                if len(page) > limit:
+                    page, has_more = page[:limit], True
+                page.reverse()
+            elif wants_stream(request):
+                # Full history, encoded straight from the cursor
+                cursor = query.order_by('timestamp', 'id').no_cache().batch_size(streaming.get_config()['BATCH_SIZE'])
+                return StreamingJsonResponse(request, {
+                    'messages': (serialize_message(str(auction), message) for message in cursor),
+                    'has_more': False,
+                    'latest_id': str(latest.id) if latest else None,
+                })
+            else:
+                page = list(query.order_by('timestamp', 'id'))
+    except ValidationError:
+        return JsonResponse({'error': 'Invalid message id'}, status=400)
+
+    auction_id = str(auction)
+    return JsonResponse({
+        'messages': [serialize_message(auction_id, message) for message in page],
+        'has_more': has_more,
+        'latest_id': str(latest.id) if latest else None,
+    }, status=200)
+
+# API endpoint to list a user's conversations (inbox)
+def get_inbox(request):
+    username = request.GET.get('username')
+    if not username:
+        return JsonResponse({'error': 'Username parameter missing'}, status=400)
 
-    return JsonResponse({'messages': messages_list}, status=200)
+    try:
+        limit = min(int(request.GET.get('limit', 50)), 200)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    if limit < 1:
+        return JsonResponse({'error': 'limit must be positive'}, status=400)
+
+    before = request.GET.get('before')
+    if before:
+        try:
+            before = datetime.fromisoformat(before)
+        except ValueError:
+            return JsonResponse({'error': 'before must be an ISO timestamp'}, status=400)
+
+    conversations = inbox.list_conversations(username, limit=limit, before=before or None)
+    return JsonResponse({
+        'conversations': conversations,
+        'unread_total': inbox.unread_total(username),
+    }, status=200)
 
+# API endpoint to mark a conversation as read
+@api_view(['POST'])
+@csrf_exempt
+def mark_conversation_read(request):
+    username = request.data.get('username')
+    auction_id = request.data.get('auction_id')
+    counterparty = request.data.get('counterparty_username')
+
+    if not username or not auction_id or not counterparty:
+        return JsonResponse({'error': 'username, auction_id and counterparty_username are required'}, status=400)
+
+    try:
+        found = inbox.mark_read(username, auction_id, counterparty)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if not found:
+        return JsonResponse({'error': 'Conversation not found'}, status=404)
+    return JsonResponse({'message': 'Conversation marked as read'}, status=200)
+
+@with_server_time
 def dashboard(request):
     # Get the username from the request query parameters
     username = request.GET.get('username')
@@ -1035,9 +1367,9 @@ def dashboard(request):
             auctions = Auction.objects(user=user)
 
             auction_data = []
+            legacy = legacy_time_left(request)
             if len(auctions) > 0:
                 for auction in auctions:
-                    time_left = auction.get_time_left()
                     bid_count = len(auction.bids)
 
                     # 🆕 Add winner bid details (if exists)
@@ -1050,7 +1382,7 @@ def dashboard(request):
                             "created_at": auction.winner.createdAt.isoformat()
                         }
 
-                    auction_data.append({
+                    auction_entry = {
                         "id": str(auction.id),
                         "product_name": auction.product_name,
                         "category": auction.category,
@@ -1061,10 +1393,13 @@ def dashboard(request):
                         "quantity": auction.quantity,
                         "round": auction.round,
                         "total_rounds": auction.total_rounds,
-                        "time_left": time_left,
+                        "ends_at": utc_isoformat(auction.get_ends_at()),
                         "bid_count": bid_count,
                         "winner_bid": winner_bid
-                    })
+                    }
+                    if legacy:
+                        auction_entry["time_left"] = auction.get_time_left()
+                    auction_data.append(auction_entry)
             else:
                 return JsonResponse({"success": False, "message": "No auctions found"})
 
@@ -1079,20 +1414,24 @@ def dashboard(request):
             # Get the bids related to the user
             bids = Bids.objects.filter(exporterId=user.userid)
             bid_data = []
+            legacy = legacy_time_left(request)
             if bids:
                 for bid in bids:
                     auction = Auction.objects.get(id=bid.auctionID.id)  # Fetch auction details using auctionID
                     winner_bid_id = auction.winner.id if auction.winner else None
-                    bid_data.append({
+                    bid_entry = {
                         "id": str(bid.id),
                         "auctionID": str(bid.auctionID),
                         "pricePerQuantity": bid.pricePerQuantity,
                         "auctionid": str(auction.id),
                         "category": auction.category,
                         "subcategory": auction.subcategory,
-                        "timeLeft": auction.get_time_left(),
+                        "endsAt": utc_isoformat(auction.get_ends_at()),
                         "winner_bid_id": str(winner_bid_id),
-                    })
+                    }
+                    if legacy:
+                        bid_entry["timeLeft"] = auction.get_time_left()
+                    bid_data.append(bid_entry)
             else:
                 return JsonResponse({"success": False, "message": "No bids found"})
 
@@ -0,0 +1,125 @@
+# web/writes.py
+from contextvars    import ContextVar
+import bson
+from mongoengine    import signals
+
+class WriteStats:
+    """ Database round trips and BSON bytes sent for document writes """
+
+    def __init__(self):
+        self.writes = 0
+        self.bytes = 0
+        self.collapsed = 0  # save() calls that had nothing left to write
+
+    def as_dict(self):
+        return {'writes': self.writes, 'bytes': self.bytes, 'collapsed': self.collapsed}
+
+
+# Stats of the request (or block) currently being tracked, if any
+_stats = ContextVar('write_stats', default=None)
+
+def begin():
+    """ Starts counting writes; returns a token for end() """
+    return _stats.set(WriteStats())
+
+def end(token):
+    stats = _stats.get()
+    _stats.reset(token)
+    return stats
+
+def current_stats():
+    return _stats.get()
+
+def record(*payload):
+    """ Counts one round trip carrying the given documents (filter, update, ...) """
+    stats = _stats.get()
+    if stats is not None:
+        stats.writes += 1
+        stats.bytes += sum(len(bson.encode(part)) for part in payload)
+
+
+def _staged(doc):
+    # Array and counter operations waiting for the next save(doc)
+    ops = doc.__dict__.get('_staged_ops')
+    if ops is None:
+        ops = doc.__dict__['_staged_ops'] = {'$push': {}, '$addToSet': {}, '$inc': {}}
+    return ops
+
+def _items(doc, field):
+    items = doc._data.get(field)
+    if items is None:
+        items = doc._data[field] = []
+    return items
+
+def push(doc, field, value):
+    """ Appends `value` to a list field, written as $push on the next save(doc) """
+    list.append(_items(doc, field), value)
+    db_field = doc._fields[field].db_field
+    _staged(doc)['$push'].setdefault(db_field, []).append(doc._fields[field].field.to_mongo(value))
+
+def add_to_set(doc, field, value):
+    """
+    Adds `value` to a list field unless it is already there, written as
+    $addToSet on the next save(doc). Returns False if it was already present.
+    """
+    item_field = doc._fields[field].field
+    stored = item_field.to_mongo(value)
+    for item in _items(doc, field):
+        if item_field.to_mongo(getattr(item, 'id', item)) == stored:
+            return False
+    list.append(_items(doc, field), value)
+    _staged(doc)['$addToSet'].setdefault(doc._fields[field].db_field, []).append(stored)
+    return True
+
+def inc(doc, field, amount=1):
+    """ Increments a numeric field, written as $inc on the next save(doc) """
+    doc._data[field] = (doc._data.get(field) or 0) + amount
+    counters = _staged(doc)['$inc']
+    db_field = doc._fields[field].db_field
+    counters[db_field] = counters.get(db_field, 0) + amount
+
+def save(doc):
+    """
+    Writes only what changed on `doc` since it was loaded or last saved: dirty
+    fields as $set/$unset plus staged $push/$addToSet/$inc, in one update_one.
+    New documents are inserted with a regular save(). Returns True if a write
+    was issued; a save with nothing left to write is a no-op.
+    """
+    if doc.pk is None or doc._created:
+        doc.save()
+        record(doc.to_mongo())
+        doc.__dict__.pop('_staged_ops', None)
+        return True
+
+    # Validate first: clean() may fill in fields (e.g. Auction.ends_at) that must be written too
+    doc.validate()
+    updates, removals = doc._delta()
+    update = {}
+    if updates:
+        update['$set'] = updates
+    if removals:
+        update['$unset'] = removals
+
+    ops = doc.__dict__.pop('_staged_ops', None) or {}
+    for op in ('$push', '$addToSet'):
+        # A list that was also reassigned is already $set in full
+        staged = {field: values for field, values in ops.get(op, {}).items() if field not in updates}
+        if staged:
+            update[op] = {field: {'$each': values} for field, values in staged.items()}
+    if ops.get('$inc'):
+        update['$inc'] = ops['$inc']
+
+    if not update:
+        stats = _stats.get()
+        if stats is not None:
+            stats.collapsed += 1
+        return False
+
+    query = {'_id': doc.pk}
+    doc._get_collection().update_one(query, update)
+    record(query, update)
+    doc._clear_changed_fields()
+
+    # Keep post_save receivers (e.g. response cache invalidation) in the loop
+    signals.post_save.send(doc.__class__, document=doc, created=False)
+    return True
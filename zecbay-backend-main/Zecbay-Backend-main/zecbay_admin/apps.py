@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class ZecbayAdminConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'zecbay_admin'
+
+    def ready(self):
+        from mongoengine import signals
+        from .auth import roster
+        from .models import AdminUser
+
+        # Signed-in admins are checked against a cached roster; reload it when admins change
+        def admins_changed(sender, document, **kwargs):
+            roster.invalidate()
+
+        signals.post_save.connect(admins_changed, sender=AdminUser, weak=False)
+        signals.post_delete.connect(admins_changed, sender=AdminUser, weak=False)
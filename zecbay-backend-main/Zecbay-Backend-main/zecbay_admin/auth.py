@@ -0,0 +1,72 @@
+# zecbay_admin/auth.py
+import threading
+import time
+from django.conf        import settings
+from django.core        import signing
+from web.cache          import response_cache
+from .models            import AdminUser
+
+CLAIM_SALT = 'zecbay_admin.claim'
+ROSTER_TAG = 'admin-roster'
+ROSTER_TTL = 60     # Seconds before a process reloads its roster regardless; the most a removal can lag with TAG_STORE 'local'
+
+
+class Roster:
+    """
+    In-memory {username: session_version} of every admin, loaded with one
+    query and reloaded when the roster tag is invalidated (an admin was
+    created, removed or changed password) or after ROSTER_TTL. The tag is
+    read from the response cache's tag store on every check, so with a
+    'shared' or 'mongo' TAG_STORE an invalidation made anywhere (a management
+    command included) reaches every process on its next admin request; with
+    'local' other processes only notice after ROSTER_TTL.
+    """
+
+    def __init__(self):
+        self._admins = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        version = response_cache.tag_versions([ROSTER_TAG])[ROSTER_TAG]
+        now = time.monotonic()
+        if self._admins is None or version != self._version or now - self._loaded_at > ROSTER_TTL:
+            with self._lock:
+                admins = {
+                    row['username']: row.get('session_version', 0)
+                    for row in AdminUser._get_collection().find({}, {'username': 1, 'session_version': 1})
+                }
+                self._admins, self._version, self._loaded_at = admins, version, now
+        return self._admins
+
+    def invalidate(self):
+        response_cache.invalidate(ROSTER_TAG)
+
+
+roster = Roster()
+
+def issue_claim(session, admin):
+    """ Stores a signed claim for `admin` in the session at login """
+    session['admin_user'] = admin.username
+    session['admin_claim'] = signing.dumps(
+        {'u': admin.username, 'v': admin.session_version}, salt=CLAIM_SALT, compress=True
+    )
+
+def claimed_admin(request):
+    """
+    Username of the signed-in admin, or None. The claim must verify, be no older
+    than a session, name an admin on the roster and carry their current
+    session_version, so removing an admin or changing their password ends
+    their sessions. No database round trip while the roster is warm.
+    """
+    claim = request.session.get('admin_claim')
+    if not claim:
+        return None
+    try:
+        data = signing.loads(claim, salt=CLAIM_SALT, max_age=settings.SESSION_COOKIE_AGE)
+    except signing.BadSignature:
+        return None
+    if roster.get().get(data.get('u')) != data.get('v'):
+        return None
+    return data['u']
@@ -0,0 +1,195 @@
+# zecbay_admin/exports.py
+import csv
+import json
+import time
+from datetime           import datetime, timedelta
+from bson               import ObjectId
+from web.models         import Auction, Bids, Message
+from web.streaming      import get_config as streaming_config
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson', 'columnar': 'application/x-ndjson'}
+EXTENSIONS = {'csv': 'csv', 'ndjson': 'ndjson', 'columnar': 'columns.ndjson'}
+ROW_GROUP_SIZE = 10000  # Rows per line of columnar output
+
+# Exportable collections: their fields, the date field range filters apply to and
+# how a category filter reaches them (directly, or through the auction they belong to)
+DATASETS = {
+    'auctions': {
+        'document': Auction,
+        'fields': ['_id', 'product_name', 'category', 'subcategory', 'hs_code', 'initial_price', 'current_price',
+                   'unit', 'quantity', 'round', 'total_rounds', 'register_count', 'user', 'created_at', 'ends_at'],
+        'date_field': 'created_at',
+        'auction_field': None,
+    },
+    'bids': {
+        'document': Bids,
+        'fields': ['_id', 'auctionID', 'exporterId', 'pricePerQuantity', 'bidsMade', 'createdAt'],
+        'date_field': 'createdAt',
+        'auction_field': 'auctionID',
+    },
+    'messages': {
+        'document': Message,
+        'fields': ['_id', 'auction', 'sender_username', 'receiver_username', 'message', 'timestamp', 'read'],
+        'date_field': 'timestamp',
+        'auction_field': 'auction',
+    },
+}
+
+
+class ExportStats:
+    """ Rows written and throughput of one export """
+
+    def __init__(self):
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return f"{self.rows} rows in {self.seconds:.2f}s ({self.rows_per_sec:,.0f} rows/sec)"
+
+
+def parse_date(value, end=False):
+    """ ISO date or datetime; a bare date as the end of a range covers that whole day """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+def build_query(dataset, start=None, end=None, category=None, subcategory=None):
+    """ Mongo filter for a date range ([start, end)) and taxonomy filters """
+    spec = DATASETS[dataset]
+    query = {}
+    dates = {}
+    if start is not None:
+        dates['$gte'] = start
+    if end is not None:
+        dates['$lt'] = end
+    if dates:
+        query[spec['date_field']] = dates
+
+    taxonomy_filter = {}
+    if category:
+        taxonomy_filter['category'] = category
+    if subcategory:
+        taxonomy_filter['subcategory'] = subcategory
+    if taxonomy_filter:
+        if spec['auction_field'] is None:
+            query.update(taxonomy_filter)
+        else:
+            # One read of the matching auction ids, then an indexed $in on the child collection
+            auction_ids = [row['_id'] for row in Auction._get_collection().find(taxonomy_filter, {'_id': 1})]
+            query[spec['auction_field']] = {'$in': auction_ids}
+    return query
+
+def select_fields(dataset, fields=None):
+    """ The requested fields in dataset order, or all of them; unknown names are an error """
+    allowed = DATASETS[dataset]['fields']
+    if not fields:
+        return list(allowed)
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields for {dataset}: {', '.join(unknown)}")
+    return [field for field in allowed if field in fields]
+
+def open_cursor(dataset, query, fields, batch_size=None):
+    """ Server-side projection, in date order, fetched `batch_size` documents per round trip """
+    spec = DATASETS[dataset]
+    projection = {field: 1 for field in fields}
+    if '_id' not in fields:
+        projection['_id'] = 0
+    batch_size = batch_size or streaming_config()['BATCH_SIZE']
+    return spec['document']._get_collection().find(query, projection).sort(spec['date_field'], 1).batch_size(batch_size)
+
+
+def plain(value):
+    """ Scalar form of a BSON value for CSV cells and JSON """
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat() + 'Z' if value.tzinfo is None else value.isoformat()
+    if isinstance(value, list):
+        return [plain(item) for item in value]
+    return value
+
+
+class _Line:
+    """ File-like target for csv.writer that hands back each formatted line """
+
+    def write(self, text):
+        return text
+
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def csv_cell(value):
+    """
+    A CSV cell. Text that a spreadsheet would run as a formula (user-supplied
+    names and messages) is prefixed with a quote; numbers are left as they are.
+    """
+    if isinstance(value, list):
+        value = json.dumps(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def csv_rows(docs, fields):
+    writer = csv.writer(_Line())
+    yield writer.writerow(fields)
+    for doc in docs:
+        yield writer.writerow([csv_cell(plain(doc.get(field))) for field in fields])
+
+def ndjson_rows(docs, fields):
+    for doc in docs:
+        yield json.dumps({field: plain(doc.get(field)) for field in fields}) + '\n'
+
+def columnar_rows(docs, fields, group_size=ROW_GROUP_SIZE):
+    """
+    Row groups of up to `group_size` rows, one JSON line each, holding one array
+    per field. Values of a column sit together, so gzip compresses them well and
+    readers can load one column without parsing the others.
+    """
+    def group(columns, count):
+        return json.dumps({'rows': count, 'columns': columns}) + '\n'
+
+    columns, count = {field: [] for field in fields}, 0
+    for doc in docs:
+        for field in fields:
+            columns[field].append(plain(doc.get(field)))
+        count += 1
+        if count >= group_size:
+            yield group(columns, count)
+            columns, count = {field: [] for field in fields}, 0
+    if count:
+        yield group(columns, count)
+
+ENCODERS = {'csv': csv_rows, 'ndjson': ndjson_rows, 'columnar': columnar_rows}
+
+def export_chunks(docs, fields, fmt, stats=None, chunk_bytes=None):
+    """ Encodes `docs` in `fmt`, yielding UTF-8 chunks of about `chunk_bytes` """
+    chunk_bytes = chunk_bytes or streaming_config()['CHUNK_BYTES']
+    stats = stats if stats is not None else ExportStats()
+
+    def counted(docs):
+        for doc in docs:
+            stats.rows += 1
+            yield doc
+
+    parts, size = [], 0
+    for text in ENCODERS[fmt](counted(docs), fields):
+        parts.append(text)
+        size += len(text)
+        if size >= chunk_bytes:
+            yield ''.join(parts).encode('utf-8')
+            parts, size = [], 0
+    if parts:
+        yield ''.join(parts).encode('utf-8')
+    stats.finished = time.perf_counter()
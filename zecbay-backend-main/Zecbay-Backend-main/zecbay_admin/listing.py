@@ -0,0 +1,123 @@
+# zecbay_admin/listing.py
+import math
+import re
+from bson               import ObjectId
+from bson.errors        import InvalidId
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class ListPage:
+    """
+    One page of an admin list, read straight from the collection. Rows are raw
+    documents (the templates read them like objects), so nothing is
+    dereferenced per row; referenced documents are fetched afterwards with
+    `lookup`, or joined in the same aggregation with `aggregate`.
+    """
+
+    def __init__(self, request, sort_fields, default_sort):
+        params = request.GET
+        self.page_size = min(max(to_int(params.get('page_size'), PAGE_SIZE), 1), MAX_PAGE_SIZE)
+        self.number = max(to_int(params.get('page'), 1), 1)
+
+        # ?sort=field or ?sort=-field, restricted to the fields the list allows
+        self.sort = params.get('sort') or default_sort
+        if self.sort.lstrip('-') not in sort_fields:
+            self.sort = default_sort
+        direction = -1 if self.sort.startswith('-') else 1
+        self.order = [(sort_fields[self.sort.lstrip('-')], direction), ('_id', direction)]
+
+        # Query strings for the pagination and sort links, keeping the filters
+        kept = params.copy()
+        kept.pop('page', None)
+        self.params = kept.urlencode()
+        kept.pop('sort', None)
+        self.filter_params = kept.urlencode()
+
+        self.rows, self.total, self.pages = [], 0, 1
+
+    @classmethod
+    def find(cls, request, collection, query, sort_fields, default_sort, projection=None):
+        """ A sorted, filtered find with skip/limit, plus a count """
+        page = cls(request, sort_fields, default_sort)
+        page.set_total(collection.count_documents(query))
+        cursor = collection.find(query, projection).sort(page.order).skip(page.offset).limit(page.page_size)
+        page.rows = list(cursor)
+        return page
+
+    @classmethod
+    def aggregate(cls, request, collection, query, joins, sort_fields, default_sort):
+        """
+        Matches `query`, sorts (on an index where there is one), runs the
+        `joins` stages and pages their output in the same round trip, with a
+        $facet returning both the rows and the total.
+        """
+        page = cls(request, sort_fields, default_sort)
+        for _ in range(2):
+            stages = [{'$match': query}, {'$sort': dict(page.order)}] + joins + [
+                {'$facet': {
+                    'rows': [{'$skip': page.offset}, {'$limit': page.page_size}],
+                    'total': [{'$count': 'count'}],
+                }},
+            ]
+            result = next(collection.aggregate(stages, allowDiskUse=True), {})
+            page.rows = result.get('rows', [])
+            total = result.get('total') or [{'count': 0}]
+            # Past the last page: go again for the last one
+            if page.set_total(total[0]['count']) or page.rows:
+                break
+        return page
+
+    @property
+    def offset(self):
+        return (self.number - 1) * self.page_size
+
+    def set_total(self, total):
+        """ Records the total; returns False (and moves to the last page) if the page was past the end """
+        self.total = total
+        self.pages = max(1, math.ceil(total / self.page_size))
+        if self.number > self.pages:
+            self.number = self.pages
+            return False
+        return True
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    @property
+    def has_next(self):
+        return self.number < self.pages
+
+    @property
+    def previous_number(self):
+        return self.number - 1
+
+    @property
+    def next_number(self):
+        return self.number + 1
+
+
+def to_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def to_object_id(value):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+def contains(text):
+    """ Case-insensitive substring match for search boxes """
+    return {'$regex': re.escape(text), '$options': 'i'}
+
+def lookup(collection, ids, fields):
+    """ {_id: document} for `ids`, in one query whatever the page size """
+    ids = list({value for value in ids if value is not None})
+    if not ids:
+        return {}
+    return {doc['_id']: doc for doc in collection.find({'_id': {'$in': ids}}, {field: 1 for field in fields})}
@@ -1,7 +1,7 @@
 # zecbay_admin/management/commands/create_mongo_superuser.py
 
 from django.core.management.base import BaseCommand
-from zecbay_admin.models import MongoUser
+from zecbay_admin.models import AdminUser
 
 class Command(BaseCommand):
     help = 'Create a superuser for MongoDB'
@@ -18,12 +18,12 @@ class Command(BaseCommand):
         username = kwargs['username']
         password = kwargs['password']
 
-        if MongoUser.objects(username=username):
+        if AdminUser.objects(username=username):
             self.stdout.write(self.style.ERROR(f"User '{username}' already exists"))
             return
 
         # Create the superuser
-        user = MongoUser(username=username, password=password, is_superuser=True, is_staff=True)
+        user = AdminUser(username=username)
         user.set_password(password)
         user.save()
 
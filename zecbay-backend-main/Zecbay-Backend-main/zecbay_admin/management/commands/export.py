@@ -0,0 +1,71 @@
+# zecbay_admin/management/commands/export.py
+
+import sys
+from datetime import datetime, timedelta
+from bson import ObjectId
+from django.core.management.base import BaseCommand, CommandError
+from web.streaming import gzip_chunks, get_config as streaming_config
+from zecbay_admin import exports
+
+class Command(BaseCommand):
+    help = 'Stream auctions, bids or messages to a CSV, NDJSON or columnar file, optionally gzipped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(exports.DATASETS))
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--from', dest='start', type=str, default='', help='ISO date or datetime, inclusive')
+        parser.add_argument('--to', dest='end', type=str, default='', help='ISO date (whole day) or datetime, exclusive')
+        parser.add_argument('--category', type=str, default='')
+        parser.add_argument('--subcategory', type=str, default='')
+        parser.add_argument('--fields', type=str, default='', help='Comma-separated fields to export (default: all)')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument('--output', '-o', type=str, default='-', help='Output file (default: stdout)')
+        parser.add_argument('--batch-size', type=int, default=0, help='Documents per cursor round trip')
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='Encode this many generated bids instead of reading Mongo (encoder benchmark)')
+
+    def handle(self, *args, **kwargs):
+        dataset = kwargs['dataset']
+        try:
+            fields = exports.select_fields(dataset, [f for f in kwargs['fields'].split(',') if f])
+            start = exports.parse_date(kwargs['start'])
+            end = exports.parse_date(kwargs['end'], end=True)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if kwargs['synthetic']:
+            docs = synthetic_bids(kwargs['synthetic'])
+        else:
+            query = exports.build_query(dataset, start, end, kwargs['category'] or None, kwargs['subcategory'] or None)
+            docs = exports.open_cursor(dataset, query, fields, kwargs['batch_size'] or None)
+
+        stats = exports.ExportStats()
+        chunks = exports.export_chunks(docs, fields, kwargs['format'], stats)
+        if kwargs['gzip']:
+            chunks = gzip_chunks(chunks, streaming_config()['GZIP_LEVEL'])
+
+        written = 0
+        output = sys.stdout.buffer if kwargs['output'] == '-' else open(kwargs['output'], 'wb')
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+
+        # Report on stderr so stdout stays clean when it is the export itself
+        self.stderr.write(self.style.SUCCESS(f"Exported {dataset}: {stats.summary()}, {written:,} bytes"))
+
+def synthetic_bids(count):
+    now = datetime.utcnow()
+    auction = ObjectId()
+    for i in range(count):
+        yield {
+            '_id': ObjectId(),
+            'auctionID': auction,
+            'exporterId': 100000 + i % 500,
+            'pricePerQuantity': 100.0 + i % 97,
+            'bidsMade': [f"{100.0 + i % 97}"],
+            'createdAt': now - timedelta(seconds=i),
+        }
@@ -0,0 +1,26 @@
+# zecbay_admin/management/commands/remove_mongo_superuser.py
+
+from django.core.management.base import BaseCommand
+from zecbay_admin.models import AdminUser
+
+class Command(BaseCommand):
+    help = 'Remove a MongoDB superuser, ending their admin sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username', type=str, help='Username of the superuser'
+        )
+
+    def handle(self, *args, **kwargs):
+        username = kwargs['username']
+
+        admin = AdminUser.objects(username=username).first()
+        if admin is None:
+            self.stdout.write(self.style.ERROR(f"User '{username}' does not exist"))
+            return
+
+        # The delete signal bumps the roster tag, ending their sessions on each process's next admin
+        # request when the tag store is shared (TAG_STORE 'shared' or 'mongo'), within ROSTER_TTL otherwise
+        admin.delete()
+
+        self.stdout.write(self.style.SUCCESS(f"Superuser '{username}' removed"))
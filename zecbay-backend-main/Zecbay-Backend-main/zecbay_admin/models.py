@@ -1,14 +1,16 @@
 # zecbay_admin/models.py
 
-from mongoengine import Document, StringField
+from mongoengine import Document, IntField, StringField
 from django.contrib.auth.hashers import make_password, check_password
 
 class AdminUser(Document):
     username = StringField(required=True, unique=True)
     password = StringField(required=True)  # Stored as a hashed password
+    session_version = IntField(default=0)  # Part of every session claim; bumping it signs the admin out everywhere
 
     def set_password(self, raw_password):
         self.password = make_password(raw_password)
+        self.session_version = (self.session_version or 0) + 1
 
     def check_password(self, raw_password):
         return check_password(raw_password, self.password)
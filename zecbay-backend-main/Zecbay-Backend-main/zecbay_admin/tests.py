@@ -1,3 +1,238 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import tracemalloc
+from datetime       import datetime, timedelta
+from unittest       import mock
+from bson           import ObjectId
+from django.test    import RequestFactory, SimpleTestCase, override_settings
+from web.cache      import CacheTag, response_cache
 
-# Create your tests here.
+from web.models     import Auction, Bids, Message, User
+from web.streaming  import gzip_chunks
+from zecbay_admin   import auth, exports, views
+from zecbay_admin.models import AdminUser
+
+
+class FakeCursor(list):
+    def sort(self, *args):
+        return self
+
+    def skip(self, count):
+        return FakeCursor(self[count:])
+
+    def limit(self, count):
+        return FakeCursor(self[:count])
+
+
+class FakeCollection:
+    """ Serves `docs` and records every round trip made against it """
+
+    def __init__(self, docs, calls):
+        self.docs = docs
+        self.calls = calls
+
+    def count_documents(self, query):
+        self.calls.append('count')
+        return len(self.docs)
+
+    def find(self, query=None, projection=None):
+        self.calls.append('find')
+        ids = (query or {}).get('_id', {}).get('$in')
+        return FakeCursor(dict(doc) for doc in self.docs if ids is None or doc['_id'] in ids)
+
+    def aggregate(self, pipeline, **kwargs):
+        self.calls.append(pipeline)
+        return iter([{'rows': [dict(doc) for doc in self.docs], 'total': [{'count': len(self.docs)}]}])
+
+
+class AdminListQueryCountTests(SimpleTestCase):
+    def render(self, view, users, auctions, bids, path='/admin/', messages=()):
+        calls = []
+        collections = {
+            User: FakeCollection(users, calls),
+            Auction: FakeCollection(auctions, calls),
+            Bids: FakeCollection(bids, calls),
+            Message: FakeCollection(list(messages), calls),
+        }
+        request = RequestFactory().get(path)
+        request.session = {'admin_user': 'root'}
+        patches = [mock.patch.object(model, '_get_collection', return_value=collection)
+                   for model, collection in collections.items()]
+        patches.append(mock.patch.object(views, 'claimed_admin', return_value='root'))
+        for patcher in patches:
+            patcher.start()
+        try:
+            response = view(request)
+        finally:
+            for patcher in patches:
+                patcher.stop()
+        return response, calls
+
+    def dataset(self, count):
+        users = [{'_id': i, 'username': f'EXP{i}', 'email': f'{i}@example.com'} for i in range(count)]
+        auctions = [{'_id': ObjectId(), 'product_name': f'Lot {i}', 'user': i, 'created_at': datetime.utcnow()}
+                    for i in range(count)]
+        bids = [{'_id': ObjectId(), 'exporterId': i, 'auctionID': auctions[i]['_id'], 'pricePerQuantity': 1.0 + i,
+                 'bidsMade': [], 'createdAt': datetime.utcnow()} for i in range(count)]
+        return users, auctions, bids
+
+    def test_query_count_is_constant_per_page(self):
+        expected = {views.user_list: 2, views.auction_list: 3, views.bid_list: 4}
+        for view, queries in expected.items():
+            _, small = self.render(view, *self.dataset(3))
+            response, large = self.render(view, *self.dataset(120))
+            self.assertEqual(len(small), queries, view.__name__)
+            self.assertEqual(len(large), queries, view.__name__)
+            self.assertEqual(response.status_code, 200)
+
+    def test_bid_rows_show_referenced_names(self):
+        response, _ = self.render(views.bid_list, *self.dataset(120), path='/admin/bids/?page=3&sort=price')
+        body = response.content.decode()
+        self.assertIn('EXP100', body)
+        self.assertIn('Lot 119', body)
+        self.assertNotIn('Lot 99<', body)  # Page 3 of 50 starts at row 101
+        self.assertIn('page 3 of 3', body)
+
+    def test_message_list_drops_orphans_in_one_aggregation(self):
+        auction = ObjectId()
+        messages = [{'_id': ObjectId(), 'auction': auction, 'product_name': 'Jute bags', 'sender_username': 'IMP1',
+                     'receiver_username': 'EXP1', 'message': 'Hello', 'timestamp': datetime.utcnow()}]
+        response, calls = self.render(views.message_list, [], [], [], path='/admin/messages/?page=2', messages=messages)
+
+        self.assertEqual(len(calls), 1)
+        stages = calls[0]
+        join = next(index for index, stage in enumerate(stages) if '$lookup' in stage)
+        self.assertEqual((stages[join]['$lookup']['from'], stages[join]['$lookup']['localField']), ('auctions', 'auction'))
+        # Sorted before the join, orphans dropped right after it, paged last
+        self.assertLess(stages.index({'$sort': {'timestamp': -1, '_id': -1}}), join)
+        self.assertEqual(stages[join + 1], {'$match': {'auction_doc': {'$ne': []}}})
+        self.assertIn('$facet', stages[-1])
+        self.assertIn('Jute bags', response.content.decode())
+
+
+class AdminClaimTests(SimpleTestCase):
+    def setUp(self):
+        response_cache.clear()
+        auth.roster._admins = None
+        self.admins = mock.Mock()
+        self.admins.find.return_value = [{'username': 'root', 'session_version': 2}]
+        patcher = mock.patch.object(AdminUser, '_get_collection', return_value=self.admins)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request_with_claim(self, version=2, username='root'):
+        request = RequestFactory().get('/admin/')
+        request.session = {}
+        auth.issue_claim(request.session, AdminUser(username=username, session_version=version))
+        return request
+
+    def test_valid_claim_costs_one_roster_load_then_no_queries(self):
+        for _ in range(20):
+            self.assertEqual(auth.claimed_admin(self.request_with_claim()), 'root')
+        self.assertEqual(self.admins.find.call_count, 1)
+
+    def test_stale_version_tampered_or_missing_claims_are_refused(self):
+        self.assertIsNone(auth.claimed_admin(self.request_with_claim(version=1)))
+        self.assertIsNone(auth.claimed_admin(self.request_with_claim(username='ghost')))
+        tampered = self.request_with_claim()
+        tampered.session['admin_claim'] = tampered.session['admin_claim'][:-2] + 'xx'
+        self.assertIsNone(auth.claimed_admin(tampered))
+        request = RequestFactory().get('/admin/')
+        request.session = {'admin_user': 'root'}  # Sessions from before signed claims
+        self.assertIsNone(auth.claimed_admin(request))
+
+    def test_removing_an_admin_ends_their_sessions(self):
+        request = self.request_with_claim()
+        self.assertEqual(auth.claimed_admin(request), 'root')
+        self.admins.find.return_value = []
+        auth.roster.invalidate()
+        self.assertIsNone(auth.claimed_admin(request))
+
+    @override_settings(RESPONSE_CACHE={'TAG_STORE': 'mongo'})
+    def test_removal_by_another_process_reaches_this_one_through_the_tag_store(self):
+        tags = mock.Mock()
+        tags.find.return_value = [{'_id': auth.ROSTER_TAG, 'v': 1}]
+        with mock.patch.object(CacheTag, '_get_collection', return_value=tags):
+            request = self.request_with_claim()
+            self.assertEqual(auth.claimed_admin(request), 'root')
+            # remove_mongo_superuser ran in its own process and bumped the tag in Mongo
+            self.admins.find.return_value = []
+            tags.find.return_value = [{'_id': auth.ROSTER_TAG, 'v': 2}]
+            self.assertIsNone(auth.claimed_admin(request))
+
+
+class ExportTests(SimpleTestCase):
+    fields = exports.DATASETS['bids']['fields']
+
+    def bids(self, count):
+        start = datetime(2026, 1, 1)
+        for i in range(count):
+            yield {'_id': ObjectId(), 'auctionID': ObjectId(), 'exporterId': i, 'pricePerQuantity': 10.0 + i,
+                   'bidsMade': ['10.0'], 'createdAt': start + timedelta(seconds=i)}
+
+    def export(self, count, fmt):
+        return b''.join(exports.export_chunks(self.bids(count), self.fields, fmt)).decode()
+
+    def test_formats_carry_every_row(self):
+        rows = list(csv.DictReader(self.export(250, 'csv').splitlines()))
+        self.assertEqual(len(rows), 250)
+        self.assertEqual(rows[3]['createdAt'], '2026-01-01T00:00:03Z')
+        self.assertEqual(json.loads(rows[3]['bidsMade']), ['10.0'])
+
+        lines = self.export(250, 'ndjson').splitlines()
+        self.assertEqual(json.loads(lines[-1])['exporterId'], 249)
+
+        groups = [json.loads(line) for line in exports.columnar_rows(self.bids(25), self.fields, group_size=10)]
+        self.assertEqual([group['rows'] for group in groups], [10, 10, 5])
+        self.assertEqual(groups[2]['columns']['exporterId'], [20, 21, 22, 23, 24])
+
+    def test_csv_cells_cannot_start_a_formula(self):
+        docs = [{'content': '=HYPERLINK("http://evil.example","x")', 'username': '@SUM(A1)', 'price': -5.0},
+                {'content': '+1 555', 'username': '-2+3', 'price': 3.0},
+                {'content': 'plain text', 'username': 'EXP1', 'price': 1.5}]
+        rows = list(csv.reader(''.join(exports.csv_rows(docs, ['content', 'username', 'price'])).splitlines()))
+        self.assertEqual(rows[1], ["'=HYPERLINK(\"http://evil.example\",\"x\")", "'@SUM(A1)", '-5.0'])
+        self.assertEqual(rows[2], ["'+1 555", "'-2+3", '3.0'])
+        self.assertEqual(rows[3], ['plain text', 'EXP1', '1.5'])
+
+    def test_category_filter_goes_through_auction_ids(self):
+        auctions = mock.Mock()
+        auctions.find.return_value = [{'_id': 1}, {'_id': 2}]
+        with mock.patch.object(Auction, '_get_collection', return_value=auctions):
+            query = exports.build_query('bids', start=datetime(2026, 1, 1),
+                                        end=exports.parse_date('2026-01-31', end=True), category='Leather & Footwear')
+        self.assertEqual(query, {
+            'createdAt': {'$gte': datetime(2026, 1, 1), '$lt': datetime(2026, 2, 1)},
+            'auctionID': {'$in': [1, 2]},
+        })
+        with self.assertRaises(ValueError):
+            exports.select_fields('bids', ['password'])
+
+    def test_gzipped_csv_memory_is_flat_from_10k_to_100k_rows(self):
+        def peak(count):
+            tracemalloc.start()
+            try:
+                for _ in gzip_chunks(exports.export_chunks(self.bids(count), self.fields, 'csv'), 6):
+                    pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        small, large = peak(10_000), peak(100_000)
+        self.assertLess(large, small * 1.5, f"10k={small} 100k={large}")
+
+    def test_export_view_streams_a_gzipped_attachment(self):
+        cursor = mock.Mock()
+        cursor.sort.return_value.batch_size.return_value = iter(list(self.bids(3)))
+        bids = mock.Mock()
+        bids.find.return_value = cursor
+        request = RequestFactory().get('/admin/export/bids/?format=ndjson&fields=exporterId,createdAt')
+        with mock.patch.object(views, 'claimed_admin', return_value='root'), \
+                mock.patch.object(Bids, '_get_collection', return_value=bids), self.assertLogs('zecbay_admin.views', 'INFO'):
+            response = views.export(request, 'bids')
+            body = gzip.decompress(b''.join(response.streaming_content))
+
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="bids.ndjson.gz"')
+        self.assertEqual(bids.find.call_args[0][1], {'exporterId': 1, 'createdAt': 1, '_id': 0})
+        self.assertEqual(json.loads(body.splitlines()[0]), {'exporterId': 0, 'createdAt': '2026-01-01T00:00:00Z'})
@@ -10,4 +10,11 @@ urlpatterns = [
     path('auctions/', views.auction_list, name='admin_auction_list'),
     path('bids/', views.bid_list, name='admin_bid_list'),
     path('messages/', views.message_list, name='admin_message_list'),
+    path('cache-stats/', views.cache_stats, name='admin_cache_stats'),
+    path('slow-requests/', views.slow_requests, name='admin_slow_requests'),
+    path('analytics/', views.analytics, name='admin_analytics'),
+    path('analytics/api/', views.analytics_api, name='admin_analytics_api'),
+    path('profiles/', views.profile_list, name='admin_profile_list'),
+    path('profiles/<str:profile_id>/download/', views.profile_download, name='admin_profile_download'),
+    path('export/<str:dataset>/', views.export, name='admin_export'),
 ]
\ No newline at end of file
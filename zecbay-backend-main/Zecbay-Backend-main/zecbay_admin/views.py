@@ -2,12 +2,21 @@
 
 from django.contrib.auth import logout
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from functools import wraps
-from mongoengine.errors import DoesNotExist
-from web.models import User, Auction, Bids, Message
+import logging
+from web.models import User, Auction, Bids, Message, Profile
+from web import metrics, profiling, rollups, stats, taxonomy
+from web.cache import response_cache
+from web.streaming import gzip_chunks, then, get_config as streaming_config
+from . import exports
+from .auth import claimed_admin, issue_claim
+from .listing import ListPage, contains, lookup, to_int, to_object_id
 from .models import AdminUser
 
+log = logging.getLogger(__name__)
+
 # Admin login view
 def admin_login(request):
     if request.method == "POST":
@@ -17,7 +26,7 @@ def admin_login(request):
         try:
             admin = AdminUser.objects.get(username=username)
             if admin.check_password(password):
-                request.session['admin_user'] = username
+                issue_claim(request.session, admin)
                 return redirect('admin_dashboard')
             else:
                 messages.error(request, "Incorrect password.")
@@ -27,15 +36,12 @@ def admin_login(request):
     return render(request, "admin/login.html")
 
 # Superuser Required Decorator
+# Checks the signed session claim against the in-memory admin roster; no query per request
 def superuser_required(view_func):
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if request.session.get('admin_user'):
-            try:
-                AdminUser.objects.get(username=request.session['admin_user'])
-                return view_func(request, *args, **kwargs)
-            except AdminUser.DoesNotExist:
-                pass
+        if claimed_admin(request):
+            return view_func(request, *args, **kwargs)
         return redirect('admin_login')
     return _wrapped_view
 
@@ -47,37 +53,228 @@ def admin_logout(request):
 # Dashboard view
 @superuser_required
 def dashboard(request):
+    # One read of the stats snapshot instead of a count() per collection
+    snapshot = stats.snapshot()
     return render(request, 'admin/dashboard.html', {
-        'users_count': User.objects.count(),
-        'auctions_count': Auction.objects.count(),
-        'bids_count': Bids.objects.count(),
-        'messages_count': Message.objects.count(),
+        'users_count': snapshot['users'],
+        'auctions_count': snapshot['auctions'],
+        'live_auctions_count': snapshot['live_auctions'],
+        'bids_count': snapshot['bids'],
+        'messages_count': snapshot['messages'],
+        'auctions_by_category': snapshot['auctions_by_category'],
+        'bids_by_hour': snapshot['bids_by_hour'],
+        'reconciled_at': snapshot['reconciled_at'],
     })
 
 # Other admin views (with the superuser_required decorator)
+# Each list costs a count, one page query and one batched query per referenced collection
 @superuser_required
 def user_list(request):
-    users = User.objects.all()
-    return render(request, 'admin/users.html', {'users': users})
+    params = request.GET
+    query = {}
+    if params.get('q'):
+        query['$or'] = [{'username': contains(params['q'])}, {'email': contains(params['q'])}]
+    if params.get('user_type'):
+        query['user_type'] = params['user_type']
+    if params.get('status'):
+        query['verification_status'] = params['status']
+
+    page = ListPage.find(request, User._get_collection(), query,
+                    sort_fields={'userid': '_id', 'username': 'username', 'email': 'email'}, default_sort='userid',
+                    projection=['username', 'email', 'user_type', 'verification_status'])
+    for user in page.rows:
+        user['userid'] = user['_id']
+    return render(request, 'admin/users.html', {'users': page.rows, 'page': page})
 
 @superuser_required
 def auction_list(request):
-    auctions = Auction.objects.all()
-    return render(request, 'admin/auctions.html', {'auctions': auctions})
+    params = request.GET
+    query = {}
+    if params.get('q'):
+        query['product_name'] = contains(params['q'])
+    if params.get('category'):
+        query['category'] = params['category']
+    if params.get('user'):
+        query['user'] = to_int(params['user'], None)
+
+    page = ListPage.find(request, Auction._get_collection(), query,
+                    sort_fields={'created_at': 'created_at', 'product_name': 'product_name', 'current_price': 'current_price'},
+                    default_sort='-created_at',
+                    projection=['product_name', 'category', 'subcategory', 'initial_price', 'current_price',
+                                'round', 'total_rounds', 'user', 'created_at'])
+    users = lookup(User._get_collection(), [auction.get('user') for auction in page.rows], ['username'])
+    for auction in page.rows:
+        auction['created_by'] = users.get(auction.get('user'), {}).get('username')
+    return render(request, 'admin/auctions.html', {'auctions': page.rows, 'page': page})
 
 @superuser_required
 def bid_list(request):
-    bids = Bids.objects.all()
-    return render(request, 'admin/bids.html', {'bids': bids})
+    params = request.GET
+    query = {}
+    if params.get('auction'):
+        query['auctionID'] = to_object_id(params['auction'])
+    if params.get('exporter'):
+        query['exporterId'] = to_int(params['exporter'], None)
 
+    page = ListPage.find(request, Bids._get_collection(), query,
+                    sort_fields={'created_at': 'createdAt', 'price': 'pricePerQuantity'}, default_sort='-created_at',
+                    projection=['exporterId', 'auctionID', 'pricePerQuantity', 'bidsMade', 'createdAt'])
+    exporters = lookup(User._get_collection(), [bid.get('exporterId') for bid in page.rows], ['username'])
+    auctions = lookup(Auction._get_collection(), [bid.get('auctionID') for bid in page.rows], ['product_name'])
+    for bid in page.rows:
+        bid['exporter'] = exporters.get(bid.get('exporterId'), {}).get('username')
+        bid['product_name'] = auctions.get(bid.get('auctionID'), {}).get('product_name')
+        bid['auction_id'] = str(bid.get('auctionID'))
+    return render(request, 'admin/bids.html', {'bids': page.rows, 'page': page})
+
+# Orphaned messages (whose auction is gone) are dropped by an anti-join in the same
+# aggregation that pages the list; reconcile_orphans removes them for good
 @superuser_required
 def message_list(request):
-    valid_messages = []
-    for message in Message.objects:
-        try:
-            _ = message.auction  # Triggers the dereference
-            valid_messages.append(message)
-        except DoesNotExist:
-            continue  # Skip message with missing auction
+    params = request.GET
+    query = {}
+    if params.get('auction'):
+        query['auction'] = to_object_id(params['auction'])
+    if params.get('q'):
+        query['$or'] = [{'sender_username': contains(params['q'])}, {'receiver_username': contains(params['q'])}]
+
+    page = ListPage.aggregate(request, Message._get_collection(), query, [
+        {'$lookup': {
+            'from': Auction._get_collection_name(),
+            'localField': 'auction',
+            'foreignField': '_id',
+            'pipeline': [{'$project': {'product_name': 1}}],  # Only what the page shows
+            'as': 'auction_doc',
+        }},
+        {'$match': {'auction_doc': {'$ne': []}}},
+        {'$project': {
+            'sender_username': 1, 'receiver_username': 1, 'message': 1, 'timestamp': 1, 'auction': 1,
+            'product_name': {'$arrayElemAt': ['$auction_doc.product_name', 0]},
+        }},
+    ], sort_fields={'timestamp': 'timestamp'}, default_sort='-timestamp')
+    for message in page.rows:
+        message['auction_id'] = str(message['auction'])
+    return render(request, 'admin/messages.html', {'messages': page.rows, 'page': page})
+
+
+# Response cache hit rate and memory
+@superuser_required
+def cache_stats(request):
+    return JsonResponse(response_cache.stats())
+
+# This process's slowest recent requests and the MongoDB commands they issued
+@superuser_required
+def slow_requests(request):
+    return JsonResponse({'slow_ms': metrics.get_config()['SLOW_MS'], 'requests': metrics.slow_requests()})
+
+# Stored request profiles; POST issues a token that profiles the requests carrying it
+@superuser_required
+def profile_list(request):
+    token = None
+    if request.method == 'POST':
+        mode = request.POST.get('mode', 'sampler')
+        if mode in profiling.MODES:
+            token = profiling.issue_token(mode)
+    page = ListPage.find(request, Profile._get_collection(), {},
+                    sort_fields={'created_at': 'created_at', 'duration': 'duration_ms'}, default_sort='-created_at',
+                    projection={'data': 0})
+    for profile in page.rows:
+        profile['profile_id'] = str(profile['_id'])
+    config = profiling.get_config()
+    return render(request, 'admin/profiles.html', {
+        'profiles': page.rows, 'page': page, 'token': token, 'modes': profiling.MODES,
+        'header': config['HEADER'], 'query_flag': config['QUERY_FLAG'], 'token_max_age': config['TOKEN_MAX_AGE'],
+    })
+
+# Folded stacks (for flamegraph.pl or speedscope) or a .prof file (for snakeviz or pstats)
+@superuser_required
+def profile_download(request, profile_id):
+    profile = Profile._get_collection().find_one({'_id': to_object_id(profile_id)})
+    if profile is None:
+        raise Http404("Profile not found")
+    response = HttpResponse(bytes(profile['data']), content_type='application/gzip')
+    filename = f"{profile['view']}-{profile['_id']}.{profiling.EXTENSIONS[profile['mode']]}.gz"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+# Bid and auction analytics from the precomputed rollups, one read per request
+# ?granularity=hour|day &from=&to= (ISO dates, UTC) &category=&subcategory=
+def analytics_series(params):
+    granularity = params.get('granularity', 'day')
+    start, end = rollups.window(
+        granularity,
+        start=exports.parse_date(params.get('from')),
+        end=exports.parse_date(params.get('to'), end=True),
+    )
+    category, subcategory = params.get('category') or None, params.get('subcategory') or None
+    if category and not taxonomy.is_category(category):
+        raise ValueError(f"Unknown category: {category}")
+    if subcategory and not taxonomy.is_subcategory(category, subcategory):
+        raise ValueError(f"Unknown subcategory: {subcategory}")
+    return {
+        'granularity': granularity,
+        'from': start.isoformat() + 'Z',
+        'to': end.isoformat() + 'Z',
+        'category': category,
+        'subcategory': subcategory,
+        'series': rollups.series(granularity, start, end, category, subcategory),
+    }
+
+@superuser_required
+def analytics(request):
+    try:
+        result = analytics_series(request.GET)
+        error = None
+    except ValueError as e:
+        result, error = {'series': []}, str(e)
+    return render(request, 'admin/analytics.html', dict(
+        result, error=error, params=request.GET, granularities=rollups.GRANULARITIES,
+        categories=sorted(taxonomy.CATEGORIES),
+    ))
+
+@superuser_required
+def analytics_api(request):
+    try:
+        return JsonResponse(analytics_series(request.GET))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+# Bulk export of auctions, bids or messages, streamed from a Mongo cursor
+# ?format=csv|ndjson|columnar &from=&to= (ISO dates) &category=&subcategory= &fields=a,b &gzip=0
+@superuser_required
+def export(request, dataset):
+    if dataset not in exports.DATASETS:
+        raise Http404("Unknown export")
+    params = request.GET
+    fmt = params.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        return JsonResponse({'error': f"format must be one of {', '.join(exports.FORMATS)}"}, status=400)
+    try:
+        fields = exports.select_fields(dataset, [f for f in params.get('fields', '').split(',') if f])
+        query = exports.build_query(
+            dataset,
+            start=exports.parse_date(params.get('from')),
+            end=exports.parse_date(params.get('to'), end=True),
+            category=params.get('category'),
+            subcategory=params.get('subcategory'),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    stats = exports.ExportStats()
+    docs = exports.open_cursor(dataset, query, fields)
+    chunks = then(exports.export_chunks(docs, fields, fmt, stats),
+                  lambda: log.info("Export finished", extra={
+                      'dataset': dataset, 'format': fmt, 'rows': stats.rows,
+                      'seconds': round(stats.seconds, 3), 'rows_per_sec': round(stats.rows_per_sec),
+                  }))
+    filename = f"{dataset}.{exports.EXTENSIONS[fmt]}"
+    content_type = exports.FORMATS[fmt]
+    if params.get('gzip', '1') not in ('0', 'false'):
+        chunks = gzip_chunks(chunks, streaming_config()['GZIP_LEVEL'])
+        filename += '.gz'
+        content_type = 'application/gzip'
 
-    return render(request, 'admin/messages.html', {'messages': valid_messages})
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response